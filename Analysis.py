@@ -0,0 +1,189 @@
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+import Sampling
+
+# bisection steps used to refine each root and discontinuity, and golden section steps for each
+# extremum, every step evaluates the function once or twice for all the candidates at once
+ROOT_ITERATIONS = 40
+EXTREMUM_ITERATIONS = 40
+
+# at most this many features of each kind are refined, so the analysis stays within a frame
+MAXIMUM_FEATURES = 200
+
+# a root is a sign change where the refined value is this close to 0, relative to the range of y,
+# the other sign changes are poles
+ROOT_TOLERANCE = 1e-6
+
+# an interval is a jump when y changes by more than this part of the range of y and much more
+# than in the intervals next to it, and when the change stays after refining it
+JUMP_SIZE = 0.05
+JUMP_RATIO = 10
+
+GOLDEN_RATIO = (np.sqrt(5) - 1) / 2
+
+# x and y arrays of the features, isMaximum tells the maxima from the minima
+Features = namedtuple('Features', ['rootXs', 'extremumXs', 'extremumYs', 'isMaximum', 'discontinuityXs'])
+
+
+def evaluate(function, xs):
+    with np.errstate(all='ignore'):
+        return Sampling.evaluate(function, xs)
+
+
+def bisectRoots(function, lefts, rights, leftYs, iterations=ROOT_ITERATIONS):
+    # narrow every bracket [left, right] whose ends have different signs down to the sign change
+    for _ in range(iterations):
+        middles = (lefts + rights) / 2
+        middleYs = evaluate(function, middles)
+        sameSign = np.sign(middleYs) == np.sign(leftYs)
+        lefts = np.where(sameSign, middles, lefts)
+        leftYs = np.where(sameSign, middleYs, leftYs)
+        rights = np.where(sameSign, rights, middles)
+    return (lefts + rights) / 2
+
+
+def findRoots(function, xs, ys, scale):
+    # the points where y is 0 and the sign changes between finite neighbours, refined by bisection,
+    # returns the roots and the sign changes that are poles
+    finite = np.isfinite(ys)
+    zeros = xs[finite & (ys == 0)]
+
+    signs = np.sign(ys)
+    changes = np.flatnonzero(finite[:-1] & finite[1:] & (signs[:-1] * signs[1:] < 0))[:MAXIMUM_FEATURES]
+    refined = bisectRoots(function, xs[changes], xs[changes + 1], ys[changes])
+
+    # the value of a pole grows instead of going to 0
+    isRoot = np.abs(evaluate(function, refined)) <= ROOT_TOLERANCE * scale
+    return np.sort(np.concatenate((zeros, refined[isRoot]))), refined[~isRoot]
+
+
+def goldenSection(function, lefts, rights, sign, iterations=EXTREMUM_ITERATIONS):
+    # narrow every interval down to the minimum of sign * y inside of it
+    for _ in range(iterations):
+        width = rights - lefts
+        lowers = rights - GOLDEN_RATIO * width
+        uppers = lefts + GOLDEN_RATIO * width
+        lowerYs = sign * evaluate(function, lowers)
+        upperYs = sign * evaluate(function, uppers)
+        # a missing value is never the better side
+        keepLeft = ~(lowerYs > upperYs) & ~np.isnan(lowerYs) | np.isnan(upperYs)
+        rights = np.where(keepLeft, uppers, rights)
+        lefts = np.where(keepLeft, lefts, lowers)
+    return (lefts + rights) / 2
+
+
+def findExtrema(function, xs, ys):
+    # the local maxima and minima of the samples, refined between the neighbours of each of them
+    slopes = np.sign(np.diff(ys))
+    # the first slope of a plateau stands for the whole plateau
+    for _ in range(2):
+        flat = np.flatnonzero(slopes[1:] == 0) + 1
+        slopes[flat] = slopes[flat - 1]
+    turns = np.flatnonzero(slopes[:-1] * slopes[1:] < 0) + 1
+    turns = turns[np.isfinite(ys[turns - 1]) & np.isfinite(ys[turns + 1])][:MAXIMUM_FEATURES]
+    isMaximum = slopes[turns - 1] > 0
+
+    extremumXs = goldenSection(function, xs[turns - 1], xs[turns + 1], np.where(isMaximum, -1.0, 1.0))
+    return extremumXs, evaluate(function, extremumXs), isMaximum
+
+
+def bisectDomain(function, lefts, rights, leftFinite, iterations=ROOT_ITERATIONS):
+    # narrow every interval with a defined and an undefined end down to the edge of the domain
+    for _ in range(iterations):
+        middles = (lefts + rights) / 2
+        sameSide = np.isfinite(evaluate(function, middles)) == leftFinite
+        lefts = np.where(sameSide, middles, lefts)
+        rights = np.where(sameSide, rights, middles)
+    return (lefts + rights) / 2
+
+
+def findJumps(function, xs, ys, scale):
+    # the intervals where y jumps, and the edges of the parts where the function is not defined
+    finite = np.isfinite(ys)
+    edges = np.flatnonzero(finite[:-1] != finite[1:])[:MAXIMUM_FEATURES]
+    gaps = bisectDomain(function, xs[edges], xs[edges + 1], finite[edges])
+
+    with np.errstate(all='ignore'):
+        changes = np.abs(np.diff(ys))
+    changes[~np.isfinite(changes)] = 0
+    neighbours = np.maximum(np.concatenate(([0], changes[:-1])), np.concatenate((changes[1:], [0])))
+    jumps = np.flatnonzero((changes > JUMP_SIZE * scale) & (changes > JUMP_RATIO * neighbours))[:MAXIMUM_FEATURES]
+
+    # keep the half with the larger change, a steep but continuous curve loses its change
+    lefts, rights = xs[jumps], xs[jumps + 1]
+    leftYs, rightYs = ys[jumps], ys[jumps + 1]
+    for _ in range(ROOT_ITERATIONS):
+        middles = (lefts + rights) / 2
+        middleYs = evaluate(function, middles)
+        leftHalf = np.abs(middleYs - leftYs) > np.abs(rightYs - middleYs)
+        rights = np.where(leftHalf, middles, rights)
+        rightYs = np.where(leftHalf, middleYs, rightYs)
+        lefts = np.where(leftHalf, lefts, middles)
+        leftYs = np.where(leftHalf, leftYs, middleYs)
+    isJump = np.abs(rightYs - leftYs) > JUMP_SIZE * scale
+    return np.concatenate((gaps, ((lefts + rights) / 2)[isJump]))
+
+
+def mergeClose(featureXs, xs):
+    # the features closer than the spacing of the samples around them are one feature found twice,
+    # like a sample at a root that is also a touching extremum, or a pole found from both sides
+    featureXs = np.sort(featureXs)
+    if len(featureXs) < 2:
+        return featureXs
+    positions = np.clip(np.searchsorted(xs, featureXs[1:]), 1, len(xs) - 1)
+    spacings = xs[positions] - xs[positions - 1]
+    groups = np.cumsum(np.concatenate(([True], np.diff(featureXs) > spacings))) - 1
+    return np.bincount(groups, featureXs) / np.bincount(groups)
+
+
+def analyze(function, xs, ys):
+    # the roots, extrema and discontinuities of the function from its samples, each of them
+    # refined with a bounded number of evaluations of the function
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    if len(xs) < 3:
+        empty = np.empty(0)
+        return Features(empty, empty, empty, np.empty(0, dtype=bool), empty)
+
+    scale = Sampling.yScale(ys)
+    rootXs, poles = findRoots(function, xs, ys, scale)
+    discontinuityXs = mergeClose(np.concatenate((poles, findJumps(function, xs, ys, scale))), xs)
+    extremumXs, extremumYs, isMaximum = findExtrema(function, xs, ys)
+
+    # the turns of the samples around a discontinuity are not extrema
+    brackets = np.searchsorted(xs, extremumXs)
+    lefts = xs[np.maximum(brackets - 2, 0)]
+    rights = xs[np.minimum(brackets + 1, len(xs) - 1)]
+    nearDiscontinuity = np.searchsorted(discontinuityXs, lefts) != np.searchsorted(discontinuityXs, rights)
+    keep = ~nearDiscontinuity & np.isfinite(extremumYs)
+    extremumXs, extremumYs, isMaximum = extremumXs[keep], extremumYs[keep], isMaximum[keep]
+
+    # the extrema touching 0 are roots without a sign change, like the roots of (x-1)^2
+    touching = np.abs(extremumYs) <= ROOT_TOLERANCE * scale
+    rootXs = mergeClose(np.concatenate((rootXs, extremumXs[touching])), xs)
+    return Features(rootXs, extremumXs, extremumYs, isMaximum, discontinuityXs)
+
+
+class AnalysisCache:
+    # features of the last analysed (equation, range) pairs, the least recently used are dropped
+
+    def __init__(self, maxSize=32):
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+
+    def analyze(self, key, function, xs, ys):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        features = analyze(function, xs, ys)
+        self.entries[key] = features
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+        return features
@@ -0,0 +1,120 @@
+import time
+
+import numpy as np
+
+from Analysis import analyze, AnalysisCache
+from ExpressionParser import compileExpression
+from GraphPlotter import FRAME_BUDGET
+from Sampling import adaptiveSample
+
+
+def features(equation, minX, maxX):
+    function = compileExpression(equation)
+    with np.errstate(all='ignore'):
+        xs, ys = adaptiveSample(function, minX, maxX)
+    return analyze(function, xs, ys)
+
+
+def gridFeatures(equation, xs):
+    # the features of samples at the given x values, like the fixed resolution plots
+    function = compileExpression(equation)
+    with np.errstate(all='ignore'):
+        return analyze(function, xs, function(xs))
+
+
+class TestRoots:
+    def test_sign_changes_are_refined(self):
+        result = features('x^2-2', -3, 3)
+        assert np.allclose(result.rootXs, [-np.sqrt(2), np.sqrt(2)], atol=1e-9)
+
+    def test_roots_on_the_samples(self):
+        result = features('x^3-x', -2, 2)
+        assert np.allclose(result.rootXs, [-1, 0, 1], atol=1e-9)
+
+    def test_roots_without_a_sign_change(self):
+        result = features('(x-1)^2', -3, 3)
+        assert np.allclose(result.rootXs, [1], atol=1e-6)
+
+    def test_root_on_a_sample_and_an_extremum_is_found_once(self):
+        # 0 is a sample where y is 0 and a maximum touching 0
+        result = gridFeatures('x^4-2*x^2', np.linspace(-10, 10, 2001))
+        assert len(result.rootXs) == 3
+        assert np.allclose(result.rootXs, [-np.sqrt(2), 0, np.sqrt(2)], atol=1e-9)
+
+    def test_pole_is_not_a_root(self):
+        result = features('1/(x-0.3)', -1, 1)
+        assert len(result.rootXs) == 0
+        assert np.allclose(result.discontinuityXs, [0.3], atol=1e-9)
+
+
+class TestExtrema:
+    def test_maxima_and_minima(self):
+        result = features('x^3-x', -2, 2)
+        assert np.allclose(result.extremumXs, [-1 / np.sqrt(3), 1 / np.sqrt(3)], atol=1e-6)
+        assert list(result.isMaximum) == [True, False]
+        assert np.allclose(result.extremumYs, result.extremumXs ** 3 - result.extremumXs)
+
+    def test_pole_is_not_an_extremum(self):
+        result = features('1/x', -1, 1)
+        assert len(result.extremumXs) == 0
+        assert np.allclose(result.discontinuityXs, [0], atol=1e-9)
+
+
+class TestDiscontinuities:
+    def test_pole_on_a_sample_is_found_once(self):
+        # the edges of the domain on both sides of the sample at 0 are the same discontinuity
+        result = gridFeatures('1/x', np.linspace(-10, 10, 2001))
+        assert len(result.discontinuityXs) == 1
+        assert np.allclose(result.discontinuityXs, [0], atol=1e-9)
+
+    def test_jump(self):
+        # x / |x| steps from -1 to 1 at 0
+        result = features('x/(x^2)^0.5+x', -1, 1)
+        assert np.allclose(result.discontinuityXs, [0], atol=1e-9)
+        assert len(result.rootXs) == 0
+
+    def test_edge_of_the_domain(self):
+        result = features('x^0.5', -1, 1)
+        assert np.allclose(result.discontinuityXs, [0], atol=1e-9)
+
+    def test_steep_continuous_curve_has_no_jump(self):
+        result = features('x^9', -3, 3)
+        assert len(result.discontinuityXs) == 0
+
+
+class TestAnalysisCache:
+    def test_same_equation_and_range_are_analysed_once(self):
+        function = compileExpression('x^3-x')
+        xs, ys = adaptiveSample(function, -2, 2)
+        cache = AnalysisCache()
+
+        first = cache.analyze((function, -2, 2), function, xs, ys)
+        second = cache.analyze((function, -2, 2), function, xs, ys)
+        cache.analyze((function, -3, 3), function, *adaptiveSample(function, -3, 3))
+
+        assert second is first
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_least_recently_used_range_is_dropped(self):
+        function = compileExpression('x^2')
+        cache = AnalysisCache(maxSize=2)
+        for maxX in (1, 2, 3):
+            cache.analyze((function, -1, maxX), function, *adaptiveSample(function, -1, maxX))
+
+        assert list(cache.entries) == [(function, -1, 2), (function, -1, 3)]
+
+
+class TestFrameBudget:
+    def test_analysis_of_a_full_plot_fits_in_a_frame(self):
+        function = compileExpression('x^3-3*x+1/(x-0.5)')
+        with np.errstate(all='ignore'):
+            xs, ys = adaptiveSample(function, -10, 10)
+        analyze(function, xs, ys)
+
+        # the best of a few runs, the first ones also warm up numpy
+        timings = []
+        for _ in range(5):
+            started = time.perf_counter()
+            analyze(function, xs, ys)
+            timings.append(time.perf_counter() - started)
+        assert min(timings) <= FRAME_BUDGET
@@ -0,0 +1,981 @@
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+import numpy as np
+
+# numexpr is optional, the kernels fall back to numpy without it
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+# messages returned by the validation, they are shown to the user as they are
+CORRECT_EQUATION = 'Correct Equation'
+INVALID_FUNCTION = 'The entered function is not valid.'
+NON_BEGINNING_OPERATOR = "The Equation cannot begin with one of these characters '^' or '*' or '/'"
+NON_ENDING_OPERATOR = "The Equation cannot end with one of these characters '^' or '+' or '-' or '*' or '/'"
+MISSING_X = 'The Equation must have at least one x'
+SPACES_BETWEEN_NUMBERS = 'The Equation cannot have spaces between numbers'
+CONSECUTIVE_OPERATORS = 'The Equation cannot have 2 or more consecutive operators'
+INVALID_CHARACTERS = 'There are invalid characters in the equation'
+CONSECUTIVE_XS = 'The Equation cannot have 2 or more consecutive Xs'
+CONCATENATED_X = 'x cannot be concatenated with something'
+DIVISION_BY_ZERO = 'the denominator of the division cannot be zero'
+NUMBER_BEFORE_OPENING = 'Opening Parentheses cannot have number before it'
+OPERATOR_AFTER_OPENING = 'Opening Parentheses cannot be followed by one of these characters "^" or "*" or "/"'
+UNBALANCED_PARENTHESES = 'Parentheses are not balanced'
+NUMBER_AFTER_CLOSING = 'Closing Parentheses cannot have number after it'
+OPERATOR_BEFORE_CLOSING = 'Closing Parentheses cannot be preceded by one of these characters "^" or "+" or "-" or "*" or "/"'
+MISPLACED_DOT = "'.' is only used in float numbers"
+MULTIPLE_DOTS = 'float number cannot contain more than one dot'
+CONCATENATED_PARAMETER = 'A parameter cannot be concatenated with something'
+
+OPERATORS = set('^+-/*')
+NON_BEGINNING_OPERATORS = set('^*/')
+NUMBER_CHARACTERS = set('0123456789.')
+
+# numpy functions used for each binary operator of the tree
+BINARY_FUNCTIONS = {
+    '+': np.add,
+    '-': np.subtract,
+    '*': np.multiply,
+    '/': np.divide,
+    '^': np.power,
+}
+
+# source of each binary operator in the expressions given to numexpr
+NUMEXPR_OPERATORS = {'+': '+', '-': '-', '*': '*', '/': '/', '^': '**'}
+# deepest nesting of parentheses given to numexpr, the python parser stops at 200 levels
+NUMEXPR_DEPTH = 100
+
+# number of x values evaluated at once by a Kernel, the buffers of a block stay in the cache,
+# smaller arrays are evaluated faster by the chain of numpy operations
+BLOCK_SIZE = 16384
+CHAIN_SIZE = 65536
+
+# kind is one of 'number', 'x', 'parameter', 'operator', 'open', 'close' or 'invalid'
+Token = namedtuple('Token', ['kind', 'text', 'start', 'end'])
+# the result of the checks of a token against the one before it
+TokenCheck = namedtuple('TokenCheck', ['message', 'numbersWithSpaces', 'signBeforeOperator', 'multipleDots'])
+# the result of the checks of a token in its place in the equation
+TokenMark = namedtuple('TokenMark', ['message', 'depth', 'x', 'numbersWithSpaces', 'signBeforeOperator',
+                                     'operatorsAroundSigns', 'unparsable', 'run'])
+# what the validation needs of consecutive tokens, see summarizeMarks
+MarksSummary = namedtuple('MarksSummary', ['x', 'numbersWithSpaces', 'signBeforeOperator', 'operatorsAroundSigns',
+                                           'unparsable', 'depth', 'lowest', 'firstMessage'])
+
+
+class ParseError(ValueError):
+    pass
+
+
+def tokenize(expression, start=0, end=None, parameters=()):
+    # split the expression (or the part of it between start and end) into tokens in a single pass,
+    # the names of parameters are tokens of their own instead of invalid characters
+    expression = expression.lower()
+    if end is None:
+        end = len(expression)
+
+    tokens = []
+    i = start
+    while i < end:
+        char = expression[i]
+
+        if char == ' ':
+            i += 1
+            continue
+
+        tokenStart = i
+        if char in NUMBER_CHARACTERS:
+            # a number keeps all its digits and dots so the dots can be checked as a whole
+            while i < end and expression[i] in NUMBER_CHARACTERS:
+                i += 1
+            kind = 'number'
+        elif char == 'x':
+            i += 1
+            kind = 'x'
+        elif char in OPERATORS:
+            i += 1
+            kind = 'operator'
+        elif char == '(':
+            i += 1
+            kind = 'open'
+        elif char == ')':
+            i += 1
+            kind = 'close'
+        else:
+            # group the consecutive invalid characters in one token
+            while i < end and expression[i] != ' ' and expression[i] not in NUMBER_CHARACTERS \
+                    and expression[i] not in OPERATORS and expression[i] not in 'x()':
+                i += 1
+            kind = 'parameter' if expression[tokenStart:i] in parameters else 'invalid'
+
+        tokens.append(Token(kind, expression[tokenStart:i], tokenStart, i))
+
+    return tokens
+
+
+def pairMessage(previous, token):
+    # check a token against the one before it, returns None if the pair is valid
+    if previous.text in NON_BEGINNING_OPERATORS and token.text in NON_BEGINNING_OPERATORS:
+        return CONSECUTIVE_OPERATORS
+
+    if token.kind == 'x':
+        if previous.kind == 'x':
+            return CONSECUTIVE_XS
+        if previous.kind in ('number', 'close'):
+            return CONCATENATED_X
+    elif previous.kind == 'x' and token.kind in ('number', 'open'):
+        return CONCATENATED_X
+
+    # a parameter is used like x, with an operator between it and the numbers and xs next to it
+    if token.kind == 'parameter' and previous.kind in ('number', 'close', 'x', 'parameter'):
+        return CONCATENATED_PARAMETER
+    if previous.kind == 'parameter' and token.kind in ('number', 'open', 'x'):
+        return CONCATENATED_PARAMETER
+
+    if previous.text == '/' and token.kind == 'number' and numberMessage(token) is None \
+            and float(token.text) == 0:
+        return DIVISION_BY_ZERO
+
+    if token.kind == 'open' and previous.kind == 'number':
+        return NUMBER_BEFORE_OPENING
+    if previous.kind == 'open' and token.text in NON_BEGINNING_OPERATORS:
+        return OPERATOR_AFTER_OPENING
+    if previous.kind == 'close' and token.kind == 'number' and token.text[0] != '.':
+        return NUMBER_AFTER_CLOSING
+    if token.kind == 'close' and previous.kind == 'operator':
+        return OPERATOR_BEFORE_CLOSING
+
+    return None
+
+
+def numberMessage(token):
+    # a dot must be surrounded by digits and a number can only have one dot
+    text = token.text
+    if text[0] == '.' or text[-1] == '.' or '..' in text:
+        return MISPLACED_DOT
+    if text.count('.') > 1:
+        return MULTIPLE_DOTS
+    return None
+
+
+def checkToken(previous, token):
+    # the checks of a token that only depend on the token itself and the one before it, a number
+    # with several dots is reported after the checks of the next token like the dots were before
+    numbersWithSpaces = previous is not None and previous.kind == 'number' and token.kind == 'number' \
+        and previous.text[-1] != '.' and token.text[0] != '.'
+    signBeforeOperator = previous is not None and previous.text in ('+', '-') \
+        and token.text in NON_BEGINNING_OPERATORS
+
+    multipleDots = False
+    if token.kind == 'invalid':
+        message = INVALID_CHARACTERS
+    else:
+        message = pairMessage(previous, token) if previous is not None else None
+        if message is None and token.kind == 'number':
+            message = numberMessage(token)
+            if message == MULTIPLE_DOTS:
+                message = None
+                multipleDots = True
+
+    return TokenCheck(message, numbersWithSpaces, signBeforeOperator, multipleDots)
+
+
+def checkTokens(tokens, start=0, end=None):
+    # check the tokens between start and end against the tokens before them
+    if end is None:
+        end = len(tokens)
+    return [checkToken(tokens[i - 1] if i > 0 else None, tokens[i]) for i in range(start, end)]
+
+
+def markToken(previous, previousCheck, token, check, following, run):
+    # the part of the validation of a token that depends on the tokens around it, run is the
+    # length of the run of operators like '*-+/' since its first '^', '*' or '/' before the token,
+    # counted up to 2 which is all the rule needs, so a change of it stops after a few tokens
+    kind = token.kind
+    operatorsAroundSigns = False
+    if kind == 'operator':
+        # two of '^', '*' and '/' with other operators between them, a '*' can only begin the run
+        if run and previous.end != token.start:
+            run = 0
+        if token.text in NON_BEGINNING_OPERATORS:
+            operatorsAroundSigns = run >= 2
+            run = 1 if token.text == '*' or run == 0 else 2
+        elif run:
+            run = 2
+    else:
+        run = 0
+
+    # the rule broken by the token, a ')' followed by a digit is reported on the ')' and a number
+    # with several dots after the checks of the next token
+    if kind == 'close' and following is not None and following.text[0].isdigit():
+        message = NUMBER_AFTER_CLOSING
+    else:
+        message = check.message
+    if message is None and previousCheck is not None and previousCheck.multipleDots:
+        message = MULTIPLE_DOTS
+
+    # '()' and ')(' pass the checks but cannot be parsed
+    unparsable = previous is not None and (previous.kind, kind) in (('open', 'close'), ('close', 'open'))
+    depth = 1 if kind == 'open' else -1 if kind == 'close' else 0
+    return TokenMark(message, depth, kind == 'x', check.numbersWithSpaces, check.signBeforeOperator,
+                     operatorsAroundSigns, unparsable, run)
+
+
+def markTokens(tokens, checks, start=0, end=None, run=0, previous=None, previousCheck=None, following=None):
+    # the marks of the tokens between start and end, the tokens before and after the list and the
+    # run of operators before start can be given when the list is a part of the equation
+    if end is None:
+        end = len(tokens)
+    marks = []
+    for i in range(start, end):
+        if i > 0:
+            previous, previousCheck = tokens[i - 1], checks[i - 1]
+        mark = markToken(previous, previousCheck, tokens[i], checks[i],
+                         tokens[i + 1] if i + 1 < len(tokens) else following, run)
+        run = mark.run
+        marks.append(mark)
+    return marks
+
+
+def summarizeMarks(marks):
+    # what the validation needs of consecutive marks: the rules broken anywhere in them, the
+    # change of the depth of parentheses and its lowest point, and the first mark with a message
+    depth = lowest = 0
+    firstMessage = None
+    for index, mark in enumerate(marks):
+        depth += mark.depth
+        if depth < lowest:
+            lowest = depth
+        if firstMessage is None and mark.message is not None:
+            firstMessage = index
+    return MarksSummary(any(mark.x for mark in marks), any(mark.numbersWithSpaces for mark in marks),
+                        any(mark.signBeforeOperator for mark in marks),
+                        any(mark.operatorsAroundSigns for mark in marks), any(mark.unparsable for mark in marks),
+                        depth, lowest, firstMessage)
+
+
+def validationMessage(parts, first, last, lastCheck):
+    # combine the marks in the order of the checks of the first validator: the whole-equation
+    # rules, then the first rule broken from the left, then the parentheses left open, the sign
+    # before an operator like in 'x+*2' was accepted by it and is reported last, parts are the
+    # (marks, summary) of consecutive parts of the tokens from first to last
+    hasX = numbersWithSpaces = signBeforeOperator = operatorsAroundSigns = unparsable = False
+    positionMessage = None
+    depth = 0
+    for marks, summary in parts:
+        hasX = hasX or summary.x
+        numbersWithSpaces = numbersWithSpaces or summary.numbersWithSpaces
+        signBeforeOperator = signBeforeOperator or summary.signBeforeOperator
+        operatorsAroundSigns = operatorsAroundSigns or summary.operatorsAroundSigns
+        unparsable = unparsable or summary.unparsable
+
+        if positionMessage is None:
+            # a ')' with no '(' left open comes before the other rule broken by the same token
+            unbalanced = None
+            if depth + summary.lowest < 0:
+                level = depth
+                for index, mark in enumerate(marks):
+                    level += mark.depth
+                    if level < 0:
+                        unbalanced = index
+                        break
+            if unbalanced is not None and (summary.firstMessage is None or unbalanced <= summary.firstMessage):
+                positionMessage = UNBALANCED_PARENTHESES
+            elif summary.firstMessage is not None:
+                positionMessage = marks[summary.firstMessage].message
+        depth += summary.depth
+
+    if first.text in NON_BEGINNING_OPERATORS:
+        return NON_BEGINNING_OPERATOR
+    if last.kind == 'operator':
+        return NON_ENDING_OPERATOR
+    if not hasX:
+        return MISSING_X
+    if numbersWithSpaces:
+        return SPACES_BETWEEN_NUMBERS
+    if operatorsAroundSigns:
+        return CONSECUTIVE_OPERATORS
+    if positionMessage is not None:
+        return positionMessage
+    if depth != 0:
+        return UNBALANCED_PARENTHESES
+    if lastCheck.multipleDots:
+        return MULTIPLE_DOTS
+    if signBeforeOperator:
+        return CONSECUTIVE_OPERATORS
+    if unparsable:
+        return INVALID_FUNCTION
+    return CORRECT_EQUATION
+
+
+def validateTokens(tokens, checks=None):
+    if not tokens:
+        return MISSING_X
+    if checks is None:
+        checks = checkTokens(tokens)
+    marks = markTokens(tokens, checks)
+    return validationMessage([(marks, summarizeMarks(marks))], tokens[0], tokens[-1], checks[-1])
+
+
+# binding power of the operators of the parser, 'neg' is the unary minus, it binds less than '^'
+# so '-x^2' is '-(x^2)', and '^' is the only operator grouped from the right, so '2^3^2' is '2^(3^2)'
+PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2, 'neg': 3, '^': 4}
+
+
+def reduceOperator(operator, operands):
+    # replace the operands of the operator on top of the operand stack by its node
+    if operator == 'neg':
+        operands.append(('neg', operands.pop()))
+    else:
+        right = operands.pop()
+        operands.append((operator, operands.pop(), right))
+
+
+def parseTokens(tokens):
+    # operator precedence parser with explicit stacks instead of recursion, so the depth of the
+    # parentheses and the length of the equation are not limited by the recursion limit, with the
+    # precedence of python
+    #
+    #   expression := term (('+' | '-') term)*
+    #   term       := unary (('*' | '/') unary)*
+    #   unary      := ('+' | '-') unary | power
+    #   power      := atom ('^' unary)?
+    #   atom       := number | 'x' | parameter | '(' expression ')'
+    #
+    # the tree is made of tuples: ('number', value), ('x',), ('parameter', name), ('neg', operand)
+    # and (operator, left, right)
+    operands = []
+    operators = []
+    expectOperand = True
+
+    for token in tokens:
+        if expectOperand:
+            if token.text == '-':
+                operators.append('neg')
+            elif token.text == '+':
+                # a unary plus leaves its operand as it is
+                pass
+            elif token.kind == 'number':
+                operands.append(('number', float(token.text)))
+                expectOperand = False
+            elif token.kind == 'x':
+                operands.append(('x',))
+                expectOperand = False
+            elif token.kind == 'parameter':
+                operands.append(('parameter', token.text))
+                expectOperand = False
+            elif token.kind == 'open':
+                operators.append('(')
+            else:
+                raise ParseError('unexpected ' + repr(token.text))
+        elif token.kind == 'operator':
+            precedence = PRECEDENCE[token.text]
+            while operators and operators[-1] != '(' and (PRECEDENCE[operators[-1]] > precedence or (
+                    PRECEDENCE[operators[-1]] == precedence and token.text != '^')):
+                reduceOperator(operators.pop(), operands)
+            operators.append(token.text)
+            expectOperand = True
+        elif token.kind == 'close':
+            while operators and operators[-1] != '(':
+                reduceOperator(operators.pop(), operands)
+            if not operators:
+                raise ParseError('unexpected )')
+            operators.pop()
+        else:
+            raise ParseError('unexpected ' + repr(token.text))
+
+    if expectOperand:
+        raise ParseError('unexpected end of the equation')
+    while operators:
+        operator = operators.pop()
+        if operator == '(':
+            raise ParseError('expected )')
+        reduceOperator(operator, operands)
+    return operands[0]
+
+
+def parse(expression, parameters=()):
+    # validate the expression and return its tree, raises ParseError with the message otherwise
+    tokens = tokenize(expression, parameters=parameters)
+    message = validateTokens(tokens)
+    if message != CORRECT_EQUATION:
+        raise ParseError(message)
+    try:
+        return parseTokens(tokens)
+    except (ParseError, RecursionError):
+        raise ParseError(INVALID_FUNCTION)
+
+
+def validateExpression(expression, parameters=()):
+    try:
+        parse(expression, parameters)
+    except ParseError as error:
+        return str(error)
+    return CORRECT_EQUATION
+
+
+# the characters compared at once when looking for the edited part of a text
+COMPARED_LENGTH = 256
+# the tokens of a TokenBlock of the IncrementalValidator
+TOKEN_BLOCK = 64
+
+
+def commonPrefixLength(first, second):
+    # compare pieces of the strings, then binary search the piece that differs, so the characters
+    # are compared by the string comparison without copying the whole strings
+    length = min(len(first), len(second))
+    low = 0
+    while low + COMPARED_LENGTH <= length and first[low:low + COMPARED_LENGTH] == second[low:low + COMPARED_LENGTH]:
+        low += COMPARED_LENGTH
+    high = min(low + COMPARED_LENGTH, length)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[low:middle] == second[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def commonSuffixLength(first, second, limit=None):
+    # the same from the ends of the strings, at most limit characters
+    length = min(len(first), len(second))
+    if limit is not None:
+        length = min(length, limit)
+    firstEnd, secondEnd = len(first), len(second)
+    low = 0
+    while low + COMPARED_LENGTH <= length and \
+            first[firstEnd - low - COMPARED_LENGTH:firstEnd - low] == second[secondEnd - low - COMPARED_LENGTH:secondEnd - low]:
+        low += COMPARED_LENGTH
+    high = min(low + COMPARED_LENGTH, length)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[firstEnd - middle:firstEnd - low] == second[secondEnd - middle:secondEnd - low]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def shiftTokens(tokens, shift):
+    if shift == 0:
+        return tokens
+    return [token._replace(start=token.start + shift, end=token.end + shift) for token in tokens]
+
+
+class TokenBlock:
+    # consecutive tokens of the IncrementalValidator with their checks and marks, and the summary
+    # of the marks, the positions of the tokens are moved by offset, the length added before the
+    # block since they were tokenized, so an edit does not have to move the tokens after it
+
+    def __init__(self, tokens, checks, marks):
+        self.tokens = tokens
+        self.checks = checks
+        self.marks = marks
+        self.summary = summarizeMarks(marks)
+        self.offset = 0
+
+    def shifted(self):
+        return shiftTokens(self.tokens, self.offset)
+
+    def lastToken(self):
+        return shiftTokens(self.tokens[-1:], self.offset)[0]
+
+
+class IncrementalValidator:
+    # validates an equation that is edited while it is typed, the tokens are kept in blocks with
+    # the summary of their marks, so a keystroke only tokenizes, checks and marks the blocks
+    # around the edited part of the text again and combines the summaries of the others, the
+    # equation is only parsed when the tree is used, once the typing pauses
+
+    def __init__(self, parameters=(), blockSize=TOKEN_BLOCK):
+        self.parameters = tuple(parameters)
+        self.blockSize = blockSize
+        self.text = ''
+        self.blocks = []
+        self.message = MISSING_X
+        self.parsedTree = None
+        self.parsed = True
+        # the number of characters tokenized again by the last update
+        self.tokenizedLength = 0
+
+    @property
+    def tokens(self):
+        return [token for block in self.blocks for token in block.shifted()]
+
+    @property
+    def checks(self):
+        return [check for block in self.blocks for check in block.checks]
+
+    @property
+    def tree(self):
+        if not self.parsed:
+            self.parsed = True
+            try:
+                self.parsedTree = parseTokens(self.tokens)
+            except ParseError:
+                self.message = INVALID_FUNCTION
+        return self.parsedTree
+
+    def update(self, text):
+        text = text.lower()
+        oldText = self.text
+        blocks = self.blocks
+
+        # the edited part of the text is what is left between the common prefix and suffix
+        prefix = commonPrefixLength(oldText, text)
+        suffix = commonSuffixLength(oldText, text, min(len(oldText), len(text)) - prefix)
+        oldEditEnd = len(oldText) - suffix
+        shift = len(text) - len(oldText)
+
+        # the blocks with the tokens around the edit, from the last token ending before it to the
+        # first token starting after it, and small blocks are joined to the next one
+        first = bisect_left(blocks, prefix, key=lambda block: block.tokens[-1].end + block.offset)
+        if first > 0 and (first == len(blocks) or blocks[first].tokens[0].end + blocks[first].offset >= prefix):
+            first -= 1
+        last = bisect_right(blocks, oldEditEnd, key=lambda block: block.tokens[0].start + block.offset) - 1
+        if last < len(blocks) - 1 and (last < 0 or blocks[last].tokens[-1].start + blocks[last].offset <= oldEditEnd):
+            last += 1
+        last = max(first, last)
+        while blocks and sum(len(block.tokens) for block in blocks[first:last + 1]) < self.blockSize:
+            if last < len(blocks) - 1:
+                last += 1
+            elif first > 0:
+                first -= 1
+            else:
+                break
+
+        region = blocks[first:last + 1]
+        tokens = [token for block in region for token in block.shifted()]
+        checks = [check for block in region for check in block.checks]
+
+        # tokens ending before the edit and starting after it cannot be changed by it
+        left = bisect_left(tokens, prefix, key=lambda token: token.end)
+        right = bisect_right(tokens, oldEditEnd, key=lambda token: token.start)
+
+        windowStart = tokens[left - 1].end if left > 0 else 0
+        windowEnd = tokens[right].start + shift if right < len(tokens) else len(text)
+        middle = tokenize(text, windowStart, windowEnd, self.parameters)
+        self.tokenizedLength = windowEnd - windowStart
+
+        newTokens = tokens[:left] + middle + shiftTokens(tokens[right:], shift)
+        # check the new tokens and the first token after them, its previous token changed
+        checkedEnd = min(left + len(middle) + 1, len(newTokens))
+        checks = checks[:left] + checkTokens(newTokens, left, checkedEnd) + checks[right + 1:]
+
+        # mark the tokens again from the end of the block before them
+        run, previous, previousCheck = 0, None, None
+        if first > 0:
+            run = blocks[first - 1].marks[-1].run
+            previous, previousCheck = blocks[first - 1].lastToken(), blocks[first - 1].checks[-1]
+        following = blocks[last + 1].tokens[0] if last + 1 < len(blocks) else None
+        marks = markTokens(newTokens, checks, run=run, previous=previous, previousCheck=previousCheck,
+                           following=following)
+
+        size = max(1, len(newTokens) // self.blockSize)
+        bounds = [len(newTokens) * index // size for index in range(size + 1)]
+        newBlocks = [TokenBlock(newTokens[start:end], checks[start:end], marks[start:end])
+                     for start, end in zip(bounds, bounds[1:]) if end > start]
+
+        # the run of operators goes on in the next blocks while it changed
+        oldRun = region[-1].marks[-1].run if region else 0
+        run = marks[-1].run if marks else run
+        for block in blocks[last + 1:]:
+            block.offset += shift
+        for index in range(last + 1, len(blocks)):
+            if run == oldRun:
+                break
+            block = blocks[index]
+            oldRun = block.marks[-1].run
+            block.tokens = block.shifted()
+            block.offset = 0
+            before = newBlocks[-1] if index == last + 1 and newBlocks else blocks[index - 1]
+            following = blocks[index + 1].tokens[0] if index + 1 < len(blocks) else None
+            block.marks = markTokens(block.tokens, block.checks, run=run, previous=before.lastToken(),
+                                     previousCheck=before.checks[-1], following=following)
+            block.summary = summarizeMarks(block.marks)
+            run = block.marks[-1].run
+
+        self.blocks = blocks[:first] + newBlocks + blocks[last + 1:]
+        self.text = text
+
+        self.parsedTree = None
+        self.parsed = True
+        if not self.blocks:
+            self.message = MISSING_X
+            return self.message
+        self.message = validationMessage([(block.marks, block.summary) for block in self.blocks],
+                                         self.blocks[0].tokens[0], self.blocks[-1].tokens[-1],
+                                         self.blocks[-1].checks[-1])
+        self.parsed = self.message != CORRECT_EQUATION
+        return self.message
+
+
+def foldTree(tree, combine):
+    # combine(node, operands) for every node of the tree from the leaves up, operands are the
+    # results of its operands, with a stack instead of recursion so deep trees can be folded
+    results = []
+    stack = [(tree, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if node[0] in ('number', 'x', 'parameter'):
+            results.append(combine(node, ()))
+        elif expanded:
+            count = len(node) - 1
+            operands = results[-count:]
+            del results[-count:]
+            results.append(combine(node, operands))
+        else:
+            stack.append((node, True))
+            stack.extend((operand, False) for operand in reversed(node[1:]))
+    return results[0]
+
+
+def compileNode(node):
+    # returns a float for constant sub-trees and a function of the x values otherwise
+    kernel = Kernel(node)
+    if kernel.isConstant(kernel.result):
+        return kernel.values[kernel.result]
+    return kernel.chain
+
+
+def compileChain(tree):
+    # the tree as a chain of numpy operations, each of them allocates a new array
+    return Kernel(tree).chain
+
+
+class Kernel:
+    # evaluates a tree block by block through a few preallocated buffers, every operator writes
+    # into a buffer with the out argument of its ufunc instead of allocating a new array, and the
+    # last one writes straight into the result
+    #
+    # the values are addressed by slots: slot 0 holds the x values of the block, the other slots
+    # are constants or registers, and the buffer of a register is reused once it was read
+
+    def __init__(self, tree, blockSize=BLOCK_SIZE):
+        self.blockSize = blockSize
+        self.values = [None]
+        self.registers = []
+        self.freeRegisters = []
+        self.steps = []
+        self.result = foldTree(tree, self.addNode)
+
+    def isConstant(self, slot):
+        return slot != 0 and slot not in self.registers
+
+    def addSlot(self, value=None):
+        self.values.append(value)
+        return len(self.values) - 1
+
+    def addNode(self, node, operands):
+        # returns the slot of the node, operands are the slots of its operands
+        kind = node[0]
+        if kind == 'number':
+            return self.addSlot(node[1])
+        if kind == 'x':
+            return 0
+
+        function = np.negative if kind == 'neg' else BINARY_FUNCTIONS[kind]
+        operands = tuple(operands)
+
+        # fold the constant sub-trees so they are computed once instead of on every evaluation
+        if all(self.isConstant(operand) for operand in operands):
+            return self.addSlot(float(function(*(np.float64(self.values[operand]) for operand in operands))))
+
+        # the operands are not needed after this step, so their buffers can hold the result
+        for operand in operands:
+            if operand in self.registers:
+                self.freeRegisters.append(operand)
+        if self.freeRegisters:
+            destination = self.freeRegisters.pop()
+        else:
+            destination = self.addSlot()
+            self.registers.append(destination)
+        self.steps.append((function, operands, destination))
+        return destination
+
+    def chain(self, xs):
+        # the steps without the buffers, every operation allocates its result like the chain of
+        # numpy calls of the first compiler, which is faster on small arrays
+        if self.result == 0:
+            return xs
+        if self.isConstant(self.result):
+            return np.full(np.shape(xs), self.values[self.result])
+        values = list(self.values)
+        values[0] = xs
+        for function, operands, destination in self.steps:
+            values[destination] = function(*[values[operand] for operand in operands])
+        return values[self.result]
+
+    def __call__(self, xs, out=None):
+        xs = np.asarray(xs)
+        if xs.dtype.kind != 'f':
+            xs = xs.astype(float)
+        if xs.size <= CHAIN_SIZE:
+            if out is None:
+                return self.chain(xs)
+            out[...] = self.chain(xs)
+            return out
+        if out is None:
+            out = np.empty(xs.shape, dtype=xs.dtype)
+        flat = xs.reshape(-1)
+        result = out.reshape(-1)
+
+        if self.result == 0:
+            result[:] = flat
+            return out
+        if self.isConstant(self.result):
+            result.fill(self.values[self.result])
+            return out
+
+        size = len(flat)
+        blockSize = max(min(self.blockSize, size), 1)
+        buffers = [np.empty(blockSize, dtype=result.dtype) for _ in self.registers]
+        values = list(self.values)
+        steps = self.steps[:-1]
+        lastFunction, lastOperands, _ = self.steps[-1]
+
+        for start in range(0, size, blockSize):
+            stop = min(start + blockSize, size)
+            values[0] = flat[start:stop]
+            for register, buffer in zip(self.registers, buffers):
+                values[register] = buffer[:stop - start]
+
+            for function, operands, destination in steps:
+                function(*[values[operand] for operand in operands], out=values[destination])
+            lastFunction(*[values[operand] for operand in lastOperands], out=result[start:stop])
+        return out
+
+
+def numexprSource(tree):
+    # the expression of the tree for numexpr, None when it has a constant numexpr cannot parse or
+    # when it is nested too deeply for the python parser numexpr uses
+    def combine(node, operands):
+        # a float for the constant sub-trees, folded like compileNode, and the source with its
+        # depth of parentheses otherwise
+        kind = node[0]
+        if kind == 'number':
+            return node[1]
+        if kind == 'x':
+            return 'x', 0
+        if kind == 'parameter' or None in operands:
+            return None
+        if not any(isinstance(operand, tuple) for operand in operands):
+            function = np.negative if kind == 'neg' else BINARY_FUNCTIONS[kind]
+            return float(function(*(np.float64(operand) for operand in operands)))
+
+        sources = []
+        depth = 0
+        for operand in operands:
+            if isinstance(operand, tuple):
+                sources.append(operand[0])
+                depth = max(depth, operand[1])
+            elif np.isfinite(operand):
+                sources.append(repr(operand))
+            else:
+                return None
+        if depth >= NUMEXPR_DEPTH:
+            return None
+        if kind == 'neg':
+            return '(-%s)' % sources[0], depth + 1
+        return '(%s %s %s)' % (sources[0], NUMEXPR_OPERATORS[kind], sources[1]), depth + 1
+
+    source = foldTree(tree, combine)
+    if isinstance(source, tuple):
+        return source[0]
+    if source is None or not np.isfinite(source):
+        return None
+    return repr(source)
+
+
+class NumexprKernel:
+    # evaluates the tree with numexpr, which also works in blocks without temporary arrays and
+    # uses several threads
+
+    def __init__(self, source):
+        self.source = source
+
+    def __call__(self, xs, out=None):
+        xs = np.asarray(xs)
+        if xs.dtype.kind != 'f':
+            xs = xs.astype(float)
+        result = numexpr.evaluate(self.source, local_dict={'x': xs}, out=out)
+
+        # numexpr ignores np.errstate, the values numpy would have raised on are reported the same way
+        state = np.geterr()
+        if 'raise' in (state['divide'], state['over'], state['invalid']) and not np.isfinite(result).all():
+            raise FloatingPointError('non finite value in the result of ' + self.source)
+        return result
+
+
+def compileKernel(tree):
+    return Kernel(tree)
+
+
+def compileNumexpr(tree):
+    # falls back to the numpy kernel when numexpr is not installed or cannot take the expression
+    source = numexprSource(tree) if numexpr is not None else None
+    if source is None:
+        return Kernel(tree)
+    return NumexprKernel(source)
+
+
+# ways to compile a tree into a function of the x values, numexpr is the default when it is installed
+BACKENDS = {
+    'chain': compileChain,
+    'kernel': compileKernel,
+    'numexpr': compileNumexpr,
+}
+DEFAULT_BACKEND = 'numexpr' if numexpr is not None else 'kernel'
+
+
+def compileTree(tree, backend=None):
+    # compile the tree into a vectorized function of a numpy array of x values, raises ParseError
+    # when the tree cannot be compiled
+    try:
+        return BACKENDS[backend or DEFAULT_BACKEND](tree)
+    except RecursionError:
+        raise ParseError(INVALID_FUNCTION)
+
+
+def compileExpression(expression, backend=None):
+    return compileTree(parse(expression), backend)
+
+
+class CompiledGroup:
+    # evaluates several trees on the same x values into the rows of one array, the sub-trees that
+    # appear more than once, in the same tree or in different ones, are computed once
+    #
+    # the trees are flattened into steps that each compute one sub-tree into a slot, slot 0 holds
+    # the x values and the constants have slots of their own
+
+    def __init__(self, trees, parameters=()):
+        self.values = [None]
+        self.steps = []
+        self.slots = {('x',): 0}
+        # the parameters have the slots after x, their values are given with the x values
+        for name in parameters:
+            self.slots[('parameter', name)] = self.addSlot()
+        self.outputs = [foldTree(tree, self.addNode) for tree in trees]
+
+        # the intermediate arrays are dropped after the last step that reads them
+        lastUses = {}
+        for index, (slot, function, operands) in enumerate(self.steps):
+            lastUses[slot] = index
+            for operand in operands:
+                lastUses[operand] = index
+        self.freed = [[] for _ in self.steps]
+        for slot, index in lastUses.items():
+            if slot != 0 and self.values[slot] is None:
+                self.freed[index].append(slot)
+
+        # the rows written by each step, and the rows that are constant or equal to x
+        self.rowsOf = {}
+        for row, slot in enumerate(self.outputs):
+            self.rowsOf.setdefault(slot, []).append(row)
+
+    def addSlot(self, value=None):
+        self.values.append(value)
+        return len(self.values) - 1
+
+    def addNode(self, node, operands):
+        # returns the slot of the node, operands are the slots of its operands, the identical
+        # sub-trees share their slot as they have the same operator and operand slots
+        kind = node[0]
+        key = node if kind in ('number', 'x', 'parameter') else (kind,) + tuple(operands)
+        if key in self.slots:
+            return self.slots[key]
+
+        if kind == 'number':
+            slot = self.addSlot(node[1])
+        else:
+            slot = self.addStep(np.negative if kind == 'neg' else BINARY_FUNCTIONS[kind], tuple(operands))
+        self.slots[key] = slot
+        return slot
+
+    def addStep(self, function, operands):
+        # fold the steps of constants, like compileNode
+        if all(operand != 0 and self.values[operand] is not None for operand in operands):
+            return self.addSlot(float(function(*(np.float64(self.values[operand]) for operand in operands))))
+        slot = self.addSlot()
+        self.steps.append((slot, function, operands))
+        return slot
+
+    def __len__(self):
+        return len(self.outputs)
+
+    def __call__(self, xs, out=None):
+        # returns an array with one row of y values for each tree, written into out when given
+        xs = np.asarray(xs, dtype=float)
+        if out is None:
+            out = np.empty((len(self.outputs),) + xs.shape)
+
+        values = list(self.values)
+        values[0] = xs
+        for slot, rows in self.rowsOf.items():
+            if slot == 0 or values[slot] is not None:
+                out[rows] = values[slot]
+
+        for index, (slot, function, operands) in enumerate(self.steps):
+            values[slot] = function(*[values[operand] for operand in operands])
+            if slot in self.rowsOf:
+                out[self.rowsOf[slot]] = values[slot]
+            for freedSlot in self.freed[index]:
+                values[freedSlot] = None
+        return out
+
+
+def compileTrees(trees):
+    try:
+        return CompiledGroup(list(trees))
+    except RecursionError:
+        raise ParseError(INVALID_FUNCTION)
+
+
+def compileExpressions(expressions):
+    return compileTrees(parse(expression) for expression in expressions)
+
+
+class CompiledFamily(CompiledGroup):
+    # a tree with parameters as a function of the x values and the values of the parameters, in
+    # the order of their names, the arrays are broadcast against each other so a column of values
+    # of a parameter and the x values give a (value, x) grid in one pass
+
+    def __init__(self, tree, parameters):
+        self.parameters = tuple(parameters)
+        CompiledGroup.__init__(self, [tree], self.parameters)
+
+    def __call__(self, xs, *parameterValues):
+        xs = np.asarray(xs, dtype=float)
+        values = list(self.values)
+        values[0] = xs
+        for slot, value in enumerate(parameterValues, start=1):
+            values[slot] = np.asarray(value, dtype=float)
+        shape = np.broadcast_shapes(*(np.shape(value) for value in values[:len(self.parameters) + 1]))
+
+        # the result is kept when it is computed, its slot is freed like the intermediate ones
+        output = self.outputs[0]
+        result = values[output]
+        for index, (slot, function, operands) in enumerate(self.steps):
+            values[slot] = function(*[values[operand] for operand in operands])
+            if slot == output:
+                result = values[slot]
+            for freedSlot in self.freed[index]:
+                values[freedSlot] = None
+        return np.broadcast_to(result, shape)
+
+    def bind(self, parameterValues):
+        # a function of the x values alone, with the parameters set to parameterValues
+        parameterValues = tuple(float(value) for value in parameterValues)
+        return lambda xs: self(xs, *parameterValues)
+
+
+def compileFamily(expression, parameters):
+    parameters = tuple(parameters)
+    tree = parse(expression, parameters)
+    try:
+        return CompiledFamily(tree, parameters)
+    except RecursionError:
+        raise ParseError(INVALID_FUNCTION)
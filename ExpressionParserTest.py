@@ -0,0 +1,394 @@
+import re
+
+import numpy as np
+import pytest
+
+import ExpressionParser
+from ExpressionParser import tokenize, parse, validateExpression, compileExpression, compileExpressions, ParseError, \
+    IncrementalValidator
+
+
+def baselineValidation(expression):
+    # the character by character validation used by the GUI before the tokenizer, the messages
+    # of the tokenizer must be the same, including which one wins when several rules are broken
+    expression = expression.lower()
+    operators = set('^+-/*')
+    nonBeginningOperators = set('^*/')
+    if expression[0] in nonBeginningOperators:
+        return "The Equation cannot begin with one of these characters '^' or '*' or '/'"
+    if expression[-1] in operators:
+        return "The Equation cannot end with one of these characters '^' or '+' or '-' or '*' or '/'"
+    if expression.count('x') == 0:
+        return 'The Equation must have at least one x'
+    if re.search(r"\d+\s+\d+", expression):
+        return 'The Equation cannot have spaces between numbers'
+    if re.search(r"([*/^])([+-^])+([*/^])", expression):
+        return 'The Equation cannot have 2 or more consecutive operators'
+
+    expression = expression.replace(' ', '')
+    openParentheses = 0
+    dotCount = 0
+    for i, char in enumerate(expression):
+        previous = expression[i - 1] if i > 0 else ''
+        following = expression[i + 1] if i + 1 < len(expression) else ''
+        if char not in set('0123456789.x^+-/*() '):
+            return 'There are invalid characters in the equation'
+        if char in nonBeginningOperators and previous in nonBeginningOperators and previous:
+            return 'The Equation cannot have 2 or more consecutive operators'
+        if char == 'x' and previous == 'x':
+            return 'The Equation cannot have 2 or more consecutive Xs'
+        if (char == 'x' and (previous.isdigit() or previous in ('.', ')') and previous)) or \
+                (char.isdigit() and previous == 'x') or (char in '.(' and previous == 'x'):
+            return 'x cannot be concatenated with something'
+        if char == '0' and previous == '/':
+            return 'the denominator of the division cannot be zero'
+        if char == '(':
+            openParentheses += 1
+            if previous.isdigit():
+                return 'Opening Parentheses cannot have number before it'
+            if following in nonBeginningOperators and following:
+                return 'Opening Parentheses cannot be followed by one of these characters "^" or "*" or "/"'
+        elif char == ')':
+            if openParentheses == 0:
+                return 'Parentheses are not balanced'
+            openParentheses -= 1
+            if following.isdigit():
+                return 'Closing Parentheses cannot have number after it'
+            if previous in operators and previous:
+                return 'Closing Parentheses cannot be preceded by one of these characters "^" or "+" or "-" or "*" or "/"'
+        if char == '.':
+            if not previous.isdigit() or not following.isdigit():
+                return "'.' is only used in float numbers"
+            dotCount += 1
+        elif not char.isdigit():
+            if dotCount > 1:
+                return 'float number cannot contain more than one dot'
+            dotCount = 0
+    if openParentheses != 0:
+        return 'Parentheses are not balanced'
+    if dotCount > 1:
+        return 'float number cannot contain more than one dot'
+    return 'Correct Equation'
+
+
+def changedOnPurpose(expression):
+    # the inputs where the tokenizer fixed the old validation: the regex of consecutive operators
+    # matched numbers between them ('x*2/3'), '/0' was a division by zero even in 'x/0.5', the
+    # spaces around the equation or inside a number were ignored, and the old validation
+    # accepted a sign before an operator ('x+*2')
+    spaceless = expression.replace(' ', '')
+    return (expression != expression.strip() or expression[0] == '.' or ' .' in expression
+            or '. ' in expression or '/0' in spaceless
+            or bool(re.search(r"([*/^])([+-^])+([*/^])", expression))
+            and not re.search(r"([*/^])([+\-/^])+([*/^])", expression))
+
+
+class TestTokenizer:
+    def test_token_kinds(self):
+        tokens = tokenize('2.5*(X - 1)')
+        assert [token.kind for token in tokens] == ['number', 'operator', 'open', 'x', 'operator', 'number', 'close']
+        assert [token.text for token in tokens] == ['2.5', '*', '(', 'x', '-', '1', ')']
+
+    def test_token_positions(self):
+        tokens = tokenize('x +  10')
+        assert [(token.start, token.end) for token in tokens] == [(0, 1), (2, 3), (5, 7)]
+
+    def test_invalid_characters_are_grouped(self):
+        tokens = tokenize('gh+x')
+        assert tokens[0].kind == 'invalid'
+        assert tokens[0].text == 'gh'
+
+
+class TestValidation:
+    def test_operators_between_numbers(self):
+        assert validateExpression('x*2/3') == 'Correct Equation'
+        assert validateExpression('x^2*3') == 'Correct Equation'
+
+    def test_non_zero_float_denominator(self):
+        assert validateExpression('x/0.5') == 'Correct Equation'
+        assert validateExpression('x/0.0') == 'the denominator of the division cannot be zero'
+
+    def test_operator_after_sign(self):
+        assert validateExpression('x+*2') == 'The Equation cannot have 2 or more consecutive operators'
+
+    def test_unparsable_equation(self):
+        assert validateExpression('x+()') == 'The entered function is not valid.'
+        assert validateExpression('(x+1)(x+2)') == 'The entered function is not valid.'
+
+    def test_parse_raises_message(self):
+        with pytest.raises(ParseError, match='The Equation must have at least one x'):
+            parse('2')
+
+    def test_first_message_of_several_errors(self):
+        assert validateExpression('x+*(') == 'Parentheses are not balanced'
+        assert validateExpression('1x/*x') == 'x cannot be concatenated with something'
+        assert validateExpression('+) 1-x') == 'Parentheses are not balanced'
+        assert validateExpression('(x+1.2.3') == 'Parentheses are not balanced'
+        assert validateExpression('+)2+x') == 'Parentheses are not balanced'
+
+    def test_same_messages_as_the_baseline_validation(self):
+        random = np.random.default_rng(0)
+        alphabet = list('x0123.+-*/^() g')
+        compared = 0
+        for _ in range(20000):
+            expression = ''.join(random.choice(alphabet, int(random.integers(1, 9))))
+            if changedOnPurpose(expression):
+                continue
+            expected = baselineValidation(expression)
+            # the old validation accepted some equations that cannot be plotted
+            if expected != 'Correct Equation':
+                assert validateExpression(expression) == expected, expression
+                compared += 1
+        assert compared > 5000
+
+
+class TestIncrementalValidation:
+    def test_matches_full_validation_while_typing(self):
+        validator = IncrementalValidator()
+        expression = '2*(x+2)^3 - x/4 + 1.5'
+        for end in range(1, len(expression) + 1):
+            assert validator.update(expression[:end]) == validateExpression(expression[:end])
+            assert validator.tokens == tokenize(expression[:end])
+
+    def test_matches_full_validation_after_random_edits(self):
+        random = np.random.default_rng(0)
+        alphabet = list('x0123.+-*/^() g')
+        validator = IncrementalValidator()
+        text = ''
+        for _ in range(3000):
+            position = int(random.integers(0, len(text) + 1))
+            if random.random() < 0.6 or not text:
+                text = text[:position] + ''.join(random.choice(alphabet, int(random.integers(1, 4)))) + text[position:]
+            else:
+                text = text[:position] + text[position + int(random.integers(1, 4)):]
+            text = text[:30]
+
+            message = validator.update(text)
+            if text:
+                assert message == validateExpression(text), text
+
+    def test_matches_full_validation_in_small_blocks(self):
+        # long texts in blocks of a few tokens, so the edits join, split and cross the blocks
+        random = np.random.default_rng(1)
+        alphabet = ['x', '2', '.5', '1.', '0', '(', ')', '+', '-', '*', '/', '^', ' ', '*-', '(x)']
+        validator = IncrementalValidator(blockSize=4)
+        text = ''
+        for _ in range(2000):
+            position = int(random.integers(0, len(text) + 1))
+            if random.random() < 0.6 or not text:
+                text = text[:position] + ''.join(random.choice(alphabet, int(random.integers(1, 4)))) + text[position:]
+            else:
+                text = text[:position] + text[position + int(random.integers(1, 8)):]
+            text = text[:200]
+
+            message = validator.update(text)
+            assert validator.tokens == tokenize(text)
+            if text.strip():
+                assert message == validateExpression(text), text
+
+    def test_tree_is_parsed_when_used(self):
+        validator = IncrementalValidator()
+        validator.update('2*x+1')
+        assert not validator.parsed
+        assert validator.tree == parse('2*x+1')
+        assert validator.parsed
+        validator.update('2*x+')
+        assert validator.tree is None
+
+    def test_only_the_edited_part_is_tokenized(self):
+        validator = IncrementalValidator()
+        expression = '+'.join(['(x^2-3*x/4)'] * 100)
+        validator.update(expression)
+
+        validator.update(expression[:480] + "2*" + expression[480:])
+        assert validator.tokenizedLength < 10
+        assert validator.message == 'Correct Equation'
+        assert validator.tree == parse(expression[:480] + "2*" + expression[480:])
+
+
+class TestParser:
+    def test_tree(self):
+        assert parse('2*x+1') == ('+', ('*', ('number', 2.0), ('x',)), ('number', 1.0))
+
+    def test_unary_minus_binds_looser_than_power(self):
+        assert parse('-x^2') == ('neg', ('^', ('x',), ('number', 2.0)))
+
+    def test_power_is_right_associative(self):
+        assert parse('x^2^3') == ('^', ('x',), ('^', ('number', 2.0), ('number', 3.0)))
+
+    def test_unary_plus_is_dropped(self):
+        assert parse('x + +-2') == ('+', ('x',), ('neg', ('number', 2.0)))
+
+
+class TestCompilation:
+    @pytest.mark.parametrize('expression', [
+        'x^2', '(x+2)^3*x-1/x', '-x^2', 'x^-2', '2^3^x', 'x + --2', '2*(x+2)^3', 'x*2/3/4', 'x-x-x',
+    ])
+    def test_matches_python_evaluation(self, expression):
+        xs = np.linspace(0.5, 3, 11)
+        expected = eval(expression.replace('^', '**'), {'x': xs})
+        assert np.allclose(compileExpression(expression)(xs), expected)
+
+    def test_constants_are_folded(self):
+        assert ExpressionParser.compileNode(parse('x+2*3^2')[2]) == 18.0
+
+    def test_division_by_zero_raises_when_requested(self):
+        function = compileExpression('x/(x-x)')
+        with np.errstate(all='raise'):
+            with pytest.raises(FloatingPointError):
+                function(np.linspace(-1, 1, 4))
+
+    def test_invalid_expression_raises(self):
+        with pytest.raises(ParseError):
+            compileExpression('x^^2')
+
+
+class TestKernel:
+    BACKENDS = ['chain', 'kernel', 'numexpr']
+
+    @pytest.mark.parametrize('backend', BACKENDS)
+    @pytest.mark.parametrize('size', [11, 100003])
+    @pytest.mark.parametrize('expression', ['(x+2)^3*x-1/x', '-x^2', '2^3^x', 'x + --2', 'x', '0*x+3*4'])
+    def test_matches_python_evaluation(self, backend, size, expression):
+        xs = np.linspace(0.5, 3, size)
+        expected = eval(expression.replace('^', '**'), {'x': xs})
+        assert np.allclose(compileExpression(expression, backend)(xs), expected)
+
+    def test_result_is_written_into_out(self):
+        xs = np.linspace(0, 1, 100003)
+        out = np.empty_like(xs)
+        assert ExpressionParser.Kernel(parse('x*(x+1)'))(xs, out) is out
+        assert np.allclose(out, xs * (xs + 1))
+
+    def test_buffers_are_reused(self):
+        # the sum of 100 terms needs a buffer for the sum and one for the current term
+        kernel = ExpressionParser.Kernel(parse('+'.join('%d*x^%d' % (power + 1, power % 5) for power in range(100))))
+        assert len(kernel.steps) > 100
+        assert len(kernel.registers) == 2
+
+    def test_float32_stays_float32(self):
+        xs = np.linspace(0, 1, 100003, dtype=np.float32)
+        assert compileExpression('(x+1)/2', 'kernel')(xs).dtype == np.float32
+
+    def test_division_by_zero_raises_when_requested(self):
+        function = compileExpression('1/x', 'kernel')
+        with np.errstate(all='raise'):
+            with pytest.raises(FloatingPointError):
+                function(np.linspace(-1, 1, 100001))
+
+    def test_numexpr_source(self):
+        assert ExpressionParser.numexprSource(parse('-(x+2)^(2*3)')) == '(-((x + 2.0) ** 6.0))'
+
+    def test_numexpr_errors_follow_the_error_state(self):
+        pytest.importorskip('numexpr')
+        function = compileExpression('1/x', 'numexpr')
+        assert isinstance(function, ExpressionParser.NumexprKernel)
+        with np.errstate(all='raise'):
+            with pytest.raises(FloatingPointError):
+                function(np.linspace(-1, 1, 101))
+
+
+class TestGroupCompilation:
+    EXPRESSIONS = ['x^2', 'x^2+1', '(x^2+1)*x', '-(2*3)+0*x', 'x', '3*x^2-1/(x^2+1)']
+
+    def test_rows_match_the_single_functions(self):
+        xs = np.linspace(-2, 2, 9)
+        ys = compileExpressions(self.EXPRESSIONS)(xs)
+
+        assert ys.shape == (len(self.EXPRESSIONS), len(xs))
+        for expression, row in zip(self.EXPRESSIONS, ys):
+            assert np.allclose(row, compileExpression(expression)(xs) * np.ones_like(xs))
+
+    def test_shared_subexpressions_are_computed_once(self):
+        # x^2, x^2+1, (x^2+1)*x and 1/(x^2+1) are each one step
+        group = compileExpressions(['x^2', 'x^2+1', '(x^2+1)*x', '1/(x^2+1)'])
+        assert len(group.steps) == 4
+
+        separate = sum(len(compileExpressions([expression]).steps)
+                       for expression in ['x^2', 'x^2+1', '(x^2+1)*x', '1/(x^2+1)'])
+        assert separate == 9
+
+    def test_result_is_written_into_out(self):
+        xs = np.linspace(0, 1, 5)
+        out = np.zeros((2, 5))
+        assert compileExpressions(['x+1', '2*x'])(xs, out) is out
+        assert np.allclose(out, [xs + 1, 2 * xs])
+
+
+class TestDeepEquations:
+    # the parser and the compilers use stacks instead of recursion, so these are not limited by
+    # the recursion limit
+    NESTED = '(' * 2000 + 'x' + ')' * 2000
+    SIGNS = '-' * 3001 + 'x'
+    SUM = '+'.join('%d*x' % (term + 1) for term in range(1500))
+
+    def test_validation(self):
+        for expression in (self.NESTED, self.SIGNS, self.SUM, '^'.join(['x'] * 2000)):
+            assert validateExpression(expression) == ExpressionParser.CORRECT_EQUATION
+        assert validateExpression('(' * 2000 + 'x' + ')' * 1999) == ExpressionParser.UNBALANCED_PARENTHESES
+
+    @pytest.mark.parametrize('backend', TestKernel.BACKENDS)
+    @pytest.mark.parametrize('size', [11, 100003])
+    def test_evaluation(self, backend, size):
+        xs = np.linspace(0.5, 3, size)
+        assert np.allclose(compileExpression(self.NESTED, backend)(xs), xs)
+        assert np.allclose(compileExpression(self.SIGNS, backend)(xs), -xs)
+        assert np.allclose(compileExpression(self.SUM, backend)(xs), 1500 * 1501 / 2 * xs)
+
+    def test_numexpr_source_of_deep_trees(self):
+        # the python parser used by numexpr cannot take them, they are evaluated by the Kernel
+        assert ExpressionParser.numexprSource(parse(self.SUM)) is None
+        assert ExpressionParser.numexprSource(parse('(' * 2000 + 'x+1' + ')' * 2000)) == '(x + 1.0)'
+
+    def test_group_of_the_same_deep_equations(self):
+        xs = np.linspace(0.5, 3, 5)
+        group = compileExpressions([self.SUM, self.SUM, self.NESTED])
+        assert len(group.steps) == 2999
+        assert np.allclose(group(xs), [1500 * 1501 / 2 * xs] * 2 + [xs])
+
+    def test_incremental_validation(self):
+        validator = ExpressionParser.IncrementalValidator()
+        assert validator.update(self.SUM) == ExpressionParser.CORRECT_EQUATION
+        assert validator.update(self.SUM + '+') == ExpressionParser.NON_ENDING_OPERATOR
+        assert validator.update(self.NESTED) == ExpressionParser.CORRECT_EQUATION
+
+
+class TestParameters:
+    def test_names_are_tokens(self):
+        tokens = tokenize('a*x+bc', parameters=('a', 'bc'))
+        assert [token.kind for token in tokens] == ['parameter', 'operator', 'x', 'operator', 'parameter']
+        # without the names they are still invalid characters
+        assert validateExpression('a*x+bc') == ExpressionParser.INVALID_CHARACTERS
+
+    def test_validation(self):
+        assert validateExpression('a*x^2+b', ('a', 'b')) == ExpressionParser.CORRECT_EQUATION
+        assert validateExpression('a*x+c', ('a', 'b')) == ExpressionParser.INVALID_CHARACTERS
+        assert validateExpression('ax', ('a',)) == ExpressionParser.CONCATENATED_PARAMETER
+        assert validateExpression('x*2a', ('a',)) == ExpressionParser.CONCATENATED_PARAMETER
+        assert validateExpression('a(x)', ('a',)) == ExpressionParser.CONCATENATED_PARAMETER
+        assert validateExpression('a*2', ('a',)) == ExpressionParser.MISSING_X
+
+    def test_tree(self):
+        assert parse('-a*x', ('a',)) == ('*', ('neg', ('parameter', 'a')), ('x',))
+
+    def test_incremental_validation(self):
+        validator = ExpressionParser.IncrementalValidator(('a',))
+        validator.update('a*x')
+        assert validator.message == ExpressionParser.CORRECT_EQUATION
+        validator.update('ab*x')
+        assert validator.message == ExpressionParser.INVALID_CHARACTERS
+
+    def test_family_is_broadcast_over_the_values(self):
+        family = ExpressionParser.compileFamily('a*x^2+b', ('a', 'b'))
+        xs = np.linspace(-2, 2, 5)
+        values = np.array([[0.5], [1.0], [2.0]])
+
+        grid = family(xs, values, 3)
+
+        assert grid.shape == (3, 5)
+        assert np.allclose(grid, values * xs ** 2 + 3)
+        assert np.allclose(family.bind((2, -1))(xs), 2 * xs ** 2 - 1)
+
+    def test_family_without_steps_of_its_parameter(self):
+        family = ExpressionParser.compileFamily('x+0*a', ('a',))
+        assert family(np.arange(3.0), np.array([[1.0], [2.0]])).shape == (2, 3)
@@ -1,22 +1,230 @@
-import re as re
+import statistics
 import sys
-import warnings
+import time
+from collections import deque
 
-from PySide6.QtCore import Signal
+from PySide6.QtCore import Qt, Signal, QTimer, QObject, QRunnable, QThreadPool
 from PySide6.QtWidgets import QApplication, QVBoxLayout, QPushButton, QLineEdit, QLabel, QMessageBox, QWidget, \
-    QHBoxLayout, QGroupBox
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-import numpy as np
-from sympy import symbols, lambdify
+    QHBoxLayout, QGroupBox, QProgressBar, QCheckBox, QListWidget, QFileDialog, QSlider
 
+from Instrumentation import PlotInstrumentation
+
+# numpy, matplotlib and the modules using them are imported on first use, so the window is shown
+# before they are loaded, see MainApp.ensurePlotting and PrewarmWorker
+
+
+class PlotSignals(QObject):
+    # the results are sent back to the GUI thread with the generation of the job and
+    # a dictionary with the evaluation time and the profile of the worker
+    finished = Signal(int, object, object, object)
+    failed = Signal(int)
+
+
+class ExportSignals(QObject):
+    # the path of the exported file, or the message of the error
+    finished = Signal(str)
+    failed = Signal(str)
 
-class MainApp(QWidget):
+
+class PrewarmSignals(QObject):
+    finished = Signal()
+
+
+class PrewarmWorker(QRunnable):
+    # loads the plotting modules in the background after the window was shown
 
     def __init__(self):
+        QRunnable.__init__(self)
+        self.signals = PrewarmSignals()
+
+    def run(self):
+        import matplotlib.backends.backend_qt5agg
+        import PlotterCore
+        import PlotRenderer
+        self.signals.finished.emit()
+
+
+class PlotArea:
+    # the figure, canvas, toolbar and renderer, created the first time they are needed
+
+    def __init__(self, parent):
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas, \
+            NavigationToolbar2QT as NavigationToolbar
+        from matplotlib.figure import Figure
+        from PlotRenderer import PlotRenderer
+
+        # create a figure and a canvas for the plot
+        self.figure = Figure()
+        self.canvas = FigureCanvas(self.figure)
+        # toolbar to zoom and pan the plot
+        self.toolbar = NavigationToolbar(self.canvas, parent)
+        # the axes and the line are created once and reused by every plot
+        self.renderer = PlotRenderer(self.figure, self.canvas)
+
+
+class PlotWorker(QRunnable):
+
+    def __init__(self, generation, function, minX, maxX, sampleBudget, sampleTolerance, isCurrent, profile=False,
+                 stream=None, cache=None):
+        QRunnable.__init__(self)
+        self.profile = profile
+        # the options of PlotterCore.stream when the function is sampled at a fixed resolution
+        self.stream = stream
+        # the SampleCache the adaptive sampling starts from
+        self.cache = cache
+        self.generation = generation
+        self.function = function
+        self.minX = minX
+        self.maxX = maxX
+        self.sampleBudget = sampleBudget
+        self.sampleTolerance = sampleTolerance
+        self.isCurrent = isCurrent
+        self.signals = PlotSignals()
+
+    def cancelled(self):
+        return not self.isCurrent(self.generation)
+
+    def run(self):
+        # a newer plot was requested while this one was waiting in the pool
+        if self.cancelled():
+            return
+
+        import PlotterCore
+
+        # cProfile only profiles the thread it was enabled in, the GUI thread has its own profile
+        profile = None
+        if self.profile:
+            import cProfile
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # newer Pythons allow a single profiler at a time for all the threads
+                profile = None
+
+        started = time.perf_counter()
+        try:
+            if self.stream is None:
+                xs, ys = PlotterCore.sample(self.function, self.minX, self.maxX, None, self.sampleBudget,
+                                            self.sampleTolerance, cancelled=self.cancelled, cache=self.cache)
+            else:
+                xs, ys = PlotterCore.stream(self.function, self.minX, self.maxX, cancelled=self.cancelled,
+                                            **self.stream)
+        except Exception:
+            self.signals.failed.emit(self.generation)
+            return
+        finally:
+            if profile is not None:
+                profile.disable()
+
+        evaluation = {'seconds': time.perf_counter() - started, 'profile': profile}
+        self.signals.finished.emit(self.generation, xs, ys, evaluation)
+
+
+class OverlayWorker(PlotWorker):
+    # evaluates all the equations of the overlay on one grid of sampleBudget points, the function
+    # is a CompiledGroup and the y values come back as an array with a row per equation
+
+    def run(self):
+        if self.cancelled():
+            return
+        import PlotterCore
+        import Sampling
+
+        started = time.perf_counter()
+        try:
+            xs, ys = Sampling.sampleGroup(self.function, self.minX, self.maxX, self.sampleBudget,
+                                          cancelled=self.cancelled)
+        except (PlotterCore.PlotError, ArithmeticError, ValueError):
+            self.signals.failed.emit(self.generation)
+            return
+        if self.cancelled():
+            return
+        evaluation = {'seconds': time.perf_counter() - started, 'profile': None}
+        self.signals.finished.emit(self.generation, xs, ys, evaluation)
+
+
+class ExportWorker(QRunnable):
+    # writes the raw samples of a function to a .npy file, chunk by chunk
+
+    def __init__(self, path, function, minX, maxX, samples, options):
+        QRunnable.__init__(self)
+        self.path = path
+        self.function = function
+        self.minX = minX
+        self.maxX = maxX
+        self.samples = samples
+        self.options = options
+        self.signals = ExportSignals()
+
+    def run(self):
+        import PlotterCore
+        try:
+            PlotterCore.stream(self.function, self.minX, self.maxX, self.samples, export=self.path, **self.options)
+        except (PlotterCore.PlotError, OSError) as error:
+            self.signals.failed.emit(str(error))
+            return
+        self.signals.finished.emit(self.path)
+
+
+# time available to validate and draw one frame while plotting as the user types
+FRAME_BUDGET = 1 / 60
+
+# the sliders of the parameters go from PARAMETER_RANGE[0] to PARAMETER_RANGE[1] in SLIDER_TICKS
+# steps and start at DEFAULT_PARAMETER, the equation is evaluated at once for PRECOMPUTED_ROWS
+# evenly spaced values of a slider when it is first moved
+PARAMETER_RANGE = (-5.0, 5.0)
+SLIDER_TICKS = 200
+DEFAULT_PARAMETER = 1.0
+PRECOMPUTED_ROWS = 21
+
+
+class MainApp(QWidget):
+    # emitted when a plot job was drawn or reported as invalid
+    plotCompleted = Signal()
+    # emitted with the path of the file when the export of the samples is done
+    exportCompleted = Signal(str)
+    # emitted with the message when the export failed, no file is left at the path then
+    exportFailed = Signal(str)
+
+    def __init__(self, cacheSize=128, sampleBudget=2000, sampleTolerance=1e-3, liveDelay=150, prewarm=True,
+                 instrumentation=False, samples=None, memoryLimit=64 * 2 ** 20, float32=False,
+                 sampleCacheBytes=64 * 2 ** 20):
         QWidget.__init__(self)
         self.message_box_shown = Signal(str)
 
+        # timings of the stages of the plots, shown under the plot when enabled
+        self.instrumentation = PlotInstrumentation(enabled=instrumentation)
+        self.pendingProfile = None
+        self.timingLabel = QLabel()
+        self.timingLabel.setVisible(instrumentation)
+
+        # cache of compiled equations so re-plotting over a new range skips the parsing,
+        # created on first use with the plotting modules
+        self.cacheSize = cacheSize
+        self.lazyEquationCache = None
+
+        # cache of the evaluated parts of the plotted functions, so panning and small changes of
+        # the range only evaluate the new part, it keeps at most sampleCacheBytes of y values
+        self.sampleCacheBytes = sampleCacheBytes
+        self.lazySampleCache = None
+
+        # roots, extrema and discontinuities of the plotted function shown as markers, they are
+        # found from the samples of the plot and kept per equation and range
+        self.analysisCheckBox = QCheckBox('Show roots, extrema and discontinuities')
+        self.lazyAnalysisCache = None
+
+        # the adaptive sampling uses at most sampleBudget points and refines the curve
+        # until it is within sampleTolerance of the range of y
+        self.sampleBudget = sampleBudget
+        self.sampleTolerance = sampleTolerance
+
+        # with samples the function is evaluated at that many evenly spaced points instead, in
+        # chunks that fit in memoryLimit bytes, in single precision when float32 is set
+        self.samples = samples
+        self.memoryLimit = memoryLimit
+        self.float32 = float32
+
         self.layout = QVBoxLayout(self)
 
         # create a label and input for the equation
@@ -75,22 +283,224 @@ class MainApp(QWidget):
 
         # create a button to plot the function
         self.plotButton = QPushButton('Plot Function')
-
-        # create a figure and a canvas for the plot
-        self.figure = Figure()
-        self.canvas = FigureCanvas(self.figure)
+        # button to save the samples of the plotted function to a .npy file
+        self.exportButton = QPushButton('Export Samples')
+
+        # the overlay plots a list of equations together over the range of x, the equation of
+        # the input is added to the list with the add button
+        self.overlayEquations = []
+        self.overlayList = QListWidget()
+        self.overlayList.setFixedHeight(70)
+        self.addOverlayButton = QPushButton('Add to Overlay')
+        self.removeOverlayButton = QPushButton('Remove')
+        self.plotOverlayButton = QPushButton('Plot Overlay')
+
+        # vertical layout for the buttons of the overlay next to its list
+        overlayButtonsLayout = QVBoxLayout()
+        overlayButtonsLayout.addWidget(self.addOverlayButton)
+        overlayButtonsLayout.addWidget(self.removeOverlayButton)
+        overlayButtonsLayout.addWidget(self.plotOverlayButton)
+        overlayLayout = QHBoxLayout()
+        overlayLayout.addWidget(self.overlayList)
+        overlayLayout.addLayout(overlayButtonsLayout)
+
+        # create a group box for the overlay
+        overlayGroupBox = QGroupBox()
+        overlayGroupBox.setTitle('Overlay of Equations')
+        overlayGroupBox.setLayout(overlayLayout)
+
+        # plot while typing, the errors are shown under the inputs instead of in message boxes
+        self.liveCheckBox = QCheckBox('Plot while typing')
+        self.inlineMessage = QLabel()
+        self.inlineMessage.setStyleSheet('color: red')
+        self.inlineMessage.hide()
+
+        # the timer waits until the typing pauses so only the last text is plotted, the equation
+        # is validated on every change but only the edited part of it is checked again
+        self.liveTimer = QTimer(self)
+        self.liveTimer.setSingleShot(True)
+        self.liveTimer.setInterval(liveDelay)
+        self.liveTimer.timeout.connect(self.livePlot)
+        self.liveValidator = None
+        self.pendingLive = False
+        self.liveStarted = 0
+
+        # the last measured latencies in seconds of the validation on each change, of the
+        # live plots from the end of the typing until the plot is drawn and of the moves of the
+        # sliders of the parameters
+        self.liveLatencies = {'validation': deque(maxlen=200), 'plot': deque(maxlen=200),
+                              'scrub': deque(maxlen=200)}
+
+        # the names of the parameters of the equation, like 'a, b' for a*x^2+b, each of them gets
+        # a slider, moving a slider draws a row of a FamilyGrid instead of plotting again
+        self.parametersInput = QLineEdit()
+        self.parametersInput.setPlaceholderText('a, b')
+        self.parameterNames = ()
+        self.parameterSliders = {}
+        self.parameterSlidersLayout = QVBoxLayout()
+        self.pendingFamily = None
+        self.plottedFamily = None
+        self.familyGrid = None
+
+        parametersLayout = QVBoxLayout()
+        parametersLayout.addWidget(self.parametersInput)
+        parametersLayout.addLayout(self.parameterSlidersLayout)
+        parametersGroupBox = QGroupBox()
+        parametersGroupBox.setTitle('Parameters')
+        parametersGroupBox.setLayout(parametersLayout)
+
+        # busy indicator shown while the function is evaluated
+        self.busyIndicator = QProgressBar()
+        self.busyIndicator.setRange(0, 0)
+        self.busyIndicator.setTextVisible(False)
+        self.busyIndicator.setFixedHeight(8)
+        self.busyIndicator.hide()
+
+        # the function is evaluated in the thread pool so the window stays responsive, every job
+        # gets a new generation and the results of the older generations are dropped
+        self.threadPool = QThreadPool(self)
+        self.plotGeneration = 0
+        self.pendingFunction = None
+
+        # the toolbar and the canvas are added to this layout by ensurePlotting, when the window
+        # is shown the plotting modules are loaded in the background if prewarm is set
+        self.plotArea = None
+        self.plotAreaLayout = QVBoxLayout()
+        self.prewarm = prewarm
+        self.prewarmStarted = False
+
+        # the plotted function is evaluated again for the new view after zooming or panning,
+        # the timer groups the limit changes of a single zoom or pan in one evaluation
+        self.plottedFunction = None
+        self.plottedGroup = None
+        self.plottedSamples = None
+        self.plottedView = None
+        # the range entered for the plotted function, the view has margins around it
+        self.pendingRange = None
+        self.plottedRange = None
+        self.viewportTimer = QTimer(self)
+        self.viewportTimer.setSingleShot(True)
+        self.viewportTimer.setInterval(30)
+        self.viewportTimer.timeout.connect(self.refreshViewport)
 
         # add the group boxes, button and canvas to the main layout
         self.layout.addWidget(wholeEquationGroupBox)
         self.layout.addWidget(wholeRangeXGroupBox)
+        self.layout.addWidget(parametersGroupBox)
+        self.layout.addWidget(self.inlineMessage)
         self.layout.addWidget(self.plotButton)
-        self.layout.addWidget(self.canvas)
+        self.layout.addWidget(self.exportButton)
+        self.layout.addWidget(self.liveCheckBox)
+        self.layout.addWidget(self.analysisCheckBox)
+        self.layout.addWidget(overlayGroupBox)
+        self.layout.addWidget(self.busyIndicator)
+        self.layout.addLayout(self.plotAreaLayout, 1)
+        self.layout.addWidget(self.timingLabel)
         # connect the button to the function plotFunction
         self.plotButton.clicked.connect(self.plotFunction)
+        self.exportButton.clicked.connect(self.exportClicked)
+        self.addOverlayButton.clicked.connect(self.addToOverlay)
+        self.removeOverlayButton.clicked.connect(self.removeFromOverlay)
+        self.plotOverlayButton.clicked.connect(self.plotOverlay)
+
+        self.analysisCheckBox.toggled.connect(self.analysisToggled)
+
+        # connect the inputs to the live plotting
+        self.liveCheckBox.toggled.connect(self.liveToggled)
+        self.equationInput.textChanged.connect(self.equationChanged)
+        self.minimumXInput.textChanged.connect(self.rangeChanged)
+        self.maximumXInput.textChanged.connect(self.rangeChanged)
+        self.parametersInput.textChanged.connect(self.parametersChanged)
+
+    def ensurePlotting(self):
+        # create the figure and the canvas the first time they are needed
+        if self.plotArea is None:
+            self.plotArea = PlotArea(self)
+            self.plotArea.renderer.connectLimitsChanged(self.viewLimitsChanged)
+            self.plotAreaLayout.addWidget(self.plotArea.toolbar)
+            self.plotAreaLayout.addWidget(self.plotArea.canvas)
+        return self.plotArea
+
+    @property
+    def figure(self):
+        return self.ensurePlotting().figure
+
+    @property
+    def canvas(self):
+        return self.ensurePlotting().canvas
+
+    @property
+    def toolbar(self):
+        return self.ensurePlotting().toolbar
+
+    @property
+    def renderer(self):
+        return self.ensurePlotting().renderer
+
+    @property
+    def axes(self):
+        return self.renderer.axes
+
+    @property
+    def plottedLine(self):
+        return self.renderer.line
+
+    @property
+    def equationCache(self):
+        if self.lazyEquationCache is None:
+            from PlotterCore import EquationCache
+            self.lazyEquationCache = EquationCache(self.cacheSize)
+        return self.lazyEquationCache
+
+    @property
+    def sampleCache(self):
+        if self.lazySampleCache is None:
+            from Sampling import SampleCache
+            self.lazySampleCache = SampleCache(self.sampleCacheBytes)
+        return self.lazySampleCache
+
+    @property
+    def analysisCache(self):
+        if self.lazyAnalysisCache is None:
+            from Analysis import AnalysisCache
+            self.lazyAnalysisCache = AnalysisCache()
+        return self.lazyAnalysisCache
+
+    def showEvent(self, event):
+        QWidget.showEvent(self, event)
+        # load the plotting modules once the window is painted
+        if self.prewarm and not self.prewarmStarted:
+            self.prewarmStarted = True
+            QTimer.singleShot(0, self.startPrewarm)
+
+    def startPrewarm(self):
+        worker = PrewarmWorker()
+        worker.signals.finished.connect(self.ensurePlotting)
+        self.threadPool.start(worker)
 
     def plotFunction(self):
-        # create a symbol for x
-        x = symbols('x')
+        # the stages of the plot are timed when the instrumentation is enabled, and profiled
+        # when a profile of this plot was requested, the profile of a plot that did not complete
+        # yet goes on with this one so it is not lost when this plot cancels it
+        self.instrumentation.startPlot()
+        resumed = self.pendingProfile is not None
+        if resumed:
+            self.pendingProfile.enable()
+        else:
+            self.pendingProfile = self.instrumentation.startProfile()
+        try:
+            started = self.checkAndStartPlot()
+        finally:
+            if self.pendingProfile is not None:
+                self.pendingProfile.disable()
+
+        # nothing more will happen in the plot when the inputs were rejected
+        if not started and not resumed:
+            self.finishProfile()
+
+    def checkAndStartPlot(self):
+        # returns True when the inputs are valid and the plot job was started
+        self.showInlineMessage(None)
 
         # get the equation from the input
         equationFunction = self.equationInput.text()
@@ -98,164 +508,488 @@ class MainApp(QWidget):
         if equationFunction == '':
             message = 'Please enter the equation.'
             QMessageBox.warning(self, 'Input Error', message)
-            return
+            return False
 
         # check if the equation is valid
-        validateMessage = self.validateExpression(equationFunction)
+        with self.instrumentation.stage('validate', length=len(equationFunction)):
+            parametersMessage, parameters = self.readParameters()
+            validateMessage = self.validateExpression(equationFunction, parameters or ())
+            rangeMessage, minX, maxX = self.readRange()
+        if parametersMessage is not None:
+            QMessageBox.warning(self, 'Input Error', parametersMessage)
+            return False
+
         if validateMessage != 'Correct Equation':
             QMessageBox.warning(self, 'Input Error', validateMessage)
-            return
+            return False
+
+        if rangeMessage is not None:
+            QMessageBox.warning(self, 'Input Error', rangeMessage)
+            return False
 
         try:
-            # get the minimum and maximum values of x
-            minX = float(self.minimumXInput.text())
-            maxX = float(self.maximumXInput.text())
-        except ValueError:
-            QMessageBox.warning(self, 'Input Error', 'Please enter valid min and max values for x.')
+            # compile the equation into a numpy function
+            with self.instrumentation.stage('compile', cached=equationFunction in self.equationCache):
+                compiledEquation = self.compileEquation(equationFunction, parameters)
+        except Exception:
+            QMessageBox.warning(self, 'Input Error', 'The entered function is not valid.')
+            return False
+
+        self.startPlot(compiledEquation, minX, maxX)
+        return True
+
+    def readRange(self):
+        # returns the error message and the minimum and maximum values of x
+        import PlotterCore
+        return PlotterCore.readRange(self.minimumXInput.text(), self.maximumXInput.text())
+
+    def readParameters(self):
+        # returns the error message and the names of the parameters
+        import PlotterCore
+        return PlotterCore.readParameters(self.parametersInput.text())
+
+    def compileEquation(self, equation, parameters, tree=None):
+        # an equation with parameters is compiled into a CompiledFamily, plotted with the values
+        # of the sliders, the tree of the equation can be given when it was already parsed
+        self.updateSliders(parameters)
+        if not parameters:
+            self.pendingFamily = None
+            return self.equationCache.get(equation, tree)
+
+        import ExpressionParser
+        if tree is None:
+            tree = ExpressionParser.parse(equation, parameters)
+        self.pendingFamily = ExpressionParser.CompiledFamily(tree, parameters)
+        return self.pendingFamily.bind(self.parameterValues())
+
+    def updateSliders(self, names):
+        # a slider with its label for each parameter, the sliders of the same names are kept
+        if names == self.parameterNames:
+            return
+        for slider, label in self.parameterSliders.values():
+            self.parameterSlidersLayout.removeWidget(slider)
+            self.parameterSlidersLayout.removeWidget(label)
+            slider.deleteLater()
+            label.deleteLater()
+        self.parameterSliders = {}
+        self.parameterNames = names
+        self.familyGrid = None
+
+        defaultTick = round((DEFAULT_PARAMETER - PARAMETER_RANGE[0]) / self.parameterStep())
+        for name in names:
+            label = QLabel()
+            slider = QSlider(Qt.Horizontal)
+            slider.setRange(0, SLIDER_TICKS)
+            slider.setValue(defaultTick)
+            slider.valueChanged.connect(lambda tick, name=name: self.parameterMoved(name))
+            slider.sliderReleased.connect(lambda name=name: self.parameterMoved(name))
+            self.parameterSliders[name] = (slider, label)
+            self.parameterSlidersLayout.addWidget(label)
+            self.parameterSlidersLayout.addWidget(slider)
+            self.showParameter(name)
+
+    @staticmethod
+    def parameterStep():
+        return (PARAMETER_RANGE[1] - PARAMETER_RANGE[0]) / SLIDER_TICKS
+
+    def parameterValue(self, tick):
+        return PARAMETER_RANGE[0] + tick * self.parameterStep()
+
+    def parameterValues(self):
+        return tuple(self.parameterValue(self.parameterSliders[name][0].value()) for name in self.parameterNames)
+
+    def showParameter(self, name):
+        slider, label = self.parameterSliders[name]
+        label.setText('%s = %g' % (name, self.parameterValue(slider.value())))
+
+    def parameterMoved(self, name):
+        # draw the row of the value of the slider from the grid of the plotted family, while the
+        # slider is dragged the nearest precomputed row is drawn, and where it lands between two
+        # of them its own row is evaluated and added to the grid
+        self.showParameter(name)
+        if self.plottedFamily is None or self.parameterNames != self.plottedFamily.parameters:
+            return
+        import Sampling
+
+        started = time.perf_counter()
+        slider, _ = self.parameterSliders[name]
+        index = self.parameterNames.index(name)
+        values = self.parameterValues()
+        minX, maxX = self.plottedRange
+        columns = self.plotColumns()
+        if self.familyGrid is None or not self.familyGrid.matches(index, values, minX, maxX, columns):
+            step = SLIDER_TICKS // (PRECOMPUTED_ROWS - 1)
+            rowValues = [self.parameterValue(tick) for tick in range(0, SLIDER_TICKS + 1, step)]
+            self.familyGrid = Sampling.FamilyGrid(self.plottedFamily, index, rowValues, values, minX, maxX, columns)
+
+        dragging = slider.isSliderDown()
+        ys = self.familyGrid.row(values[index], refine=not dragging)
+        if self.analysisCheckBox.isChecked() and dragging:
+            self.renderer.clearMarkers()
+        self.renderer.setData(self.familyGrid.xs, ys)
+
+        # zooming and panning evaluate the function with the values of the sliders
+        self.plottedFunction = self.plottedFamily.bind(values)
+        self.plottedSamples = (self.familyGrid.xs, ys)
+        if not dragging and self.axes.get_xlim() != self.plottedView:
+            # the grid covers the whole range, a zoomed view is sampled again once the slider lands
+            self.refreshViewport()
+        if self.analysisCheckBox.isChecked() and not dragging:
+            self.showAnalysis()
+        self.liveLatencies['scrub'].append(time.perf_counter() - started)
+
+    def parametersChanged(self, text):
+        # the live validator knows the names of the parameters
+        self.liveValidator = None
+        if self.liveCheckBox.isChecked():
+            self.equationChanged(self.equationInput.text())
+
+    def startPlot(self, compiledEquation, minX, maxX, live=False):
+        self.ensurePlotting()
+
+        # a new generation makes the running jobs stop and their results be dropped
+        self.pendingLive = live
+        self.plotGeneration += 1
+        stream = None
+        if self.samples is not None:
+            stream = dict(self.streamOptions(), samples=self.samples, columns=self.plotColumns(),
+                          cache=self.sampleCache)
+        worker = PlotWorker(self.plotGeneration, compiledEquation, minX, maxX, self.sampleBudget,
+                            self.sampleTolerance, self.isCurrentGeneration, self.pendingProfile is not None, stream,
+                            self.sampleCache)
+        worker.signals.finished.connect(self.plotFinished)
+        worker.signals.failed.connect(self.plotFailed)
+        self.pendingFunction = compiledEquation
+        self.pendingRange = (minX, maxX)
+
+        self.busyIndicator.show()
+        self.threadPool.start(worker)
+
+    def streamOptions(self):
+        import numpy as np
+        return {'memoryLimit': self.memoryLimit, 'dtype': np.float32 if self.float32 else np.float64}
+
+    def exportClicked(self):
+        if self.plottedFunction is None:
+            QMessageBox.warning(self, 'Export Error', 'Please plot a function first.')
+            return
+        path, _ = QFileDialog.getSaveFileName(self, 'Export Samples', 'samples.npy', 'NumPy files (*.npy)')
+        if path:
+            self.exportSamples(path)
+
+    def exportSamples(self, path, samples=None):
+        # write the samples of the plotted function over the plotted range to a .npy file of (x, y)
+        # rows, the file is written chunk by chunk so any number of samples can be exported
+        samples = samples or self.samples or self.sampleBudget
+        minX, maxX = self.plottedRange
+        worker = ExportWorker(path, self.plottedFunction, minX, maxX, samples, self.streamOptions())
+        worker.signals.finished.connect(self.exportCompleted)
+        worker.signals.failed.connect(self.showExportError)
+        self.threadPool.start(worker)
+
+    def showExportError(self, message):
+        QMessageBox.warning(self, 'Export Error', message)
+        self.exportFailed.emit(message)
+
+    def isCurrentGeneration(self, generation):
+        return generation == self.plotGeneration
+
+    def plotFinished(self, generation, xs, ys, evaluation):
+        if not self.isCurrentGeneration(generation):
+            return
+        self.busyIndicator.hide()
+        self.instrumentation.record('evaluate', evaluation['seconds'], samples=len(xs))
+
+        import Sampling
+
+        if self.pendingProfile is not None:
+            self.pendingProfile.enable()
+        with self.instrumentation.stage('draw'):
+            # plot the function, dense parts of the curve are reduced to the pixels they cover,
+            # the drawing is done now instead of in the event loop when it is timed
+            self.renderer.setData(*Sampling.decimateMinMax(xs, ys, self.plotColumns()), rescale=True,
+                                  immediate=self.instrumentation.enabled)
+            # the whole plot becomes the home view of the toolbar
+            self.toolbar.update()
+
+        # remember the samples to show them again when the view goes back to the whole plot
+        self.plottedFunction = self.pendingFunction
+        self.plottedFamily = self.pendingFamily
+        self.familyGrid = None
+        self.plottedGroup = None
+        self.plottedSamples = (xs, ys)
+        self.plottedView = self.axes.get_xlim()
+        self.plottedRange = self.pendingRange
+
+        if self.analysisCheckBox.isChecked():
+            self.showAnalysis()
+        self.finishProfile(evaluation['profile'])
+        self.timingLabel.setText(self.instrumentation.summary())
+
+        if self.pendingLive:
+            self.liveLatencies['plot'].append(time.perf_counter() - self.liveStarted)
+        self.plotCompleted.emit()
+
+    def addToOverlay(self):
+        # add the equation of the input to the overlay when it is valid
+        import PlotterCore
+        equationFunction = self.equationInput.text()
+        message = PlotterCore.validate(equationFunction)
+        if message != 'Correct Equation':
+            QMessageBox.warning(self, 'Input Error', message)
             return
 
-        # check if the minimum value of x is greater than the maximum value of x
-        if minX >= maxX:
-            QMessageBox.warning(self, 'Input Error', 'Max value of x should be greater than min value.')
+        self.overlayEquations.append(equationFunction)
+        self.overlayList.addItem('y = ' + equationFunction)
+        self.equationInput.clear()
+
+    def removeFromOverlay(self):
+        row = self.overlayList.currentRow()
+        if row >= 0:
+            del self.overlayEquations[row]
+            self.overlayList.takeItem(row)
+
+    def plotOverlay(self):
+        if not self.overlayEquations:
+            QMessageBox.warning(self, 'Input Error', 'Please add the equations to the overlay.')
+            return
+        rangeMessage, minX, maxX = self.readRange()
+        if rangeMessage is not None:
+            QMessageBox.warning(self, 'Input Error', rangeMessage)
             return
 
-        try:
-            # lambdify the equation
-            with warnings.catch_warnings():
-                warnings.filterwarnings("error")
-                lambdifyEquation = lambdify(x, equationFunction.replace('^', '**').lower(), 'numpy')
-
-                # create an array of x values
-                xs = np.linspace(minX, maxX, 400)
-                # create an array of y values
-                ys = lambdifyEquation(xs)
-
-                # for i in range (len(xs)):
-                #     print(i, xs[i], ys[i])
-
-                # plot the function
-                self.figure.clear()
-                ax = self.figure.subplots()
-                ax.plot(xs, ys)
-                self.canvas.draw()
-
-        except:
+        import PlotterCore
+        self.instrumentation.startPlot()
+        with self.instrumentation.stage('compile', equations=len(self.overlayEquations)):
+            group = PlotterCore.compileGroup(self.overlayEquations)
+        self.startOverlay(group, minX, maxX)
+
+    def startOverlay(self, group, minX, maxX):
+        self.ensurePlotting()
+
+        # the overlay is a plot job like the others, starting it cancels the running plot
+        self.pendingLive = False
+        self.plotGeneration += 1
+        worker = OverlayWorker(self.plotGeneration, group, minX, maxX, self.sampleBudget,
+                               self.sampleTolerance, self.isCurrentGeneration)
+        worker.signals.finished.connect(self.overlayFinished)
+        worker.signals.failed.connect(self.plotFailed)
+        self.pendingFunction = group
+        self.pendingRange = (minX, maxX)
+
+        self.busyIndicator.show()
+        self.threadPool.start(worker)
+
+    def overlayFinished(self, generation, xs, ys, evaluation):
+        if not self.isCurrentGeneration(generation):
+            return
+        self.busyIndicator.hide()
+        self.instrumentation.record('evaluate', evaluation['seconds'], samples=ys.size)
+
+        with self.instrumentation.stage('draw', curves=len(ys)):
+            # the analysis is only done for a single function
+            self.renderer.clearMarkers()
+            self.renderer.setCurves(self.decimateCurves(xs, ys), rescale=True,
+                                    immediate=self.instrumentation.enabled)
+            self.toolbar.update()
+        self.timingLabel.setText(self.instrumentation.summary())
+
+        self.plottedFunction = None
+        self.plottedFamily = None
+        self.plottedGroup = self.pendingFunction
+        self.plottedSamples = (xs, ys)
+        self.plottedView = self.axes.get_xlim()
+        self.plottedRange = self.pendingRange
+        self.plotCompleted.emit()
+
+    def analysisToggled(self, checked):
+        if self.plotArea is None:
+            return
+        if checked and self.plottedFunction is not None:
+            self.showAnalysis()
+        else:
+            self.renderer.clearMarkers()
+
+    def showAnalysis(self):
+        # analyse the samples of the plotted function, the features of an equation and range that
+        # were already analysed come from the cache
+        xs, ys = self.plottedSamples
+        key = (self.plottedFunction, float(xs[0]), float(xs[-1]), len(xs))
+        with self.instrumentation.stage('analyze', samples=len(xs)):
+            features = self.analysisCache.analyze(key, self.plottedFunction, xs, ys)
+            self.renderer.setMarkers(features, immediate=self.instrumentation.enabled)
+
+    def decimateCurves(self, xs, ys):
+        # the (xs, ys) pairs of the rows of ys, reduced to the pixel columns of the plot
+        import Sampling
+        columns = self.plotColumns()
+        return [Sampling.decimateMinMax(xs, row, columns) for row in ys]
+
+    def plotFailed(self, generation):
+        if not self.isCurrentGeneration(generation):
+            return
+        self.busyIndicator.hide()
+
+        self.finishProfile()
+        if self.pendingLive:
+            self.showInlineMessage('The entered function is not valid.')
+        else:
             QMessageBox.warning(self, 'Input Error', 'The entered function is not valid.')
+        self.plotCompleted.emit()
+
+    def finishProfile(self, workerProfile=None):
+        # combine the profiles of the GUI thread and of the worker of the profiled plot
+        if self.pendingProfile is not None:
+            self.instrumentation.finishProfile(self.pendingProfile, workerProfile)
+            self.pendingProfile = None
+
+    def profileNextPlot(self):
+        # profile the next plot started with the plot button with cProfile, the statistics are
+        # logged and kept in instrumentation.lastProfile
+        self.instrumentation.profileNextPlot()
+
+    def closeEvent(self, event):
+        # cancel the running job and wait for it before the window goes away
+        self.plotGeneration += 1
+        self.threadPool.waitForDone()
+        QWidget.closeEvent(self, event)
+
+    def liveToggled(self, checked):
+        self.showInlineMessage(None)
+        if checked:
+            self.equationChanged(self.equationInput.text())
+        else:
+            self.liveTimer.stop()
+
+    def equationChanged(self, text):
+        if not self.liveCheckBox.isChecked():
             return
 
-    def validateExpression(self , expression):
-        # Get the expression from the input
-
-
-        # convert the expression to lower case
-        expression = expression.lower()
-
-        # Initialize valid characters and operators
-        validCharacters = set('0123456789.x^+-/*() ')
-        operators = set('^+-/*')
-        nonBeginningOperators = set('^*/')
-        repeatableOperators = set('+-')
-
-        # Initialize counters for parentheses and dots
-        openParentheses = 0
-        dotCount = 0
-
-        # check if the expression is starting with an invalid operator
-        if expression[0] in nonBeginningOperators:
-            return "The Equation cannot begin with one of these characters '^' or '*' or '/'"
-
-        # check if the expression is ending with an invalid operator
-        if expression[len(expression) - 1] in operators:
-            return "The Equation cannot end with one of these characters '^' or '+' or '-' or '*' or '/'"
-
-        # check if the expression is having at least one x
-        if expression.count('x') == 0:
-            return 'The Equation must have at least one x'
-
-        # check if there is 2 numbers with spaces between them in the expression
-        spacesBetweenNumberPattern = r"\d+\s+\d+"
-        if re.search(spacesBetweenNumberPattern, expression):
-            return 'The Equation cannot have spaces between numbers'
-        invalidFollowingOperators = r"([*/^])([+-^])+([*/^])"
-        if re.search(invalidFollowingOperators, expression):
-            return 'The Equation cannot have 2 or more consecutive operators'
-
-        # remove all spaces from the expression
-        expression = expression.replace(' ', '')
-
-        # Loop through each character in the expression
-        for i, char in enumerate(expression):
-
-            # Check for invalid characters
-            if char not in validCharacters:
-                return 'There are invalid characters in the equation'
-
-            # Check for consecutive operators
-            if 0 < i and char in nonBeginningOperators and expression[i - 1] in nonBeginningOperators:
-                return 'The Equation cannot have 2 or more consecutive operators'
-
-            # Check for consecutive Xs
-            if 0 < i and char == 'x' and expression[i - 1] == 'x':
-                return 'The Equation cannot have 2 or more consecutive Xs'
-
-            # Check for x being part of a number or x with dot or opening parentheses
-            if i > 0 and ((char == 'x' and (expression[i - 1].isdigit() or expression[i - 1] == '.' or expression[i-1] == ')')) or
-                          (char.isdigit() and expression[i - 1] == 'x') or
-                          ((char == '.' or char == '(') and expression[i - 1] == 'x')):
-                return 'x cannot be concatenated with something'
-
-            #check if there is division by zero
-            if (char == '0' and expression[i - 1] == '/'):
-                return 'the denominator of the division cannot be zero'
-
-            # Validating parentheses
-            if char == '(':
-                openParentheses += 1
-                if i > 0 and expression[i - 1].isdigit():
-                    return 'Opening Parentheses cannot have number before it'
-                if i < len(expression) - 1:
-                    if expression[i + 1] in nonBeginningOperators:
-                        return 'Opening Parentheses cannot be followed by one of these characters "^" or "*" or "/"'
-            elif char == ')':
-                if openParentheses == 0:
-                    return 'Parentheses are not balanced'
-                openParentheses -= 1
-                if i + 1 < len(expression) and (expression[i + 1].isdigit()):
-                    return 'Closing Parentheses cannot have number after it'
-                if i > 0:
-                    if expression[i - 1] in operators:
-                        return 'Closing Parentheses cannot be preceded by one of these characters "^" or "+" or "-" or "*" or "/"'
-
-            # Validating dots
-            if char == '.':
-                if i + 1 < len(expression):
-                    if not expression[i - 1].isdigit() or not expression[i + 1].isdigit():
-                        return "'.' is only used in float numbers"
-                else:
-                    return "'.' is only used in float numbers"
-                dotCount += 1
-            elif char.isdigit():
-                continue
-            else:
-                if dotCount > 1:
-                    return 'float number cannot contain more than one dot'
-                dotCount = 0
+        if self.liveValidator is None:
+            from ExpressionParser import IncrementalValidator
+            _, parameters = self.readParameters()
+            self.liveValidator = IncrementalValidator(parameters or ())
+
+        # only the edited part of the equation is checked again
+        started = time.perf_counter()
+        self.liveValidator.update(text)
+        self.liveLatencies['validation'].append(time.perf_counter() - started)
+
+        self.liveTimer.start()
 
-        # Check for unbalanced parentheses
-        if openParentheses != 0:
-            return 'Parentheses are not balanced'
+    def rangeChanged(self, text):
+        if self.liveCheckBox.isChecked():
+            self.liveTimer.start()
 
-        # Check for consecutive dots
-        if dotCount > 1:
-            return 'float number cannot contain more than one dot'
+    def showInlineMessage(self, message):
+        if message is None:
+            self.inlineMessage.hide()
+        else:
+            self.inlineMessage.setText(message)
+            self.inlineMessage.show()
 
-        return 'Correct Equation'
+    def livePlot(self):
+        # the invalid intermediate states are shown under the inputs while typing
+        equationFunction = self.equationInput.text()
+        if equationFunction == '':
+            self.showInlineMessage('Please enter the equation.')
+            return
+        # the names of the parameters are needed to validate the equation
+        parametersMessage, parameters = self.readParameters()
+        if parametersMessage is not None:
+            self.showInlineMessage(parametersMessage)
+            return
+        if self.liveValidator.message != 'Correct Equation':
+            self.showInlineMessage(self.liveValidator.message)
+            return
+
+        rangeMessage, minX, maxX = self.readRange()
+        if rangeMessage is not None:
+            self.showInlineMessage(rangeMessage)
+            return
+
+        self.showInlineMessage(None)
+        self.instrumentation.startPlot()
+        if self.liveLatencies['validation']:
+            self.instrumentation.record('validate', self.liveLatencies['validation'][-1], incremental=True)
+        cached = equationFunction in self.equationCache
+        with self.instrumentation.stage('compile', cached=cached):
+            # the validator only parses the equation when its tree is used, a cached one is not
+            tree = None if cached and not parameters else self.liveValidator.tree
+            compiledEquation = self.compileEquation(equationFunction, parameters, tree)
+        self.liveStarted = time.perf_counter()
+        self.startPlot(compiledEquation, minX, maxX, live=True)
+
+    def liveLatencySummary(self):
+        # median and maximum latency in milliseconds of each stage of the live plotting
+        summary = {}
+        for stage, latencies in self.liveLatencies.items():
+            if latencies:
+                summary[stage] = {
+                    'count': len(latencies),
+                    'median': statistics.median(latencies) * 1000,
+                    'max': max(latencies) * 1000,
+                    'withinFrameBudget': max(latencies) <= FRAME_BUDGET,
+                }
+        return summary
+
+    def plotColumns(self):
+        return self.renderer.columns()
+
+    def viewLimitsChanged(self, ax):
+        self.viewportTimer.start()
+
+    def refreshViewport(self):
+        if self.plottedGroup is not None:
+            self.refreshOverlayViewport()
+            return
+        if self.plottedFunction is None:
+            return
+        import Sampling
+
+        minX, maxX = self.axes.get_xlim()
+        columns = self.plotColumns()
+        if (minX, maxX) == self.plottedView:
+            xs, ys = Sampling.decimateMinMax(*self.plottedSamples, columns)
+        else:
+            # one sample per pixel column of the new view
+            xs, ys = Sampling.sampleView(self.plottedFunction, minX, maxX, columns, cache=self.sampleCache)
+
+        # the limits were set by the toolbar, only the line has to be drawn again
+        self.renderer.setData(xs, ys)
+
+    def refreshOverlayViewport(self):
+        import Sampling
+
+        minX, maxX = self.axes.get_xlim()
+        if (minX, maxX) == self.plottedView:
+            xs, ys = self.plottedSamples
+        else:
+            xs, ys = Sampling.sampleGroup(self.plottedGroup, minX, maxX, self.plotColumns())
+        self.renderer.setCurves(self.decimateCurves(xs, ys))
+
+    def validateExpression(self , expression, parameters=()):
+        # tokenize and parse the expression in a single pass, see ExpressionParser for the rules
+        import ExpressionParser
+        return ExpressionParser.validateExpression(expression, parameters)
 
 
 if __name__ == "__main__":
+    # --serve renders the plots for HTTP clients instead of showing the window, the other
+    # arguments are the options of PlotterServer
+    if '--serve' in sys.argv:
+        import PlotterServer
+        sys.exit(PlotterServer.main([argument for argument in sys.argv[1:] if argument != '--serve']))
+
     app = QApplication(sys.argv)
 
-    widget = MainApp()
+    # --timings shows the time of each stage of the plots and logs them
+    instrumentation = '--timings' in sys.argv
+    if instrumentation:
+        import logging
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+
+    widget = MainApp(instrumentation=instrumentation)
     widget.setWindowTitle('Function Plotter')
     widget.resize(800, 600)
     widget.show()
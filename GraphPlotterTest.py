@@ -1,3 +1,7 @@
+import subprocess
+import sys
+
+import numpy as np
 import pytest
 import pytestqt.qtbot
 from unittest.mock import patch
@@ -6,19 +10,47 @@ from unittest.mock import patch
 
 
 from PySide6.QtCore import Qt
+from PySide6.QtTest import QTest
 from PySide6.QtWidgets import QMessageBox
 
-from GraphPlotter import MainApp  # replace with actual module name
+from GraphPlotter import MainApp, PRECOMPUTED_ROWS  # replace with actual module name
+import PlotterCore
+from PlotterCore import EquationCache
+
+
+def flushPendingDraws(widget):
+    # the canvas draws in draw_idle callbacks of the event loop and the workers report through
+    # queued signals, they must run before the widget is closed or they find its canvas deleted
+    widget.liveTimer.stop()
+    widget.viewportTimer.stop()
+    widget.plotGeneration += 1
+    widget.threadPool.waitForDone()
+    QTest.qWait(10)
 
 
 @pytest.fixture
 def app(qtbot):
     test_app = MainApp()
-    qtbot.addWidget(test_app)
+    qtbot.addWidget(test_app, before_close_func=flushPendingDraws)
 
     return test_app
 
 
+@pytest.fixture
+def createApp(qtbot):
+    # qtbot only keeps weak references, the widgets are kept here so they are not collected with
+    # a draw pending before they are closed
+    widgets = []
+
+    def create(**options):
+        widget = MainApp(**options)
+        qtbot.addWidget(widget, before_close_func=flushPendingDraws)
+        widgets.append(widget)
+        return widget
+
+    return create
+
+
 class TestValidation:
     def test_correct_equation(self, app):
         assert app.validateExpression('x^2') == 'Correct Equation'
@@ -84,6 +116,579 @@ class TestValidation:
         assert app.validateExpression('x + +-2') == 'Correct Equation'
 
 
+class TestEquationCache:
+    def test_hits_and_misses(self):
+        cache = EquationCache()
+        first = cache.get('x^2')
+        second = cache.get('X ^ 2')
+
+        assert first is second
+        assert cache.hits == 1
+        assert cache.misses == 1
+
+    def test_least_recently_used_eviction(self):
+        cache = EquationCache(maxSize=2)
+        cache.get('x')
+        cache.get('x+1')
+        cache.get('x')
+        cache.get('x+2')
+
+        assert 'x' in cache
+        assert 'x+1' not in cache
+        assert len(cache) == 2
+
+    def test_invalidation(self):
+        cache = EquationCache()
+        cache.get('x')
+        cache.get('x+1')
+
+        cache.invalidate('x')
+        assert 'x' not in cache
+        assert 'x+1' in cache
+
+        cache.invalidate()
+        assert len(cache) == 0
+
+    def test_replot_uses_cache(self, qtbot, app):
+        qtbot.keyClicks(app.equationInput, 'x^2')
+        qtbot.keyClicks(app.minimumXInput, '-10')
+        qtbot.keyClicks(app.maximumXInput, '10')
+        qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+
+        app.maximumXInput.clear()
+        qtbot.keyClicks(app.maximumXInput, '20')
+        qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+
+        assert app.equationCache.misses == 1
+        assert app.equationCache.hits == 1
+
+class TestViewport:
+    def plot(self, qtbot, app, equation, minX, maxX):
+        qtbot.keyClicks(app.equationInput, equation)
+        qtbot.keyClicks(app.minimumXInput, minX)
+        qtbot.keyClicks(app.maximumXInput, maxX)
+        with qtbot.waitSignal(app.plotCompleted):
+            qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+
+    def test_toolbar_is_attached_to_canvas(self, app):
+        assert app.toolbar.canvas is app.canvas
+
+    def test_zoom_evaluates_the_new_view(self, qtbot, app):
+        self.plot(qtbot, app, 'x^2', '-1000000', '1000000')
+
+        app.axes.set_xlim(0, 1)
+        qtbot.waitUntil(lambda: app.plottedLine.get_xdata()[-1] <= 1)
+
+        xs = app.plottedLine.get_xdata()
+        ys = app.plottedLine.get_ydata()
+        assert xs[0] >= 0
+        assert len(xs) <= 2 * app.plotColumns()
+        assert abs(ys[-1] - xs[-1] ** 2) < 1e-9
+
+    def test_panning_only_evaluates_the_exposed_part(self, qtbot, app):
+        self.plot(qtbot, app, 'x^2', '-10', '10')
+        app.axes.set_xlim(0, 1)
+        qtbot.waitUntil(lambda: app.plottedLine.get_xdata()[-1] <= 1)
+        evaluated = app.sampleCache.evaluated
+
+        app.axes.set_xlim(0.5, 1.5)
+        qtbot.waitUntil(lambda: app.plottedLine.get_xdata()[-1] > 1)
+        assert app.sampleCache.evaluated - evaluated <= evaluated / 2 + 1
+
+    def test_extending_the_range_only_evaluates_the_new_part(self, qtbot, app):
+        self.plot(qtbot, app, 'x^2', '-10', '10')
+        evaluated = app.sampleCache.evaluated
+
+        app.maximumXInput.setText('12')
+        with qtbot.waitSignal(app.plotCompleted):
+            qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+
+        xs, ys = app.plottedSamples
+        assert xs[0] == -10 and xs[-1] == 12
+        assert np.allclose(ys, xs ** 2)
+        assert app.sampleCache.evaluated - evaluated < 0.15 * evaluated
+
+    def test_going_back_to_the_whole_view_restores_the_samples(self, qtbot, app):
+        self.plot(qtbot, app, 'x^2', '-10', '10')
+        plotted = app.plottedLine.get_xdata()
+
+        app.axes.set_xlim(0, 1)
+        qtbot.waitUntil(lambda: len(app.plottedLine.get_xdata()) != len(plotted))
+        app.axes.set_xlim(*app.plottedView)
+        qtbot.waitUntil(lambda: len(app.plottedLine.get_xdata()) == len(plotted))
+
+class TestBackgroundPlotting:
+    def test_plot_is_drawn_when_the_job_finishes(self, qtbot, app):
+        qtbot.keyClicks(app.equationInput, 'x^2')
+        qtbot.keyClicks(app.minimumXInput, '-10')
+        qtbot.keyClicks(app.maximumXInput, '10')
+
+        with qtbot.waitSignal(app.plotCompleted):
+            qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+            assert app.busyIndicator.isVisibleTo(app)
+
+        assert not app.busyIndicator.isVisibleTo(app)
+        assert len(app.plottedLine.get_xdata()) > 0
+
+    def test_stale_results_are_dropped(self, qtbot, app):
+        compiledEquation = app.equationCache.get('x^2')
+        app.startPlot(compiledEquation, -10, 10)
+        staleGeneration = app.plotGeneration
+
+        with qtbot.waitSignal(app.plotCompleted):
+            app.startPlot(compiledEquation, 0, 5)
+
+        app.plotFinished(staleGeneration, np.array([-1.0, 1.0]), np.array([1.0, 1.0]), {'seconds': 0, 'profile': None})
+        assert app.plottedLine.get_xdata()[0] == 0
+
+    def test_newest_job_wins(self, qtbot, app):
+        app.startPlot(app.equationCache.get('x^2'), -10, 10)
+
+        with qtbot.waitSignal(app.plotCompleted):
+            app.startPlot(app.equationCache.get('x+1'), 2, 3)
+
+        app.threadPool.waitForDone()
+        qtbot.wait(50)
+        assert app.plottedLine.get_xdata()[0] == 2
+        assert app.plottedLine.get_ydata()[0] == 3
+
+class TestRenderer:
+    def plot(self, qtbot, app, minX, maxX):
+        with qtbot.waitSignal(app.plotCompleted):
+            app.startPlot(app.equationCache.get('x^2'), minX, maxX)
+        app.canvas.draw()
+
+    def test_axes_and_line_are_reused(self, qtbot, app):
+        axes = app.axes
+        line = app.plottedLine
+
+        self.plot(qtbot, app, -10, 10)
+        self.plot(qtbot, app, -5, 5)
+
+        assert app.figure.axes == [axes]
+        assert list(app.axes.lines) == [line]
+
+    def test_same_limits_are_blitted(self, qtbot, app):
+        self.plot(qtbot, app, -10, 10)
+        blits = app.renderer.blits
+
+        self.plot(qtbot, app, -10, 10)
+
+        assert app.renderer.blits == blits + 1
+
+    def test_new_limits_are_drawn_again(self, qtbot, app):
+        self.plot(qtbot, app, -10, 10)
+
+        with qtbot.waitSignal(app.plotCompleted):
+            app.startPlot(app.equationCache.get('x^2'), 0, 50)
+
+        assert app.renderer.background is None
+        assert app.axes.get_xlim()[1] > 50
+
+class TestLivePlotting:
+    def test_typing_plots_once_after_the_pause(self, qtbot, app):
+        app.liveCheckBox.setChecked(True)
+        qtbot.keyClicks(app.minimumXInput, '-10')
+        qtbot.keyClicks(app.maximumXInput, '10')
+
+        with patch.object(QMessageBox, 'warning') as mock_warning:
+            with qtbot.waitSignal(app.plotCompleted):
+                qtbot.keyClicks(app.equationInput, '(x+2)^3')
+            mock_warning.assert_not_called()
+
+        assert app.plotGeneration == 1
+        assert not app.inlineMessage.isVisibleTo(app)
+        assert len(app.plottedLine.get_xdata()) > 0
+
+    def test_invalid_states_are_shown_inline(self, qtbot, app):
+        app.liveCheckBox.setChecked(True)
+        qtbot.keyClicks(app.minimumXInput, '-10')
+        qtbot.keyClicks(app.maximumXInput, '10')
+
+        with patch.object(QMessageBox, 'warning') as mock_warning:
+            qtbot.keyClicks(app.equationInput, '(x+')
+            qtbot.waitUntil(lambda: app.inlineMessage.isVisibleTo(app))
+            mock_warning.assert_not_called()
+
+        assert app.inlineMessage.text() == "The Equation cannot end with one of these characters '^' or '+' or '-' or '*' or '/'"
+        assert app.plotGeneration == 0
+
+    def test_invalid_function_is_shown_inline(self, qtbot, app):
+        app.liveCheckBox.setChecked(True)
+        qtbot.keyClicks(app.minimumXInput, '-10')
+        qtbot.keyClicks(app.maximumXInput, '10')
+
+        with patch.object(QMessageBox, 'warning') as mock_warning:
+            with qtbot.waitSignal(app.plotCompleted):
+                qtbot.keyClicks(app.equationInput, 'x/(x-x)')
+            mock_warning.assert_not_called()
+
+        assert app.inlineMessage.text() == 'The entered function is not valid.'
+
+    def test_nothing_is_plotted_when_live_mode_is_off(self, qtbot, app):
+        qtbot.keyClicks(app.equationInput, 'x^2')
+        qtbot.keyClicks(app.minimumXInput, '-10')
+        qtbot.keyClicks(app.maximumXInput, '10')
+        qtbot.wait(app.liveTimer.interval() * 2)
+
+        assert app.plotGeneration == 0
+
+    def test_every_keystroke_is_validated_incrementally(self, qtbot, app):
+        # the latency of these updates is measured by the live stage of benchmarks/PlotterBenchmark.py
+        equation = '+'.join(['(x^2-3*x/4)'] * 300)
+        app.equationInput.setText(equation)
+        app.liveCheckBox.setChecked(True)
+        qtbot.keyClicks(app.equationInput, '+x')
+
+        summary = app.liveLatencySummary()
+        assert summary['validation']['count'] == 3
+        assert app.liveValidator.text == equation + '+x'
+        assert app.liveValidator.message == 'Correct Equation'
+        assert app.liveValidator.tokenizedLength < 10
+
+class TestOverlay:
+    def add(self, qtbot, app, *equations):
+        for equation in equations:
+            qtbot.keyClicks(app.equationInput, equation)
+            qtbot.mouseClick(app.addOverlayButton, Qt.LeftButton)
+
+    def plot(self, qtbot, app):
+        qtbot.keyClicks(app.minimumXInput, '-10')
+        qtbot.keyClicks(app.maximumXInput, '10')
+        with qtbot.waitSignal(app.plotCompleted):
+            qtbot.mouseClick(app.plotOverlayButton, Qt.LeftButton)
+
+    def test_equations_are_drawn_by_one_collection(self, qtbot, app):
+        self.add(qtbot, app, 'x^2', 'x^2+1', '2*x')
+        self.plot(qtbot, app)
+
+        assert app.overlayEquations == ['x^2', 'x^2+1', '2*x']
+        assert app.overlayList.count() == 3
+        assert len(app.renderer.curves.get_segments()) == 3
+        assert len(app.plottedLine.get_xdata()) == 0
+        assert list(app.axes.lines) == [app.plottedLine]
+
+    def test_invalid_equation_is_not_added(self, qtbot, app):
+        with patch.object(QMessageBox, 'warning') as warning:
+            self.add(qtbot, app, 'x^^2')
+
+        warning.assert_called_once()
+        assert app.overlayEquations == []
+
+    def test_removed_equation_is_not_drawn(self, qtbot, app):
+        self.add(qtbot, app, 'x^2', 'x+1')
+        app.overlayList.setCurrentRow(0)
+        qtbot.mouseClick(app.removeOverlayButton, Qt.LeftButton)
+        self.plot(qtbot, app)
+
+        assert app.overlayEquations == ['x+1']
+        segment = app.renderer.curves.get_segments()[0]
+        assert np.allclose(segment[:, 1], segment[:, 0] + 1)
+
+    def test_single_plot_replaces_the_overlay(self, qtbot, app):
+        self.add(qtbot, app, 'x^2', 'x+1')
+        self.plot(qtbot, app)
+
+        qtbot.keyClicks(app.equationInput, 'x^3')
+        with qtbot.waitSignal(app.plotCompleted):
+            qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+
+        assert len(app.renderer.curves.get_segments()) == 0
+        assert len(app.plottedLine.get_xdata()) > 0
+
+    def test_zoom_evaluates_the_overlay_in_the_new_view(self, qtbot, app):
+        self.add(qtbot, app, 'x^2', 'x+1')
+        self.plot(qtbot, app)
+
+        app.axes.set_xlim(0, 1)
+        qtbot.waitUntil(lambda: app.renderer.curves.get_segments()[0][0, 0] >= 0)
+        assert len(app.renderer.curves.get_segments()) == 2
+
+    def test_failed_overlay_is_reported(self, qtbot, app):
+        self.add(qtbot, app, 'x^2')
+        with patch('Sampling.sampleGroup', side_effect=ValueError), \
+                patch.object(QMessageBox, 'warning') as warning:
+            self.plot(qtbot, app)
+
+        warning.assert_called_once_with(app, 'Input Error', 'The entered function is not valid.')
+        assert not app.busyIndicator.isVisible()
+
+class TestAnalysis:
+    def plot(self, qtbot, app, equation='x^3-x'):
+        app.equationInput.setText(equation)
+        qtbot.keyClicks(app.minimumXInput, '-2')
+        qtbot.keyClicks(app.maximumXInput, '2')
+        with qtbot.waitSignal(app.plotCompleted):
+            qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+
+    def test_features_are_marked(self, qtbot, app):
+        app.analysisCheckBox.setChecked(True)
+        self.plot(qtbot, app)
+
+        assert np.allclose(app.renderer.roots.get_offsets()[:, 0], [-1, 0, 1])
+        assert len(app.renderer.maxima.get_offsets()) == 1
+        assert len(app.renderer.minima.get_offsets()) == 1
+        # the markers do not replace the curve
+        assert list(app.axes.lines) == [app.plottedLine]
+
+    def test_nothing_is_marked_when_unchecked(self, qtbot, app):
+        self.plot(qtbot, app)
+        assert app.lazyAnalysisCache is None
+        assert app.renderer.markerCount() == 0
+
+        app.analysisCheckBox.setChecked(True)
+        assert app.renderer.markerCount() == 5
+        app.analysisCheckBox.setChecked(False)
+        assert app.renderer.markerCount() == 0
+
+    def test_replot_uses_the_cache(self, qtbot, app):
+        app.analysisCheckBox.setChecked(True)
+        self.plot(qtbot, app)
+        with qtbot.waitSignal(app.plotCompleted):
+            qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+
+        assert (app.analysisCache.hits, app.analysisCache.misses) == (1, 1)
+
+    def test_analysis_is_timed(self, qtbot, createApp):
+        widget = createApp(instrumentation=True)
+        widget.analysisCheckBox.setChecked(True)
+        self.plot(qtbot, widget)
+
+        assert 'analyze' in widget.instrumentation.lastTimings
+
+    def test_overlay_clears_the_markers(self, qtbot, app):
+        app.analysisCheckBox.setChecked(True)
+        self.plot(qtbot, app)
+        app.equationInput.setText('x^2')
+        qtbot.mouseClick(app.addOverlayButton, Qt.LeftButton)
+        with qtbot.waitSignal(app.plotCompleted):
+            qtbot.mouseClick(app.plotOverlayButton, Qt.LeftButton)
+
+        assert app.renderer.markerCount() == 0
+
+
+class TestParameters:
+    def plot(self, qtbot, app, equation='a*x^2+b', parameters='a, b'):
+        app.parametersInput.setText(parameters)
+        app.equationInput.setText(equation)
+        qtbot.keyClicks(app.minimumXInput, '-2')
+        qtbot.keyClicks(app.maximumXInput, '2')
+        with qtbot.waitSignal(app.plotCompleted):
+            qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+
+    def test_sliders_of_the_parameters(self, qtbot, app):
+        self.plot(qtbot, app)
+
+        assert list(app.parameterSliders) == ['a', 'b']
+        assert app.parameterValues() == (1.0, 1.0)
+        xs, ys = app.plottedSamples
+        assert np.allclose(ys, xs ** 2 + 1)
+
+    def test_moving_a_slider_draws_a_row_of_the_grid(self, qtbot, app):
+        self.plot(qtbot, app)
+        slider, label = app.parameterSliders['a']
+
+        slider.setValue(160)
+
+        xs, ys = app.plottedLine.get_data()
+        assert label.text() == 'a = 3'
+        assert np.allclose(ys, 3 * xs ** 2 + 1)
+        assert app.familyGrid.rows.shape[0] == PRECOMPUTED_ROWS
+
+    def test_dragging_does_not_evaluate(self, qtbot, app):
+        self.plot(qtbot, app)
+        slider, _ = app.parameterSliders['a']
+        slider.setValue(0)
+        rows = app.familyGrid.rows
+
+        slider.setSliderDown(True)
+        for tick in range(1, 200, 3):
+            slider.setValue(tick)
+
+        # the first move computes the grid, the others only pick a row, their latency is measured
+        # by the scrub stage of benchmarks/PlotterBenchmark.py
+        assert app.familyGrid.rows is rows
+        assert len(app.liveLatencies['scrub']) == 68
+
+    def test_moving_a_slider_keeps_the_entered_range(self, qtbot, app, tmp_path):
+        self.plot(qtbot, app)
+        slider, _ = app.parameterSliders['a']
+        slider.setValue(160)
+
+        xs, _ = app.plottedSamples
+        assert xs[0] == -2 and xs[-1] == 2
+        path = str(tmp_path / 'samples.npy')
+        with qtbot.waitSignal(app.exportCompleted):
+            app.exportSamples(path, 101)
+        samples = np.load(path)
+        assert samples[0, 0] == -2 and samples[-1, 0] == 2
+        assert np.allclose(samples[:, 1], 3 * samples[:, 0] ** 2 + 1)
+
+    def test_landing_between_the_rows_refines_the_grid(self, qtbot, app):
+        self.plot(qtbot, app)
+        slider, _ = app.parameterSliders['b']
+
+        slider.setSliderDown(True)
+        slider.setValue(103)
+        xs, ys = app.plottedLine.get_data()
+        assert np.allclose(ys, xs ** 2 + 0)
+        slider.setSliderDown(False)
+
+        xs, ys = app.plottedLine.get_data()
+        assert np.allclose(ys, xs ** 2 + 0.15)
+        assert len(app.familyGrid.values) == PRECOMPUTED_ROWS + 1
+
+    def test_invalid_parameters(self, qtbot, app):
+        with patch.object(QMessageBox, 'warning') as warning:
+            self.plotWithoutResult(qtbot, app, 'a*x', 'a, x')
+            warning.assert_called_once_with(app, 'Input Error', PlotterCore.INVALID_PARAMETERS)
+
+        with patch.object(QMessageBox, 'warning') as warning:
+            self.plotWithoutResult(qtbot, app, 'a*x+c', 'a')
+            warning.assert_called_once_with(app, 'Input Error', 'There are invalid characters in the equation')
+
+    def plotWithoutResult(self, qtbot, app, equation, parameters):
+        app.parametersInput.setText(parameters)
+        app.equationInput.setText(equation)
+        app.minimumXInput.setText('-2')
+        app.maximumXInput.setText('2')
+        qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+
+    def test_equation_without_parameters_removes_the_sliders(self, qtbot, app):
+        self.plot(qtbot, app)
+        app.parametersInput.clear()
+        app.equationInput.setText('x^2')
+        with qtbot.waitSignal(app.plotCompleted):
+            qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+
+        assert app.parameterSliders == {}
+        assert app.plottedFamily is None
+
+
+class TestStreaming:
+    def plot(self, qtbot, app):
+        qtbot.keyClicks(app.equationInput, 'x^2')
+        qtbot.keyClicks(app.minimumXInput, '-10')
+        qtbot.keyClicks(app.maximumXInput, '10')
+        with qtbot.waitSignal(app.plotCompleted):
+            qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+
+    def test_fixed_resolution_is_streamed(self, qtbot, createApp):
+        widget = createApp(samples=10 ** 6, memoryLimit=2 ** 20, float32=True)
+        self.plot(qtbot, widget)
+
+        xs = widget.plottedLine.get_xdata()
+        assert xs[0] == -10 and xs[-1] == 10
+        assert len(xs) < 4 * widget.plotColumns()
+        assert widget.plottedSamples[1].dtype == np.float32
+
+    def test_extending_the_range_only_evaluates_the_new_part(self, qtbot, createApp):
+        widget = createApp(samples=10000)
+        self.plot(qtbot, widget)
+        evaluated = widget.sampleCache.evaluated
+
+        widget.maximumXInput.setText('12')
+        with qtbot.waitSignal(widget.plotCompleted):
+            qtbot.mouseClick(widget.plotButton, Qt.LeftButton)
+
+        assert widget.plottedLine.get_xdata()[-1] == 12
+        assert widget.sampleCache.evaluated - evaluated < 0.15 * evaluated
+
+    def test_export_samples(self, qtbot, app, tmp_path):
+        self.plot(qtbot, app)
+        path = str(tmp_path / 'samples.npy')
+
+        with qtbot.waitSignal(app.exportCompleted) as blocker:
+            app.exportSamples(path, 5001)
+
+        assert blocker.args == [path]
+        samples = np.load(path)
+        assert samples.shape == (5001, 2)
+        assert samples[0, 0] == -10 and samples[-1, 0] == 10
+
+    def test_failed_export_is_reported(self, qtbot, app, tmp_path):
+        self.plot(qtbot, app)
+        path = str(tmp_path / 'missing' / 'samples.npy')
+
+        with patch.object(QMessageBox, 'warning') as warning:
+            with qtbot.assertNotEmitted(app.exportCompleted):
+                with qtbot.waitSignal(app.exportFailed):
+                    app.exportSamples(path, 5001)
+        warning.assert_called_once()
+
+    def test_export_needs_a_plot(self, qtbot, app):
+        with patch.object(QMessageBox, 'warning') as warning:
+            qtbot.mouseClick(app.exportButton, Qt.LeftButton)
+        warning.assert_called_once()
+
+class TestInstrumentation:
+    def plot(self, qtbot, app):
+        qtbot.keyClicks(app.equationInput, 'x^2')
+        qtbot.keyClicks(app.minimumXInput, '-10')
+        qtbot.keyClicks(app.maximumXInput, '10')
+        with qtbot.waitSignal(app.plotCompleted):
+            qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+
+    def test_every_stage_is_timed(self, qtbot, createApp):
+        widget = createApp(instrumentation=True)
+        stages = []
+        widget.instrumentation.addHook(lambda stage, seconds, details: stages.append(stage))
+
+        self.plot(qtbot, widget)
+
+        assert stages == ['validate', 'compile', 'evaluate', 'draw']
+        assert widget.timingLabel.isVisibleTo(widget)
+        assert 'draw' in widget.timingLabel.text()
+
+    def test_disabled_instrumentation_records_nothing(self, qtbot, app):
+        self.plot(qtbot, app)
+
+        assert app.instrumentation.lastTimings == {}
+        assert not app.timingLabel.isVisibleTo(app)
+
+    def test_profile_of_the_next_plot(self, qtbot, app):
+        app.profileNextPlot()
+        self.plot(qtbot, app)
+
+        assert app.instrumentation.lastProfile is not None
+        assert app.pendingProfile is None
+        functions = [function for _, _, function in app.instrumentation.lastProfile.stats]
+        assert 'decimateMinMax' in functions
+
+    def test_profile_is_kept_when_the_profiled_plot_is_cancelled(self, qtbot, app):
+        qtbot.keyClicks(app.equationInput, 'x^2')
+        qtbot.keyClicks(app.minimumXInput, '-10')
+        qtbot.keyClicks(app.maximumXInput, '10')
+        app.profileNextPlot()
+        # the first plot is cancelled by the second one before it completes
+        app.plotFunction()
+        with qtbot.waitSignal(app.plotCompleted):
+            app.plotFunction()
+
+        assert app.instrumentation.lastProfile is not None
+        assert app.pendingProfile is None
+
+class TestLazyLoading:
+    def test_import_does_not_load_the_plotting_modules(self):
+        script = 'import sys, GraphPlotter; print(sorted(m for m in ("numpy", "matplotlib", "sympy") if m in sys.modules))'
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+        assert output.strip() == '[]'
+
+    def test_plot_area_is_created_on_first_plot(self, qtbot, app):
+        assert app.plotArea is None
+
+        with qtbot.waitSignal(app.plotCompleted):
+            app.startPlot(app.equationCache.get('x^2'), -10, 10)
+
+        assert app.plotArea is not None
+        assert app.plotAreaLayout.indexOf(app.canvas) >= 0
+
+    def test_plotting_modules_are_prewarmed_after_show(self, qtbot, createApp):
+        widget = createApp()
+        widget.show()
+
+        qtbot.waitUntil(lambda: widget.plotArea is not None)
+
 
 class TestFullExecution:
     def clear_all(self, app):
@@ -215,7 +820,8 @@ class TestFullExecution:
         qtbot.keyClicks(app.maximumXInput, '10')
 
         with patch.object(QMessageBox, 'warning') as mock_warning:
-            qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+            with qtbot.waitSignal(app.plotCompleted):
+                qtbot.mouseClick(app.plotButton, Qt.LeftButton)
             mock_warning.assert_called_once_with(app, 'Input Error', 'The entered function is not valid.')
 
         assert app.equationInput.text() == 'x/(x-x)'
@@ -223,3 +829,15 @@ class TestFullExecution:
         assert app.maximumXInput.text() == '10'
 
 
+
+    def test_deeply_nested_equation(self, qtbot, app):
+        app.equationInput.setText('(' * 1000 + 'x' + ')' * 1000 + '+' + '+'.join(['x'] * 1000))
+        qtbot.keyClicks(app.minimumXInput, '-10')
+        qtbot.keyClicks(app.maximumXInput, '10')
+
+        with patch.object(QMessageBox, 'warning') as mock_warning:
+            with qtbot.waitSignal(app.plotCompleted):
+                qtbot.mouseClick(app.plotButton, Qt.LeftButton)
+            mock_warning.assert_not_called()
+
+        assert app.plottedLine.get_ydata()[-1] == pytest.approx(10010)
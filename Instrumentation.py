@@ -0,0 +1,100 @@
+import cProfile
+import io
+import logging
+import pstats
+import time
+from contextlib import nullcontext
+
+# returned by stage when the instrumentation is disabled, so a disabled stage costs one call
+DISABLED_STAGE = nullcontext()
+
+# the stages of a plot in the order they run
+STAGES = ('validate', 'compile', 'evaluate', 'draw', 'analyze')
+
+
+class StageTimer:
+
+    def __init__(self, instrumentation, name, details):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.details = details
+        self.started = 0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.instrumentation.record(self.name, time.perf_counter() - self.started, **self.details)
+        return False
+
+
+class PlotInstrumentation:
+    # times the stages of a plot, writes a log line for each of them and calls the registered hooks
+    # with (stage, seconds, details), can also profile a single plot with cProfile
+
+    def __init__(self, enabled=False, logger=None):
+        self.enabled = enabled
+        self.logger = logger or logging.getLogger('GraphPlotter')
+        self.hooks = []
+        self.lastTimings = {}
+        self.profileRequested = False
+        self.lastProfile = None
+
+    def addHook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def removeHook(self, hook):
+        self.hooks.remove(hook)
+
+    def stage(self, name, **details):
+        # context manager timing a stage, does nothing when the instrumentation is disabled
+        if not self.enabled:
+            return DISABLED_STAGE
+        return StageTimer(self, name, details)
+
+    def record(self, name, seconds, **details):
+        # record a stage that was timed somewhere else, like in a worker thread
+        if not self.enabled:
+            return
+        self.lastTimings[name] = seconds
+
+        fields = ''.join(' %s=%s' % (key, value) for key, value in sorted(details.items()))
+        self.logger.info('stage=%s seconds=%.6f%s', name, seconds, fields)
+        for hook in list(self.hooks):
+            hook(name, seconds, details)
+
+    def startPlot(self):
+        self.lastTimings = {}
+
+    def summary(self):
+        # the timings of the last plot in milliseconds, like 'validate 0.1 ms  compile 0.0 ms'
+        return '  '.join('%s %.1f ms' % (name, self.lastTimings[name] * 1000)
+                         for name in STAGES if name in self.lastTimings)
+
+    def profileNextPlot(self):
+        self.profileRequested = True
+
+    def startProfile(self):
+        # returns a running profile when a profile of the next plot was requested, None otherwise
+        if not self.profileRequested:
+            return None
+        self.profileRequested = False
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finishProfile(self, *profiles):
+        # combine the profiles of the threads that worked on the plot
+        profiles = [profile for profile in profiles if profile is not None]
+        if not profiles:
+            return None
+        for profile in profiles:
+            profile.disable()
+
+        output = io.StringIO()
+        self.lastProfile = pstats.Stats(*profiles, stream=output)
+        self.lastProfile.sort_stats('cumulative').print_stats(20)
+        self.logger.info('profile of the last plot:\n%s', output.getvalue())
+        return self.lastProfile
@@ -0,0 +1,83 @@
+import logging
+import time
+
+from Instrumentation import PlotInstrumentation, DISABLED_STAGE
+
+
+class TestStages:
+    def test_disabled_stage_does_nothing(self):
+        instrumentation = PlotInstrumentation()
+        calls = []
+        instrumentation.addHook(lambda *arguments: calls.append(arguments))
+
+        assert instrumentation.stage('validate') is DISABLED_STAGE
+        with instrumentation.stage('validate'):
+            pass
+        instrumentation.record('evaluate', 1.0)
+
+        assert calls == []
+        assert instrumentation.lastTimings == {}
+
+    def test_enabled_stage_is_timed(self):
+        instrumentation = PlotInstrumentation(enabled=True)
+        calls = []
+        instrumentation.addHook(lambda *arguments: calls.append(arguments))
+
+        with instrumentation.stage('compile', cached=False):
+            time.sleep(0.01)
+
+        assert calls[0][0] == 'compile'
+        assert calls[0][1] >= 0.01
+        assert calls[0][2] == {'cached': False}
+        assert instrumentation.lastTimings['compile'] == calls[0][1]
+
+    def test_stages_are_logged(self, caplog):
+        instrumentation = PlotInstrumentation(enabled=True)
+
+        with caplog.at_level(logging.INFO, logger='GraphPlotter'):
+            instrumentation.record('evaluate', 0.25, samples=100)
+
+        assert 'stage=evaluate seconds=0.250000 samples=100' in caplog.text
+
+    def test_summary_is_in_stage_order(self):
+        instrumentation = PlotInstrumentation(enabled=True)
+        instrumentation.record('draw', 0.002)
+        instrumentation.record('validate', 0.001)
+
+        assert instrumentation.summary() == 'validate 1.0 ms  draw 2.0 ms'
+
+        instrumentation.startPlot()
+        assert instrumentation.summary() == ''
+
+    def test_removed_hook_is_not_called(self):
+        instrumentation = PlotInstrumentation(enabled=True)
+        calls = []
+        hook = instrumentation.addHook(lambda *arguments: calls.append(arguments))
+        instrumentation.removeHook(hook)
+
+        instrumentation.record('draw', 0.1)
+        assert calls == []
+
+
+class TestProfile:
+    def test_profile_is_only_started_when_requested(self):
+        instrumentation = PlotInstrumentation()
+        assert instrumentation.startProfile() is None
+
+        instrumentation.profileNextPlot()
+        profile = instrumentation.startProfile()
+        assert profile is not None
+        profile.disable()
+
+        # the request is for a single plot
+        assert instrumentation.startProfile() is None
+
+    def test_profiles_are_combined(self):
+        instrumentation = PlotInstrumentation()
+        instrumentation.profileNextPlot()
+        profile = instrumentation.startProfile()
+        sorted(range(1000))
+
+        stats = instrumentation.finishProfile(profile, None)
+        assert stats is instrumentation.lastProfile
+        assert any(function == "<built-in method builtins.sorted>" for _, _, function in stats.stats)
@@ -0,0 +1,132 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import ExpressionParser
+import PlotterCore
+
+# smaller domains are evaluated in the calling process, starting the work in the pool costs more
+PARALLEL_THRESHOLD = 2 ** 20
+
+# every worker gets a few parts of the domain so the faster ones take more of them
+PARTS_PER_WORKER = 4
+
+# every worker process has its own cache, so an equation is compiled once per worker, with the
+# numpy kernel, numexpr would start threads of its own in each of them
+workerCache = PlotterCore.EquationCache(backend='kernel')
+
+
+def evaluatePart(equation, name, dtype, samples, start, stop, minX, maxX, raising):
+    # evaluate the x values start to stop of np.linspace(minX, maxX, samples) into the same part of
+    # the shared buffer, returns False when the function raised a numpy error
+    function = workerCache.get(equation)
+    memory = shared_memory.SharedMemory(name)
+    try:
+        return evaluateInto(function, np.ndarray((samples,), dtype=dtype, buffer=memory.buf), samples, start,
+                            stop, minX, maxX, raising)
+    finally:
+        memory.close()
+
+
+def evaluateInto(function, ys, samples, start, stop, minX, maxX, raising):
+    # the x values are computed in double precision like linspace, then converted
+    step = (maxX - minX) / (samples - 1)
+    xs = np.arange(start, stop, dtype=np.float64) * step + minX
+    if stop == samples:
+        xs[-1] = maxX
+    xs = xs.astype(ys.dtype, copy=False)
+
+    errors = 'raise' if raising else 'ignore'
+    part = ys[start:stop]
+    try:
+        with np.errstate(divide=errors, over=errors, invalid=errors):
+            function(xs, part)
+    except ArithmeticError:
+        return False
+    # the points outside of the domain are gaps, like in the other samples of the plots
+    part[~np.isfinite(part)] = np.nan
+    return True
+
+
+class ParallelEvaluator:
+    # evaluates an equation over a large domain in a process pool, the parts of the domain are
+    # evaluated by the workers straight into a shared memory buffer so the results are not pickled,
+    # the equation is sent with every part and the workers keep it compiled in their workerCache,
+    # so the pool is kept for every equation
+
+    def __init__(self, workers=None, threshold=PARALLEL_THRESHOLD):
+        self.workers = workers or os.cpu_count() or 1
+        self.threshold = threshold
+        self.executor = None
+
+    def getExecutor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    def evaluate(self, equation, minX, maxX, samples, dtype=np.float64, raising=True):
+        # returns the x values of np.linspace(minX, maxX, samples) and the y values of the equation,
+        # raises PlotError like PlotterCore.evaluate, or leaves gaps when raising is False
+        function = PlotterCore.compile(equation)
+        if minX >= maxX:
+            raise PlotterCore.PlotError(PlotterCore.REVERSED_RANGE)
+        xs = np.linspace(minX, maxX, samples).astype(dtype, copy=False)
+
+        if samples < self.threshold or self.workers == 1:
+            errors = 'raise' if raising else 'ignore'
+            try:
+                with np.errstate(divide=errors, over=errors, invalid=errors):
+                    ys = np.array(function(xs), dtype=dtype)
+            except ArithmeticError:
+                raise PlotterCore.PlotError(ExpressionParser.INVALID_FUNCTION)
+            ys[~np.isfinite(ys)] = np.nan
+            return xs, ys
+
+        # a pool with a worker that died, like one killed by the system, cannot run anything
+        # anymore, the domain is evaluated once more in a new pool before the error is raised
+        equation = PlotterCore.EquationCache.normalize(equation)
+        for attempt in range(2):
+            try:
+                return xs, self.evaluateParts(self.getExecutor(), equation, minX, maxX, samples, dtype, raising)
+            except BrokenProcessPool:
+                self.close()
+                if attempt:
+                    raise
+
+    def evaluateParts(self, executor, equation, minX, maxX, samples, dtype, raising):
+        itemSize = np.dtype(dtype).itemsize
+        memory = shared_memory.SharedMemory(create=True, size=samples * itemSize)
+        futures = []
+        try:
+            bounds = np.linspace(0, samples, self.workers * PARTS_PER_WORKER + 1).astype(int)
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                if stop > start:
+                    futures.append(executor.submit(evaluatePart, equation, memory.name, np.dtype(dtype).str,
+                                                   samples, int(start), int(stop), minX, maxX, raising))
+            if not all([future.result() for future in futures]):
+                raise PlotterCore.PlotError(ExpressionParser.INVALID_FUNCTION)
+
+            # the buffer goes away with the shared memory, the result is copied out of it once
+            return np.ndarray((samples,), dtype=dtype, buffer=memory.buf).copy()
+        finally:
+            # every part is waited for, even when one of them failed, the buffer must outlive the
+            # workers writing into it
+            wait(futures)
+            memory.close()
+            memory.unlink()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
@@ -0,0 +1,109 @@
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import ParallelEvaluation
+import PlotterCore
+from ParallelEvaluation import ParallelEvaluator
+from PlotterCore import PlotError
+
+
+@pytest.fixture
+def evaluator():
+    with ParallelEvaluator(workers=2, threshold=1000) as parallelEvaluator:
+        yield parallelEvaluator
+
+
+class TestParallelEvaluation:
+    def test_matches_linspace(self, evaluator):
+        xs, ys = evaluator.evaluate('(x+2)^3*x-1/(x^2+1)', -10, 10, 100001)
+
+        assert np.array_equal(xs, np.linspace(-10, 10, 100001))
+        assert np.allclose(ys, (xs + 2) ** 3 * xs - 1 / (xs ** 2 + 1))
+
+    def test_pool_is_kept_for_every_equation(self, evaluator):
+        evaluator.evaluate('x^2', -1, 1, 10001)
+        executor = evaluator.executor
+        evaluator.evaluate('X ^ 2', 0, 5, 10001)
+        xs, ys = evaluator.evaluate('x+1', 0, 5, 10001)
+
+        assert evaluator.executor is executor
+        assert np.allclose(ys, xs + 1)
+
+    def test_equation_is_compiled_once_per_worker(self):
+        memory = shared_memory.SharedMemory(create=True, size=100 * 8)
+        try:
+            misses = ParallelEvaluation.workerCache.misses
+            assert ParallelEvaluation.evaluatePart('x^2+7', memory.name, '<f8', 100, 0, 50, 0, 1, True)
+            assert ParallelEvaluation.evaluatePart('x^2+7', memory.name, '<f8', 100, 50, 100, 0, 1, True)
+            ys = np.ndarray((100,), dtype=np.float64, buffer=memory.buf).copy()
+        finally:
+            memory.close()
+            memory.unlink()
+
+        assert ParallelEvaluation.workerCache.misses == misses + 1
+        assert np.allclose(ys, np.linspace(0, 1, 100) ** 2 + 7)
+
+    def test_broken_pool_is_started_again(self, evaluator):
+        evaluator.evaluate('x^2', -1, 1, 10001)
+        broken = evaluator.executor
+        # a worker that dies breaks the pool for every task after it
+        with pytest.raises(BrokenProcessPool):
+            broken.submit(os._exit, 1).result()
+
+        xs, ys = evaluator.evaluate('x^2', -1, 1, 10001)
+        assert evaluator.executor is not broken
+        assert np.allclose(ys, xs ** 2)
+
+    def test_every_part_is_waited_for_when_one_fails(self, evaluator, tmp_path, monkeypatch):
+        # the worker processes are forked with the patched evaluateInto
+        evaluateInto = ParallelEvaluation.evaluateInto
+
+        def slowEvaluateInto(function, ys, samples, start, stop, *arguments):
+            if start == 0:
+                raise MemoryError()
+            time.sleep(0.2)
+            result = evaluateInto(function, ys, samples, start, stop, *arguments)
+            (tmp_path / str(start)).touch()
+            return result
+
+        monkeypatch.setattr(ParallelEvaluation, 'evaluateInto', slowEvaluateInto)
+        with pytest.raises(MemoryError):
+            evaluator.evaluate('x^2', -1, 1, 10001)
+        assert len(list(tmp_path.iterdir())) == evaluator.workers * ParallelEvaluation.PARTS_PER_WORKER - 1
+
+    def test_small_domains_are_evaluated_in_process(self):
+        with ParallelEvaluator(workers=2, threshold=10 ** 6) as evaluator:
+            xs, ys = evaluator.evaluate('x^2', -1, 1, 1001)
+            assert evaluator.executor is None
+            assert np.allclose(ys, xs ** 2)
+
+    def test_invalid_function(self, evaluator):
+        with pytest.raises(PlotError, match='The entered function is not valid.'):
+            evaluator.evaluate('1/x', -1, 1, 10001)
+
+        xs, ys = evaluator.evaluate('1/x', -1, 1, 10001, raising=False)
+        assert np.isnan(ys[5000])
+        assert np.isfinite(np.delete(ys, 5000)).all()
+
+    def test_gaps_are_the_same_in_process(self, evaluator):
+        _, parallelYs = evaluator.evaluate('1/x', -1, 1, 10001, raising=False)
+        with ParallelEvaluator(workers=2, threshold=10 ** 6) as inProcess:
+            _, ys = inProcess.evaluate('1/x', -1, 1, 10001, raising=False)
+
+        assert np.array_equal(np.isnan(parallelYs), np.isnan(ys))
+        assert np.isnan(ys[5000])
+
+    def test_float32(self, evaluator):
+        xs, ys = evaluator.evaluate('x+1', 0, 1, 10001, dtype=np.float32)
+        assert ys.dtype == np.float32
+        assert np.allclose(ys, xs + 1)
+
+    def test_evaluate_with_parallel_evaluator(self, evaluator):
+        xs, ys = PlotterCore.evaluate('x^3', -1, 1, 10001, parallel=evaluator)
+        assert evaluator.executor is not None
+        assert np.allclose(ys, xs ** 3)
@@ -0,0 +1,159 @@
+import numpy as np
+from matplotlib import rcParams
+from matplotlib.collections import LineCollection, PathCollection
+from matplotlib.markers import MarkerStyle
+from matplotlib.transforms import IdentityTransform
+
+
+class PlotRenderer:
+    # draws the curves on axes that are created once, the data of the existing lines is replaced
+    # and the axes are only drawn again when their limits change, otherwise the lines are blitted
+    # on a copy of the background
+
+    def __init__(self, figure, canvas):
+        self.figure = figure
+        self.canvas = canvas
+
+        # the axes stay hidden until the first plot, like the empty figure before
+        self.axes = figure.subplots()
+        self.axes.set_visible(False)
+
+        # animated artists are left out of the full draws and blitted on the background instead
+        self.line, = self.axes.plot([], [], animated=True)
+        # the curves of an overlay of several equations are drawn in one pass by a single collection
+        self.curves = self.axes.add_collection(LineCollection([], animated=True))
+        # markers of the roots, maxima and minima found by Analysis, and dashed vertical lines at
+        # the discontinuities spanning the height of the axes, none of them changes the limits
+        self.roots = self.addMarkers('o', 'black')
+        self.maxima = self.addMarkers('^', 'tab:red')
+        self.minima = self.addMarkers('v', 'tab:green')
+        self.discontinuities = self.axes.add_collection(
+            LineCollection([], colors='gray', linestyles='dashed', transform=self.axes.get_xaxis_transform(),
+                           animated=True),
+            autolim=False)
+        self.animatedArtists = [self.line, self.curves, self.roots, self.maxima, self.minima, self.discontinuities]
+        self.background = None
+
+        # counters of the two kinds of drawing
+        self.fullDraws = 0
+        self.blits = 0
+
+        # callbacks for the changes of the x limits made by the user, not by the renderer
+        self.limitsChangedCallbacks = []
+        self.settingLimits = False
+        # the empty line requested a lazy autoscale, reading the limits makes it happen now
+        self.axes.get_xlim()
+        self.axes.get_ylim()
+        self.axes.callbacks.connect('xlim_changed', self.onLimitsChanged)
+        canvas.mpl_connect('draw_event', self.onDraw)
+
+    def addMarkers(self, marker, color):
+        style = MarkerStyle(marker)
+        path = style.get_path().transformed(style.get_transform())
+        markers = self.axes.add_collection(PathCollection([path], sizes=[36],
+                                                          offsets=np.empty((0, 2)), offset_transform=self.axes.transData,
+                                                          facecolors=color, zorder=3, animated=True), autolim=False)
+        markers.set_transform(IdentityTransform())
+        return markers
+
+    def addAnimatedArtist(self, artist):
+        artist.set_animated(True)
+        self.animatedArtists.append(artist)
+        return artist
+
+    def connectLimitsChanged(self, callback):
+        self.limitsChangedCallbacks.append(callback)
+
+    def onLimitsChanged(self, ax):
+        if self.settingLimits:
+            return
+        for callback in self.limitsChangedCallbacks:
+            callback(ax)
+
+    def onDraw(self, event):
+        # keep the background of the full draw and draw the animated artists on top of it
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.drawAnimated()
+        self.fullDraws += 1
+
+    def drawAnimated(self):
+        for artist in self.animatedArtists:
+            if artist.get_visible():
+                self.axes.draw_artist(artist)
+
+    def columns(self):
+        # the width of the axes in pixels
+        return max(int(self.axes.bbox.width), 1)
+
+    def rescale(self):
+        # fit the limits to the data, returns True if they changed
+        oldLimits = (self.axes.get_xlim(), self.axes.get_ylim())
+
+        # the autoscaling is lazy, reading the limits makes it happen while the changes are ignored
+        self.settingLimits = True
+        try:
+            self.axes.set_autoscale_on(True)
+            self.axes.relim(visible_only=True)
+            self.axes.autoscale_view()
+            newLimits = (self.axes.get_xlim(), self.axes.get_ylim())
+        finally:
+            self.settingLimits = False
+
+        return oldLimits != newLimits
+
+    def setData(self, xs, ys, rescale=False, immediate=False):
+        self.line.set_data(xs, ys)
+        self.curves.set_segments([])
+        self.update(rescale, immediate)
+
+    def setCurves(self, curves, rescale=False, immediate=False):
+        # curves is a list of (xs, ys) pairs, coloured with the colour cycle of the axes
+        colors = rcParams['axes.prop_cycle'].by_key()['color']
+        self.curves.set_segments([np.column_stack(curve) for curve in curves])
+        self.curves.set_color([colors[index % len(colors)] for index in range(len(curves))])
+        self.line.set_data([], [])
+        self.update(rescale, immediate)
+
+    def setMarkers(self, features, immediate=False):
+        # features are the Analysis.Features of the plotted function
+        self.roots.set_offsets(np.column_stack((features.rootXs, np.zeros(len(features.rootXs)))))
+        self.maxima.set_offsets(np.column_stack((features.extremumXs, features.extremumYs))[features.isMaximum])
+        self.minima.set_offsets(np.column_stack((features.extremumXs, features.extremumYs))[~features.isMaximum])
+        self.discontinuities.set_segments([[(x, 0), (x, 1)] for x in features.discontinuityXs])
+        self.blit(immediate)
+
+    def clearMarkers(self, immediate=False):
+        for markers in (self.roots, self.maxima, self.minima):
+            markers.set_offsets(np.empty((0, 2)))
+        self.discontinuities.set_segments([])
+        self.blit(immediate)
+
+    def markerCount(self):
+        # the number of features shown on the axes
+        return (len(self.roots.get_offsets()) + len(self.maxima.get_offsets()) + len(self.minima.get_offsets())
+                + len(self.discontinuities.get_segments()))
+
+    def update(self, rescale=False, immediate=False):
+        # the ticks and labels only need to be drawn again when the limits change, a full draw
+        # is left to the event loop unless immediate is set
+        if not self.axes.get_visible():
+            self.axes.set_visible(True)
+            self.rescale()
+            self.background = None
+        elif rescale and self.rescale():
+            self.background = None
+
+        self.blit(immediate)
+
+    def blit(self, immediate=False):
+        if self.background is None:
+            if immediate:
+                self.canvas.draw()
+            else:
+                self.canvas.draw_idle()
+            return
+
+        self.canvas.restore_region(self.background)
+        self.drawAnimated()
+        self.canvas.blit(self.figure.bbox)
+        self.blits += 1
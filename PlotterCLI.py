@@ -0,0 +1,180 @@
+import argparse
+import csv
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import PlotterCore
+from ParallelEvaluation import PARALLEL_THRESHOLD, ParallelEvaluator
+
+# one line of the jobs file, samples is None for the adaptive sampling
+Job = namedtuple('Job', ['line', 'equation', 'minX', 'maxX', 'samples'])
+
+# the csv files get every sample, 10 million are 160 MB of x and y values
+MAXIMUM_SAMPLES = 10 ** 7
+
+INVALID_SAMPLES = 'samples must be an integer between 2 and %d' % MAXIMUM_SAMPLES
+WORKER_STOPPED = 'the worker process running the job stopped'
+
+# the options of the command shared by every job of a worker process
+workerOptions = {}
+
+
+def readJobs(path):
+    # every line of the file is 'equation,min,max' or 'equation,min,max,samples',
+    # empty lines and lines starting with '#' are skipped
+    jobs = []
+    errors = []
+    with open(path, newline='') as file:
+        for line, row in enumerate(csv.reader(file), start=1):
+            if not row or not row[0].strip() or row[0].lstrip().startswith('#'):
+                continue
+            if len(row) not in (3, 4):
+                errors.append((line, 'expected equation,min,max[,samples]'))
+                continue
+
+            equation = row[0].strip()
+            message = PlotterCore.validate(equation)
+            if message != 'Correct Equation':
+                errors.append((line, message))
+                continue
+
+            rangeMessage, minX, maxX = PlotterCore.readRange(row[1], row[2])
+            if rangeMessage is not None:
+                errors.append((line, rangeMessage))
+                continue
+
+            samples = None
+            if len(row) == 4 and row[3].strip():
+                try:
+                    samples = int(row[3])
+                except ValueError:
+                    samples = 0
+                if not 2 <= samples <= MAXIMUM_SAMPLES:
+                    errors.append((line, INVALID_SAMPLES))
+                    continue
+
+            jobs.append(Job(line, equation, minX, maxX, samples))
+    return jobs, errors
+
+
+def initWorker(options):
+    workerOptions.update(options)
+
+
+def evaluateJob(job, reduced, parallel=None):
+    # the images only need the lowest and highest samples of each pixel column, so the fixed
+    # samples of their jobs are evaluated in chunks by PlotterCore.stream instead of all at once,
+    # unless they are split over the processes of a ParallelEvaluator
+    if parallel is not None:
+        return PlotterCore.evaluate(job.equation, job.minX, job.maxX, job.samples, parallel=parallel)
+    if not reduced or job.samples is None:
+        return PlotterCore.evaluate(job.equation, job.minX, job.maxX, job.samples)
+    columns = max(int(workerOptions['size'][0] * workerOptions['dpi']), 1)
+    return PlotterCore.stream(PlotterCore.compile(job.equation), job.minX, job.maxX, job.samples, columns)
+
+
+def runJob(job, parallel=None):
+    # the compiled equations stay in the cache of the worker process, so the jobs of the same
+    # equation are only compiled once per worker, a job failing in any other way than its
+    # equation, like running out of memory or an output file that cannot be written, is also
+    # reported on its line so the other jobs and the summary are not lost
+    try:
+        samples = {}
+        for format in workerOptions['formats']:
+            reduced = format != 'csv' and parallel is None
+            if reduced not in samples:
+                samples[reduced] = evaluateJob(job, reduced, parallel)
+            xs, ys = samples[reduced]
+            path = os.path.join(workerOptions['outputDirectory'], '%05d.%s' % (job.line, format))
+            PlotterCore.render(xs, ys, path, format, workerOptions['size'], workerOptions['dpi'],
+                               title='y = ' + job.equation)
+    except PlotterCore.PlotError as error:
+        return job.line, str(error)
+    except Exception as error:
+        return job.line, '%s: %s' % (type(error).__name__, error) if str(error) else type(error).__name__
+    return job.line, None
+
+
+def runJobs(jobs, options, workers=None, chunksize=16, parallelSamples=PARALLEL_THRESHOLD):
+    # the jobs of the same equation are kept next to each other so they go to the same worker,
+    # the jobs of at least parallelSamples samples are run one at a time afterwards, each of them
+    # split over the processes of a ParallelEvaluator
+    jobs = sorted(jobs, key=lambda job: PlotterCore.EquationCache.normalize(job.equation))
+    parallelJobs = []
+    if (workers or os.cpu_count() or 1) > 1:
+        parallelJobs = [job for job in jobs if job.samples is not None and job.samples >= parallelSamples]
+        jobs = [job for job in jobs if job.samples is None or job.samples < parallelSamples]
+
+    results = runPool(jobs, options, workers, chunksize)
+    if parallelJobs:
+        initWorker(options)
+        with ParallelEvaluator(workers, threshold=parallelSamples) as evaluator:
+            results.extend(runJob(job, evaluator) for job in parallelJobs)
+    return results
+
+
+def runPool(jobs, options, workers, chunksize):
+    if workers == 1 or not jobs:
+        initWorker(options)
+        return [runJob(job) for job in jobs]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=initWorker, initargs=(options,)) as executor:
+        try:
+            for result in executor.map(runJob, jobs, chunksize=chunksize):
+                results.append(result)
+        except BrokenProcessPool:
+            # a worker was killed, like by the system running out of memory, the jobs without a
+            # result are failed and the others are still reported
+            results.extend((job.line, WORKER_STOPPED) for job in jobs[len(results):])
+    return results
+
+
+def parseSize(text):
+    width, height = text.lower().split('x')
+    return float(width), float(height)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Plot the equations of a jobs file without the GUI.')
+    parser.add_argument('jobs', help="file with one 'equation,min,max[,samples]' job per line")
+    parser.add_argument('-o', '--output', default='plots', help='directory of the output files')
+    parser.add_argument('-f', '--format', action='append', choices=PlotterCore.FORMATS,
+                        help='output format, can be given more than once (default png)')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='number of worker processes (default the number of CPUs)')
+    parser.add_argument('--size', type=parseSize, default=(8, 6), help='figure size in inches, like 8x6')
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--chunksize', type=int, default=16, help='number of jobs sent to a worker at once')
+    parser.add_argument('--parallel-samples', type=int, default=PARALLEL_THRESHOLD,
+                        help='jobs with at least this many samples are each split over the workers')
+    options = parser.parse_args(arguments)
+
+    jobs, errors = readJobs(options.jobs)
+    os.makedirs(options.output, exist_ok=True)
+    workerSettings = {
+        'outputDirectory': options.output,
+        'formats': options.format or ['png'],
+        'size': options.size,
+        'dpi': options.dpi,
+    }
+
+    plotted = 0
+    for line, message in runJobs(jobs, workerSettings, options.workers, options.chunksize,
+                                 options.parallel_samples):
+        if message is None:
+            plotted += 1
+        else:
+            errors.append((line, message))
+
+    for line, message in sorted(errors):
+        print('line %d: %s' % (line, message), file=sys.stderr)
+    print('%d plotted, %d failed' % (plotted, len(errors)))
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
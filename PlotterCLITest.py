@@ -0,0 +1,137 @@
+import os
+
+import numpy as np
+
+import PlotterCLI
+import PlotterCore
+from ParallelEvaluation import ParallelEvaluator
+
+
+def writeJobs(tmp_path, lines):
+    path = tmp_path / 'jobs.csv'
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+class TestReadJobs:
+    def test_jobs_and_errors(self, tmp_path):
+        path = writeJobs(tmp_path, [
+            '# equation,min,max,samples',
+            'x^2,-10,10',
+            'x^3,-1,1,500',
+            '',
+            'x^^2,-10,10',
+            'x,10,-10',
+            'x,0,1,1',
+            'x,0,1,100000000',
+        ])
+        jobs, errors = PlotterCLI.readJobs(path)
+
+        assert jobs == [PlotterCLI.Job(2, 'x^2', -10.0, 10.0, None), PlotterCLI.Job(3, 'x^3', -1.0, 1.0, 500)]
+        assert errors == [
+            (5, 'The Equation cannot have 2 or more consecutive operators'),
+            (6, 'Max value of x should be greater than min value.'),
+            (7, PlotterCLI.INVALID_SAMPLES),
+            (8, PlotterCLI.INVALID_SAMPLES),
+        ]
+
+
+class TestMain:
+    def test_writes_every_format(self, tmp_path, capsys):
+        path = writeJobs(tmp_path, ['x^2,-10,10', 'x^3,-1,1,100', 'x^2,0,5'])
+        output = tmp_path / 'plots'
+
+        status = PlotterCLI.main([path, '-o', str(output), '-f', 'png', '-f', 'csv', '-w', '2', '--size', '2x2'])
+
+        assert status == 0
+        assert sorted(file.name for file in output.iterdir()) == [
+            '00001.csv', '00001.png', '00002.csv', '00002.png', '00003.csv', '00003.png']
+        assert '3 plotted, 0 failed' in capsys.readouterr().out
+
+    def test_reports_failed_jobs(self, tmp_path, capsys):
+        path = writeJobs(tmp_path, ['x/(x-x),-10,10', 'x,0,1'])
+
+        status = PlotterCLI.main([path, '-o', str(tmp_path / 'plots'), '-f', 'svg', '-w', '1'])
+
+        captured = capsys.readouterr()
+        assert status == 1
+        assert 'line 1: The entered function is not valid.' in captured.err
+        assert '1 plotted, 1 failed' in captured.out
+
+    def test_images_of_fixed_samples_are_streamed(self, tmp_path, monkeypatch):
+        streamed = []
+        stream = PlotterCore.stream
+
+        def recordStream(function, minX, maxX, samples, columns):
+            streamed.append((samples, columns))
+            return stream(function, minX, maxX, samples, columns)
+
+        monkeypatch.setattr(PlotterCore, 'stream', recordStream)
+        path = writeJobs(tmp_path, ['x^2,-10,10,1000000'])
+        output = tmp_path / 'plots'
+
+        assert PlotterCLI.main([path, '-o', str(output), '-f', 'png', '-w', '1', '--size', '2x2']) == 0
+        assert streamed == [(1000000, 200)]
+        assert (output / '00001.png').exists()
+
+    def test_other_errors_are_reported_on_their_line(self, tmp_path, monkeypatch, capsys):
+        render = PlotterCore.render
+
+        def failingRender(xs, ys, path, *arguments, **options):
+            if path.endswith('00002.svg'):
+                raise MemoryError()
+            if path.endswith('00003.svg'):
+                raise OSError('No space left on device')
+            return render(xs, ys, path, *arguments, **options)
+
+        monkeypatch.setattr(PlotterCore, 'render', failingRender)
+        path = writeJobs(tmp_path, ['x,0,1', 'x^2,0,1', 'x^3,0,1'])
+
+        status = PlotterCLI.main([path, '-o', str(tmp_path / 'plots'), '-f', 'svg', '-w', '1'])
+
+        captured = capsys.readouterr()
+        assert status == 1
+        assert 'line 2: MemoryError' in captured.err
+        assert 'line 3: OSError: No space left on device' in captured.err
+        assert '1 plotted, 2 failed' in captured.out
+
+    def test_killed_worker_fails_only_its_jobs(self, tmp_path, monkeypatch, capsys):
+        # the worker processes are forked with the patched render
+        render = PlotterCore.render
+
+        def killingRender(xs, ys, path, *arguments, **options):
+            if path.endswith('00002.svg'):
+                os._exit(1)
+            return render(xs, ys, path, *arguments, **options)
+
+        monkeypatch.setattr(PlotterCore, 'render', killingRender)
+        path = writeJobs(tmp_path, ['x,0,1', 'x^2,0,1'])
+
+        status = PlotterCLI.main([path, '-o', str(tmp_path / 'plots'), '-f', 'svg', '-w', '2', '--chunksize', '1'])
+
+        captured = capsys.readouterr()
+        assert status == 1
+        assert 'line 2: ' + PlotterCLI.WORKER_STOPPED in captured.err
+        assert 'failed' in captured.out
+
+    def test_jobs_with_many_samples_are_split_over_the_workers(self, tmp_path, monkeypatch):
+        evaluated = []
+        evaluate = ParallelEvaluator.evaluate
+
+        def recordEvaluate(evaluator, equation, *arguments, **options):
+            evaluated.append(equation)
+            return evaluate(evaluator, equation, *arguments, **options)
+
+        monkeypatch.setattr(ParallelEvaluator, 'evaluate', recordEvaluate)
+        path = writeJobs(tmp_path, ['x^2,-1,1,5000', 'x,0,1,100'])
+        output = tmp_path / 'plots'
+
+        status = PlotterCLI.main([path, '-o', str(output), '-f', 'csv', '-f', 'png', '-w', '2',
+                                  '--parallel-samples', '1000'])
+
+        assert status == 0
+        assert evaluated == ['x^2']
+        xs, ys = np.loadtxt(output / '00001.csv', delimiter=',', skiprows=1, unpack=True)
+        assert np.array_equal(xs, np.linspace(-1, 1, 5000))
+        assert np.allclose(ys, xs ** 2)
+        assert (output / '00001.png').exists() and (output / '00002.png').exists()
@@ -0,0 +1,278 @@
+import io
+import math
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+import ExpressionParser
+import Sampling
+
+# messages of the inputs, the messages of the equation are in ExpressionParser
+EMPTY_EQUATION = 'Please enter the equation.'
+INVALID_RANGE = 'Please enter valid min and max values for x.'
+REVERSED_RANGE = 'Max value of x should be greater than min value.'
+INVALID_PARAMETERS = 'Parameters must be different names made of letters other than x, separated by commas.'
+
+# formats that render can write
+FORMATS = ('png', 'svg', 'csv')
+
+# memory in bytes used by the chunks of stream
+MEMORY_LIMIT = 64 * 2 ** 20
+
+
+class PlotError(ValueError):
+    pass
+
+
+class EquationCache:
+
+    def __init__(self, maxSize=128, backend=None):
+        if maxSize < 1:
+            raise ValueError('maxSize must be at least 1')
+        self.maxSize = maxSize
+        # the backend of ExpressionParser the equations are compiled with, the default one if None
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        # compiled callables ordered from least to most recently used
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def normalize(equation):
+        # the tokenizer ignores spaces and case so they do not change the compiled equation
+        return equation.replace(' ', '').lower()
+
+    def get(self, equation, tree=None):
+        # the tree of the equation can be given when it was already parsed
+        key = self.normalize(equation)
+
+        # return the compiled callable if the equation was already compiled
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        if tree is None:
+            compiledEquation = ExpressionParser.compileExpression(key, self.backend)
+        else:
+            compiledEquation = ExpressionParser.compileTree(tree, self.backend)
+
+        # store the compiled callable and drop the least recently used one if the cache is full
+        self.entries[key] = compiledEquation
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+        return compiledEquation
+
+    def invalidate(self, equation=None):
+        # drop a single equation or the whole cache
+        if equation is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(self.normalize(equation), None)
+
+    def resize(self, maxSize):
+        if maxSize < 1:
+            raise ValueError('maxSize must be at least 1')
+        self.maxSize = maxSize
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, equation):
+        return self.normalize(equation) in self.entries
+
+
+# every process has its own cache, so the workers of a process pool keep their compiled equations
+defaultCache = EquationCache()
+
+
+def validate(equation, parameters=()):
+    # returns 'Correct Equation' or the message that is shown to the user
+    if equation == '':
+        return EMPTY_EQUATION
+    return ExpressionParser.validateExpression(equation, parameters)
+
+
+def readParameters(text):
+    # returns the error message and the names of the parameters in a text like 'a, b'
+    if text.strip() == '':
+        return None, ()
+    names = tuple(name.strip().lower() for name in text.split(','))
+    for name in names:
+        if not name.isalpha() or not name.isascii() or 'x' in name:
+            return INVALID_PARAMETERS, None
+    if len(set(names)) != len(names):
+        return INVALID_PARAMETERS, None
+    return None, names
+
+
+def readRange(minText, maxText):
+    # returns the error message and the minimum and maximum values of x
+    try:
+        # get the minimum and maximum values of x
+        minX = float(minText)
+        maxX = float(maxText)
+    except (TypeError, ValueError):
+        return INVALID_RANGE, None, None
+
+    # float() also reads 'nan' and 'inf', and a range too wide overflows its length
+    if not math.isfinite(maxX - minX):
+        return INVALID_RANGE, None, None
+
+    # check if the minimum value of x is greater than the maximum value of x
+    if minX >= maxX:
+        return REVERSED_RANGE, None, None
+
+    return None, minX, maxX
+
+
+def compile(equation, cache=None):
+    # compile the equation into a numpy function, raises PlotError with the message if it is invalid
+    message = validate(equation)
+    if message != ExpressionParser.CORRECT_EQUATION:
+        raise PlotError(message)
+    if cache is None:
+        cache = defaultCache
+    try:
+        return cache.get(equation)
+    except ExpressionParser.ParseError as error:
+        raise PlotError(str(error))
+
+
+def compileFamily(equation, parameters):
+    # compile an equation with parameters into a CompiledFamily, a function of the x values and
+    # the values of the parameters, raises PlotError with the message if it is invalid
+    message = validate(equation, parameters)
+    if message != ExpressionParser.CORRECT_EQUATION:
+        raise PlotError(message)
+    try:
+        return ExpressionParser.compileFamily(EquationCache.normalize(equation), parameters)
+    except ExpressionParser.ParseError as error:
+        raise PlotError(str(error))
+
+
+def compileGroup(equations):
+    # compile the equations into one function filling a row per equation, the sub-expressions
+    # they have in common are computed once, raises PlotError with the message of the first
+    # invalid equation
+    trees = []
+    for equation in equations:
+        message = validate(equation)
+        if message != ExpressionParser.CORRECT_EQUATION:
+            raise PlotError(message)
+        trees.append(ExpressionParser.parse(EquationCache.normalize(equation)))
+    try:
+        return ExpressionParser.compileTrees(trees)
+    except ExpressionParser.ParseError as error:
+        raise PlotError(str(error))
+
+
+def sample(function, minX, maxX, samples=None, sampleBudget=2000, sampleTolerance=1e-3, cancelled=None,
+           cache=None):
+    # the numpy errors make the function invalid, as the warnings did in the first versions,
+    # the error state is local to the thread so this can run in a worker thread, with a
+    # SampleCache the samples (a quarter of them with the adaptive sampling) are on its grid and
+    # only the parts not cached are evaluated
+    try:
+        with np.errstate(divide='raise', over='raise', invalid='raise'):
+            if samples is None:
+                return Sampling.adaptiveSample(function, minX, maxX, sampleBudget, sampleTolerance,
+                                               cancelled=cancelled, cache=cache)
+            if cache is not None:
+                return cache.sample(function, function, minX, maxX, samples)
+            xs = np.linspace(minX, maxX, samples)
+            return xs, Sampling.evaluate(function, xs)
+    except (ArithmeticError, ValueError):
+        raise PlotError(ExpressionParser.INVALID_FUNCTION)
+
+
+def stream(function, minX, maxX, samples, columns=2000, memoryLimit=MEMORY_LIMIT, dtype=np.float64, export=None,
+           cancelled=None, cache=None):
+    # evaluate the function at samples evenly spaced points in chunks that fit in memoryLimit bytes,
+    # returns the samples reduced to the given number of pixel columns, the raw samples are written
+    # as (x, y) rows to the .npy file export when it is given, without holding them in memory,
+    # the rows are written to export + '.part' which only replaces export once all of them are,
+    # samples that fit in a single chunk come from the SampleCache when one is given
+    if samples < 2:
+        raise ValueError('samples must be at least 2')
+    if cache is not None and export is None and samples <= Sampling.chunkLength(memoryLimit, dtype):
+        xs, ys = sample(function, minX, maxX, samples, cache=cache)
+        xs, ys = Sampling.decimateMinMax(xs, ys, columns)
+        return xs.astype(dtype, copy=False), ys.astype(dtype, copy=False)
+    partial = None if export is None else export + '.part'
+    out = None
+    completed = False
+    try:
+        if partial is not None:
+            out = np.lib.format.open_memmap(partial, mode='w+', dtype=dtype, shape=(samples, 2))
+        with np.errstate(divide='raise', over='raise', invalid='raise'):
+            result = Sampling.streamSample(function, minX, maxX, samples, columns,
+                                           Sampling.chunkLength(memoryLimit, dtype), dtype, out, cancelled)
+        if out is not None:
+            out.flush()
+        completed = cancelled is None or not cancelled()
+        return result
+    except (ArithmeticError, ValueError):
+        raise PlotError(ExpressionParser.INVALID_FUNCTION)
+    finally:
+        # a failed or cancelled export leaves no file behind
+        out = None
+        if partial is not None and completed:
+            os.replace(partial, export)
+        elif partial is not None and os.path.exists(partial):
+            os.remove(partial)
+
+
+def evaluate(equation, minX, maxX, samples=None, sampleBudget=2000, sampleTolerance=1e-3, cache=None,
+             parallel=None):
+    # samples the equation adaptively, or at the given number of evenly spaced points, which are
+    # split over the processes of a ParallelEvaluator when one is given
+    if minX >= maxX:
+        raise PlotError(REVERSED_RANGE)
+    if parallel is not None and samples is not None:
+        return parallel.evaluate(equation, minX, maxX, samples)
+    return sample(compile(equation, cache), minX, maxX, samples, sampleBudget, sampleTolerance)
+
+
+def evaluateGroup(equations, minX, maxX, samples=2000):
+    # evaluates the equations on the same evenly spaced x values, returns the x values and an
+    # array with a row of y values for each equation, with gaps where an equation is not defined
+    if minX >= maxX:
+        raise PlotError(REVERSED_RANGE)
+    return Sampling.sampleGroup(compileGroup(equations), minX, maxX, samples)
+
+
+def render(xs, ys, path=None, format='png', size=(8, 6), dpi=100, title=None):
+    # draw the samples with the Agg backend, writes them to path or returns the bytes of the file,
+    # matplotlib is only imported when something is drawn
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    if format not in FORMATS:
+        raise ValueError('unknown format ' + repr(format))
+
+    output = io.BytesIO() if path is None else path
+    if format == 'csv':
+        np.savetxt(output, np.column_stack((xs, ys)), delimiter=',', header='x,y', comments='')
+    else:
+        figure = Figure(figsize=size, dpi=dpi)
+        FigureCanvasAgg(figure)
+        ax = figure.subplots()
+        ax.plot(*Sampling.decimateMinMax(xs, ys, max(int(size[0] * dpi), 1)))
+        if title is not None:
+            ax.set_title(title)
+        figure.savefig(output, format=format)
+
+    if path is None:
+        return output.getvalue()
+    return path
+
+
+def plot(equation, minX, maxX, path=None, format='png', samples=None, size=(8, 6), dpi=100, cache=None):
+    # validate, compile, evaluate and render an equation in one call
+    xs, ys = evaluate(equation, minX, maxX, samples, cache=cache)
+    return render(xs, ys, path, format, size, dpi, title='y = ' + equation)
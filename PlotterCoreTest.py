@@ -0,0 +1,165 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import PlotterCore
+import Sampling
+from PlotterCore import EquationCache, PlotError
+
+
+class TestValidate:
+    def test_messages(self):
+        assert PlotterCore.validate('x^2') == 'Correct Equation'
+        assert PlotterCore.validate('') == 'Please enter the equation.'
+        assert PlotterCore.validate('x^^2') == 'The Equation cannot have 2 or more consecutive operators'
+
+    def test_range(self):
+        assert PlotterCore.readRange('-10', '10') == (None, -10.0, 10.0)
+        assert PlotterCore.readRange('a', '10') == ('Please enter valid min and max values for x.', None, None)
+        assert PlotterCore.readRange('10', '-10') == ('Max value of x should be greater than min value.', None, None)
+
+    def test_range_must_be_finite(self):
+        for minText, maxText in (('nan', '10'), ('-10', 'inf'), ('-inf', 'inf'), ('-1e308', '1e308')):
+            assert PlotterCore.readRange(minText, maxText) == (PlotterCore.INVALID_RANGE, None, None)
+
+
+class TestCompileAndEvaluate:
+    def test_compile_uses_the_cache(self):
+        cache = EquationCache()
+        assert PlotterCore.compile('x^2', cache) is PlotterCore.compile('X^2', cache)
+        assert cache.hits == 1
+
+    def test_compile_raises_the_validation_message(self):
+        with pytest.raises(PlotError, match='The Equation must have at least one x'):
+            PlotterCore.compile('2')
+
+    def test_evaluate_at_fixed_samples(self):
+        xs, ys = PlotterCore.evaluate('x^2', -1, 1, samples=5)
+        assert np.allclose(xs, [-1, -0.5, 0, 0.5, 1])
+        assert np.allclose(ys, xs ** 2)
+
+    def test_evaluate_adaptively(self):
+        xs, ys = PlotterCore.evaluate('2*x', -10, 10)
+        assert len(xs) == 64
+        assert np.allclose(ys, 2 * xs)
+
+    def test_invalid_function(self):
+        with pytest.raises(PlotError, match='The entered function is not valid.'):
+            PlotterCore.evaluate('x/(x-x)', -10, 10)
+
+    def test_sample_with_cache(self):
+        function = PlotterCore.compile('x^2')
+        cache = Sampling.SampleCache()
+        xs, ys = PlotterCore.sample(function, -1, 1, 100, cache=cache)
+        assert np.allclose(ys, xs ** 2)
+
+        with pytest.raises(PlotError, match='The entered function is not valid.'):
+            PlotterCore.sample(PlotterCore.compile('1/x'), -1, 1, 100, cache=cache)
+
+    def test_evaluate_group(self):
+        xs, ys = PlotterCore.evaluateGroup(['x^2', '2*X'], -1, 1, samples=5)
+        assert np.allclose(ys, [xs ** 2, 2 * xs])
+
+    def test_group_raises_the_validation_message(self):
+        with pytest.raises(PlotError, match='The Equation must have at least one x'):
+            PlotterCore.compileGroup(['x^2', '2'])
+
+
+class TestParameters:
+    def test_read_parameters(self):
+        assert PlotterCore.readParameters('') == (None, ())
+        assert PlotterCore.readParameters(' A, b ') == (None, ('a', 'b'))
+        for text in ('a, a', 'a,', 'ax', 'a1', 'a b'):
+            assert PlotterCore.readParameters(text) == (PlotterCore.INVALID_PARAMETERS, None)
+
+    def test_compile_family(self):
+        family = PlotterCore.compileFamily('A*X + b', ('a', 'b'))
+        assert np.allclose(family(np.array([1.0, 2.0]), 2, 1), [3, 5])
+
+        with pytest.raises(PlotError, match='invalid characters'):
+            PlotterCore.compileFamily('a*x+c', ('a', 'b'))
+
+
+class TestStream:
+    def test_export_to_npy(self, tmp_path):
+        path = tmp_path / 'samples.npy'
+        PlotterCore.stream(PlotterCore.compile('x^2'), -1, 1, 100001, export=str(path), memoryLimit=2 ** 16)
+
+        samples = np.load(path)
+        assert samples.shape == (100001, 2)
+        assert np.allclose(samples[:, 1], samples[:, 0] ** 2)
+
+    def test_failed_export_leaves_no_file(self, tmp_path):
+        path = tmp_path / 'samples.npy'
+        with pytest.raises(PlotError):
+            PlotterCore.stream(PlotterCore.compile('x/(x-x)'), 0, 1, 100001, export=str(path),
+                               memoryLimit=2 ** 16)
+        assert list(tmp_path.iterdir()) == []
+
+    def test_cancelled_export_leaves_no_file(self, tmp_path):
+        path = tmp_path / 'samples.npy'
+        path.write_bytes(b'earlier export')
+        chunks = []
+
+        def cancelled():
+            chunks.append(None)
+            return len(chunks) > 2
+
+        PlotterCore.stream(PlotterCore.compile('x^2'), -1, 1, 100001, export=str(path), memoryLimit=2 ** 16,
+                           cancelled=cancelled)
+        assert path.read_bytes() == b'earlier export'
+        assert list(tmp_path.iterdir()) == [path]
+
+    def test_float32_export(self, tmp_path):
+        path = tmp_path / 'samples.npy'
+        PlotterCore.stream(PlotterCore.compile('x+1'), 0, 1, 1000, export=str(path), dtype=np.float32)
+        assert np.load(path).dtype == np.float32
+
+    def test_memory_does_not_grow_with_the_samples(self):
+        function = PlotterCore.compile('(x+2)^3*x-1/(x^2+1)')
+        peaks = []
+        for samples in (10 ** 5, 2 * 10 ** 6):
+            tracemalloc.start()
+            PlotterCore.stream(function, -10, 10, samples, memoryLimit=2 ** 20)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        assert peaks[1] < 2 ** 20
+        assert peaks[1] < 1.5 * peaks[0]
+
+    def test_small_streams_come_from_the_cache(self):
+        function = PlotterCore.compile('x^2')
+        cache = Sampling.SampleCache()
+        PlotterCore.stream(function, -10, 10, 1000, cache=cache)
+        evaluated = cache.evaluated
+
+        xs, ys = PlotterCore.stream(function, -10, 12, 1000, cache=cache)
+        assert xs[-1] == 12
+        assert cache.evaluated - evaluated < 0.15 * evaluated
+
+    def test_invalid_function(self):
+        with pytest.raises(PlotError, match='The entered function is not valid.'):
+            PlotterCore.stream(PlotterCore.compile('x/(x-x)'), -1, 1, 1000)
+
+
+class TestRender:
+    def test_png(self):
+        data = PlotterCore.plot('x^2', -10, 10, format='png', size=(2, 2), dpi=50)
+        assert data.startswith(b'\x89PNG')
+
+    def test_svg(self):
+        data = PlotterCore.plot('x^2', -10, 10, format='svg', size=(2, 2))
+        assert b'<svg' in data
+
+    def test_csv_file(self, tmp_path):
+        path = tmp_path / 'plot.csv'
+        PlotterCore.plot('x+1', 0, 1, path=str(path), format='csv', samples=3)
+
+        rows = path.read_text().splitlines()
+        assert rows[0] == 'x,y'
+        assert [float(value) for value in rows[2].split(',')] == [0.5, 1.5]
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError):
+            PlotterCore.render(np.zeros(2), np.zeros(2), format='gif')
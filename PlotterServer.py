@@ -0,0 +1,278 @@
+import argparse
+import hashlib
+import json
+import logging
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import PlotterCore
+
+logger = logging.getLogger('PlotterServer')
+
+# formats the server renders and their content types
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+# changing the drawing changes this, so the images cached by the clients are not reused
+RENDER_VERSION = 1
+
+# requests larger than this are rejected before they are read
+MAXIMUM_BODY = 64 * 2 ** 10
+
+# seconds a request waits for its image before the server gives up
+RENDER_TIMEOUT = 30
+
+# limits of the options, so a single request cannot take the workers for long
+MAXIMUM_SIZE = 40
+MAXIMUM_DPI = 300
+MAXIMUM_SAMPLES = 10 ** 6
+
+INVALID_SIZE = 'size must be [width, height] in inches between 0 and %d' % MAXIMUM_SIZE
+INVALID_DPI = 'dpi must be an integer between 1 and %d' % MAXIMUM_DPI
+INVALID_FORMAT = 'format must be one of ' + ', '.join(CONTENT_TYPES)
+INVALID_SAMPLES = 'samples must be an integer between 2 and %d' % MAXIMUM_SAMPLES
+INVALID_JSON = 'The request must be a JSON object.'
+
+
+def readPlot(data):
+    # returns the error message and the options of the plot of a decoded JSON request, the equation
+    # and the range are checked like in the GUI so the messages are the same
+    if not isinstance(data, dict):
+        return INVALID_JSON, None
+
+    equation = data.get('equation', '')
+    if not isinstance(equation, str):
+        return INVALID_JSON, None
+    message = PlotterCore.validate(equation)
+    if message != 'Correct Equation':
+        return message, None
+
+    minX, maxX = data.get('minX'), data.get('maxX')
+    if isinstance(minX, bool) or isinstance(maxX, bool):
+        return PlotterCore.INVALID_RANGE, None
+    rangeMessage, minX, maxX = PlotterCore.readRange(minX, maxX)
+    if rangeMessage is not None:
+        return rangeMessage, None
+
+    size = data.get('size', [8, 6])
+    if (not isinstance(size, list) or len(size) != 2
+            or not all(isinstance(value, (int, float)) and not isinstance(value, bool)
+                       and 0 < value <= MAXIMUM_SIZE for value in size)):
+        return INVALID_SIZE, None
+
+    dpi = data.get('dpi', 100)
+    if not isinstance(dpi, int) or isinstance(dpi, bool) or not 1 <= dpi <= MAXIMUM_DPI:
+        return INVALID_DPI, None
+
+    format = data.get('format', 'png')
+    if format not in CONTENT_TYPES:
+        return INVALID_FORMAT, None
+
+    samples = data.get('samples')
+    if samples is not None and (not isinstance(samples, int) or isinstance(samples, bool)
+                                or not 2 <= samples <= MAXIMUM_SAMPLES):
+        return INVALID_SAMPLES, None
+
+    return None, {
+        'equation': PlotterCore.EquationCache.normalize(equation),
+        'minX': minX,
+        'maxX': maxX,
+        'size': [float(value) for value in size],
+        'dpi': dpi,
+        'format': format,
+        'samples': samples,
+    }
+
+
+def plotDigest(plot):
+    # the address of the image of a plot, the same options always give the same image so the
+    # digest is also its ETag and is known before anything is rendered
+    canonical = json.dumps(dict(plot, version=RENDER_VERSION), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def renderPlot(plot):
+    # runs in the worker processes, the compiled equations stay in the EquationCache of each of them
+    return PlotterCore.plot(plot['equation'], plot['minX'], plot['maxX'], format=plot['format'],
+                            samples=plot['samples'], size=tuple(plot['size']), dpi=plot['dpi'])
+
+
+class RenderCache:
+    # rendered images by the digest of their plot, the least recently used are dropped when the
+    # images take more than maxBytes, the same plot requested again while it is rendered waits
+    # for the running render instead of starting another one
+
+    def __init__(self, maxBytes=64 * 2 ** 20):
+        self.maxBytes = maxBytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.rendering = {}
+        self.lock = threading.Lock()
+
+    def get(self, digest, render):
+        # returns the image of digest, render is called to start rendering it and returns a future
+        started = False
+        with self.lock:
+            if digest in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(digest)
+                return self.entries[digest]
+            future = self.rendering.get(digest)
+            if future is None:
+                self.misses += 1
+                future = render()
+                self.rendering[digest] = future
+                started = True
+        # a future that is already done calls back at once, so the lock must not be held
+        if started:
+            future.add_done_callback(lambda done: self.store(digest, done))
+        return future.result(RENDER_TIMEOUT)
+
+    def store(self, digest, future):
+        with self.lock:
+            self.rendering.pop(digest, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            image = future.result()
+            self.entries[digest] = image
+            self.bytes += len(image)
+            while self.bytes > self.maxBytes and self.entries:
+                _, dropped = self.entries.popitem(last=False)
+                self.bytes -= len(dropped)
+
+    def __contains__(self, digest):
+        return digest in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class PlotRequestHandler(BaseHTTPRequestHandler):
+    # POST /plot with a JSON object renders a plot, GET /stats returns the counters of the cache
+
+    def do_POST(self):
+        if self.path != '/plot':
+            self.sendJson(404, {'error': 'Not found.'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAXIMUM_BODY:
+            self.sendJson(413, {'error': 'The request must be at most %d bytes.' % MAXIMUM_BODY})
+            return
+        try:
+            data = json.loads(self.rfile.read(length))
+        except ValueError:
+            self.sendJson(400, {'error': INVALID_JSON})
+            return
+
+        message, plot = readPlot(data)
+        if message is not None:
+            self.sendJson(400, {'error': message})
+            return
+
+        # the ETag is the digest of the plot, a client that has it does not need the image again
+        digest = plotDigest(plot)
+        etag = '"%s"' % digest
+        tags = self.matchingTags()
+        if etag in tags or '*' in tags:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        try:
+            image = self.server.cache.get(digest, lambda: self.server.executor.submit(renderPlot, plot))
+        except PlotterCore.PlotError as error:
+            self.sendJson(400, {'error': str(error)})
+            return
+        except TimeoutError:
+            self.sendJson(503, {'error': 'The plot took too long to render.'})
+            return
+        except Exception:
+            logger.exception('rendering %s failed', digest)
+            self.sendJson(500, {'error': 'The plot could not be rendered.'})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES[plot['format']])
+        self.send_header('Content-Length', str(len(image)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(image)
+
+    def do_GET(self):
+        if self.path != '/stats':
+            self.sendJson(404, {'error': 'Not found.'})
+            return
+        cache = self.server.cache
+        self.sendJson(200, {'hits': cache.hits, 'misses': cache.misses, 'images': len(cache), 'bytes': cache.bytes})
+
+    def matchingTags(self):
+        # the tags of If-None-Match, weak tags are compared like strong ones
+        header = self.headers.get('If-None-Match', '')
+        return {tag.strip().removeprefix('W/') for tag in header.split(',') if tag.strip()}
+
+    def sendJson(self, status, body):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        logger.info('%s %s', self.address_string(), format % args)
+
+
+class PlotServer(ThreadingHTTPServer):
+    # every connection is handled in its own thread, the plots are rendered by a pool of worker
+    # processes so the requests of different plots are drawn at the same time
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 8080), workers=None, cacheBytes=64 * 2 ** 20):
+        ThreadingHTTPServer.__init__(self, address, PlotRequestHandler)
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.cache = RenderCache(cacheBytes)
+
+    def server_close(self):
+        ThreadingHTTPServer.server_close(self)
+        self.executor.shutdown(cancel_futures=True)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Render plots for HTTP clients without the GUI.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default 127.0.0.1)')
+    parser.add_argument('-p', '--port', type=int, default=8080)
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='number of worker processes (default the number of CPUs)')
+    parser.add_argument('--cache-bytes', type=int, default=64 * 2 ** 20, help='memory used by the rendered images')
+    options = parser.parse_args(arguments)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    server = PlotServer((options.host, options.port), options.workers, options.cache_bytes)
+    print('serving plots on %s/plot' % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import json
+import threading
+from http.client import HTTPConnection
+
+import pytest
+
+import PlotterServer
+
+
+@pytest.fixture(scope='module')
+def server():
+    plotServer = PlotterServer.PlotServer(('127.0.0.1', 0), workers=2)
+    thread = threading.Thread(target=plotServer.serve_forever, daemon=True)
+    thread.start()
+    yield plotServer
+    plotServer.shutdown()
+    plotServer.server_close()
+
+
+def request(server, method, path, body=None, headers=None):
+    # returns the status, the headers and the body of the response
+    connection = HTTPConnection(*server.server_address[:2], timeout=60)
+    try:
+        if isinstance(body, dict):
+            body = json.dumps(body)
+        connection.request(method, path, body, headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+class TestReadPlot:
+    def test_defaults(self):
+        message, plot = PlotterServer.readPlot({'equation': 'X ^ 2', 'minX': -1, 'maxX': '1'})
+
+        assert message is None
+        assert plot == {'equation': 'x^2', 'minX': -1.0, 'maxX': 1.0, 'size': [8.0, 6.0], 'dpi': 100,
+                        'format': 'png', 'samples': None}
+
+    def test_messages_of_the_gui(self):
+        assert PlotterServer.readPlot({'equation': 'x^^2', 'minX': 0, 'maxX': 1})[0] == \
+            'The Equation cannot have 2 or more consecutive operators'
+        assert PlotterServer.readPlot({'minX': 0, 'maxX': 1})[0] == 'Please enter the equation.'
+        assert PlotterServer.readPlot({'equation': 'x', 'minX': 1, 'maxX': 0})[0] == \
+            'Max value of x should be greater than min value.'
+        assert PlotterServer.readPlot({'equation': 'x', 'minX': 'a', 'maxX': 1})[0] == \
+            'Please enter valid min and max values for x.'
+
+    def test_options_are_checked(self):
+        plot = {'equation': 'x', 'minX': 0, 'maxX': 1}
+        assert PlotterServer.readPlot(dict(plot, size=[8]))[0] == PlotterServer.INVALID_SIZE
+        assert PlotterServer.readPlot(dict(plot, dpi=1000))[0] == PlotterServer.INVALID_DPI
+        assert PlotterServer.readPlot(dict(plot, format='csv'))[0] == PlotterServer.INVALID_FORMAT
+        assert PlotterServer.readPlot(dict(plot, samples=1))[0] == PlotterServer.INVALID_SAMPLES
+        assert PlotterServer.readPlot([plot])[0] == PlotterServer.INVALID_JSON
+
+    def test_digest_of_the_same_plot(self):
+        _, first = PlotterServer.readPlot({'equation': 'x^2', 'minX': -1, 'maxX': 1})
+        _, second = PlotterServer.readPlot({'equation': 'X^2', 'minX': -1.0, 'maxX': 1, 'dpi': 100})
+        _, other = PlotterServer.readPlot({'equation': 'x^2', 'minX': -1, 'maxX': 2})
+
+        assert PlotterServer.plotDigest(first) == PlotterServer.plotDigest(second)
+        assert PlotterServer.plotDigest(first) != PlotterServer.plotDigest(other)
+
+
+class TestServer:
+    def test_png_and_svg(self, server):
+        status, headers, body = request(server, 'POST', '/plot', {'equation': 'x^3', 'minX': -2, 'maxX': 2,
+                                                                  'size': [2, 2], 'dpi': 50})
+        assert status == 200
+        assert headers['Content-Type'] == 'image/png'
+        assert body.startswith(b'\x89PNG')
+
+        status, headers, body = request(server, 'POST', '/plot', {'equation': 'x^3', 'minX': -2, 'maxX': 2,
+                                                                  'size': [2, 2], 'format': 'svg'})
+        assert status == 200
+        assert headers['Content-Type'] == 'image/svg+xml'
+        assert b'<svg' in body
+
+    def test_repeated_plot_comes_from_the_cache(self, server):
+        plot = {'equation': 'x^2+1', 'minX': -3, 'maxX': 3, 'size': [2, 2], 'dpi': 50}
+        _, first, image = request(server, 'POST', '/plot', plot)
+        misses = server.cache.misses
+
+        status, second, again = request(server, 'POST', '/plot', plot)
+
+        assert status == 200
+        assert again == image
+        assert second['ETag'] == first['ETag']
+        assert server.cache.misses == misses
+
+    def test_known_etag_is_not_modified(self, server):
+        plot = {'equation': 'x^2+2', 'minX': -3, 'maxX': 3, 'size': [2, 2], 'dpi': 50}
+        _, headers, _ = request(server, 'POST', '/plot', plot)
+
+        status, notModified, body = request(server, 'POST', '/plot', plot, {'If-None-Match': headers['ETag']})
+
+        assert status == 304
+        assert notModified['ETag'] == headers['ETag']
+        assert body == b''
+
+    def test_invalid_equation_is_a_json_error(self, server):
+        status, headers, body = request(server, 'POST', '/plot', {'equation': 'x^^2', 'minX': -1, 'maxX': 1})
+
+        assert status == 400
+        assert headers['Content-Type'] == 'application/json'
+        assert json.loads(body) == {'error': 'The Equation cannot have 2 or more consecutive operators'}
+
+    def test_invalid_function_is_reported_by_the_worker(self, server):
+        status, _, body = request(server, 'POST', '/plot', {'equation': 'x/(x-x)', 'minX': -1, 'maxX': 1})
+
+        assert status == 400
+        assert json.loads(body) == {'error': 'The entered function is not valid.'}
+
+    def test_long_equation_is_rendered(self, server):
+        equation = '+'.join('%d*x' % (term + 1) for term in range(1500))
+        status, _, body = request(server, 'POST', '/plot', {'equation': equation, 'minX': -2, 'maxX': 2,
+                                                                  'size': [2, 2], 'dpi': 50})
+        assert status == 200
+        assert body.startswith(b'\x89PNG')
+
+    def test_non_finite_range_is_rejected(self, server):
+        # the json module reads NaN and Infinity
+        status, _, body = request(server, 'POST', '/plot', '{"equation": "x", "minX": NaN, "maxX": 1}')
+        assert status == 400
+        assert json.loads(body) == {'error': 'Please enter valid min and max values for x.'}
+
+        status, _, body = request(server, 'POST', '/plot', '{"equation": "x", "minX": 0, "maxX": Infinity}')
+        assert status == 400
+
+    def test_malformed_requests(self, server):
+        assert request(server, 'POST', '/plot', '{')[0] == 400
+        assert request(server, 'POST', '/other', {})[0] == 404
+        assert request(server, 'GET', '/plot')[0] == 404
+
+    def test_stats(self, server):
+        status, _, body = request(server, 'GET', '/stats')
+
+        assert status == 200
+        assert set(json.loads(body)) == {'hits', 'misses', 'images', 'bytes'}
+
+
+class TestRenderCache:
+    def test_least_recently_used_images_are_dropped(self):
+        from concurrent.futures import Future
+
+        def rendered(image):
+            future = Future()
+            future.set_result(image)
+            return lambda: future
+
+        cache = PlotterServer.RenderCache(maxBytes=10)
+        cache.get('a', rendered(b'1234'))
+        cache.get('b', rendered(b'1234'))
+        cache.get('a', rendered(b'1234'))
+        cache.get('c', rendered(b'1234'))
+
+        assert list(cache.entries) == ['a', 'c']
+        assert cache.bytes == 8
+        assert (cache.hits, cache.misses) == (1, 3)
+
+
+class TestServeMode:
+    def test_graph_plotter_starts_the_server(self):
+        import subprocess
+        import sys
+
+        result = subprocess.run([sys.executable, 'GraphPlotter.py', '--serve', '--help'], capture_output=True,
+                                text=True, check=True)
+
+        assert 'Render plots for HTTP clients' in result.stdout
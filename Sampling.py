@@ -0,0 +1,368 @@
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# arrays alive at the same time while a chunk is evaluated: the x values, the y values and the
+# temporaries numpy creates for the operators of the expression
+CHUNK_ARRAYS = 8
+
+# columns of the grid of sampleGroup evaluated at once, it can be cancelled between them
+GROUP_CHUNK = 65536
+
+
+def evaluate(function, xs, dtype=float):
+    # make sure the result is a float array with the shape of xs
+    return np.broadcast_to(np.asarray(function(xs), dtype=dtype), xs.shape)
+
+
+def yScale(ys):
+    # the range of the finite y values, used to make the tolerances independent of the units
+    finite = ys[np.isfinite(ys)]
+    if finite.size == 0:
+        return 1.0
+    span = finite.max() - finite.min()
+    return span if span > 0 else max(abs(finite[0]), 1.0)
+
+
+def intervalErrors(xs, ys, scale):
+    # error of each interval, made of the curvature at both of its ends and the change of y along it
+    dx = np.diff(xs)
+    dy = np.diff(ys)
+
+    # distance between each inner point and the line joining its neighbours
+    curvature = np.zeros(len(xs))
+    with np.errstate(all='ignore'):
+        interpolated = ys[:-2] + (ys[2:] - ys[:-2]) * (dx[:-1] / (xs[2:] - xs[:-2]))
+        curvature[1:-1] = np.abs(ys[1:-1] - interpolated) / scale
+        change = np.abs(dy) / scale
+    curvature[~np.isfinite(curvature)] = np.inf
+    change[~np.isfinite(change)] = np.inf
+
+    return np.maximum(curvature[:-1], curvature[1:]), change
+
+
+def adaptiveSample(function, minX, maxX, maxPoints=2000, tolerance=1e-3, initialPoints=64, maxChange=0.05,
+                   cancelled=None, cache=None):
+    # start from a coarse grid, evaluated with the error state of the caller so an invalid
+    # function is reported the same way as before
+    xs = np.linspace(minX, maxX, min(initialPoints, maxPoints))
+    ys = evaluate(function, xs).copy()
+
+    if cache is not None:
+        # a quarter of the budget comes from the grid of the SampleCache, so changing the range
+        # only evaluates the part of the grid that was not plotted before
+        with np.errstate(all='ignore'):
+            gridXs, gridYs = cache.sample(function, function, minX, maxX, maxPoints // 4)
+        xs, order = np.unique(np.concatenate((xs, gridXs)), return_index=True)
+        ys = np.concatenate((ys, gridYs))[order]
+
+    # intervals smaller than this cannot be split any further
+    minimumWidth = (maxX - minX) * 1e-12
+
+    while len(xs) < maxPoints:
+        # stop refining when the result is not needed anymore
+        if cancelled is not None and cancelled():
+            break
+
+        scale = yScale(ys)
+        curvature, change = intervalErrors(xs, ys, scale)
+
+        # split the intervals where the curve bends or jumps more than allowed
+        errors = np.maximum(curvature / tolerance, change / maxChange)
+        split = np.flatnonzero((errors > 1) & (np.diff(xs) > minimumWidth))
+        if split.size == 0:
+            break
+
+        # keep only the worst intervals when the budget does not allow splitting all of them
+        remaining = maxPoints - len(xs)
+        if split.size > remaining:
+            worst = np.argpartition(errors[split], split.size - remaining)[split.size - remaining:]
+            split = np.sort(split[worst])
+
+        # evaluate all the midpoints at once, points near a pole may overflow or divide by zero
+        middleXs = (xs[split] + xs[split + 1]) / 2
+        with np.errstate(all='ignore'):
+            middleYs = evaluate(function, middleXs)
+
+        xs = np.insert(xs, split + 1, middleXs)
+        ys = np.insert(ys, split + 1, middleYs)
+
+    return xs, ys
+
+
+def decimateMinMax(xs, ys, columns):
+    # keep only the lowest and highest point of each pixel column, so the drawn curve
+    # looks the same but never has more than about 2 points per column
+    if len(xs) <= 2 * columns:
+        return xs, ys
+
+    # xs are sorted so each column is a contiguous run of points
+    edges = np.linspace(xs[0], xs[-1], columns + 1)
+    starts = np.searchsorted(xs, edges[:-1], side='left')
+    starts = np.unique(starts[starts < len(xs)])
+    columnOf = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(xs))))
+
+    # the missing values are kept so the gaps in the curve stay visible
+    finite = np.isfinite(ys)
+    ordered = np.lexsort((np.where(finite, ys, np.inf), ~finite, columnOf))
+    ends = np.append(starts[1:], len(xs)) - 1
+    finiteCount = np.add.reduceat(finite.astype(int), starts)
+
+    # the first point of each sorted run is the minimum, the last finite one the maximum
+    minimums = ordered[starts]
+    maximums = ordered[np.maximum(starts + finiteCount - 1, starts)]
+    gaps = ordered[ends][finiteCount < (ends - starts + 1)]
+
+    kept = np.unique(np.concatenate((minimums, maximums, gaps)))
+    return xs[kept], np.where(finite[kept], ys[kept], np.nan)
+
+
+class SampleCache:
+    # evaluated segments of functions on grids of x values k * step, where step is a power of 2,
+    # so a new range at about the same resolution only evaluates the parts that are not cached yet
+    #
+    # the segments of a function are kept per step, sorted and merged when they touch, and the
+    # least recently used (function, step) entries are dropped when their y values take more
+    # than maxBytes
+
+    def __init__(self, maxBytes=64 * 2 ** 20):
+        self.maxBytes = maxBytes
+        self.bytes = 0
+        # number of x values evaluated, the others came from the cache
+        self.evaluated = 0
+        # lists of [firstK, ys] ordered from least to most recently used
+        self.entries = OrderedDict()
+        # the viewport and the plot workers use the cache from different threads, the lock is only
+        # held to read and change the segments, the functions are evaluated without it
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def gridStep(minX, maxX, samples):
+        # the largest power of 2 giving at least samples points between minX and maxX
+        return 2.0 ** math.floor(math.log2((maxX - minX) / (max(samples, 2) - 1)))
+
+    def sample(self, key, function, minX, maxX, samples):
+        # returns the x values k * step within [minX, maxX] and the y values of the function, key
+        # identifies the function, the values cached under raising errors are kept apart from the
+        # ones with gaps
+        step = self.gridStep(minX, maxX, samples)
+        first = math.ceil(minX / step)
+        last = max(math.floor(maxX / step), first + 1)
+        raising = 'raise' in (np.geterr()['divide'], np.geterr()['over'], np.geterr()['invalid'])
+        entryKey = (key, step, raising)
+
+        with self.lock:
+            gaps = self.missing(self.entries.get(entryKey, []), first, last)
+
+        while True:
+            pieces = []
+            for start, stop in gaps:
+                ys = np.array(evaluate(function, np.arange(start, stop + 1) * step), dtype=float)
+                ys.flags.writeable = False
+                pieces.append([start, ys])
+
+            with self.lock:
+                self.evaluated += sum(len(ys) for _, ys in pieces)
+                segments = self.entries.setdefault(entryKey, [])
+                self.entries.move_to_end(entryKey)
+                # another thread may have added some of the pieces meanwhile
+                added = []
+                for start, ys in pieces:
+                    for missingStart, missingStop in self.missing(segments, start, start + len(ys) - 1):
+                        part = ys
+                        if missingStop - missingStart + 1 < len(ys):
+                            part = ys[missingStart - start:missingStop - start + 1].copy()
+                            part.flags.writeable = False
+                        added.append([missingStart, part])
+                segments.extend(added)
+                self.bytes += sum(part.nbytes for _, part in added)
+                if segments:
+                    self.merge(segments)
+
+                # the requested range is inside a single segment once the gaps are filled, unless
+                # another thread dropped some of the segments meanwhile
+                gaps = self.missing(segments, first, last)
+                if not gaps:
+                    segment = next(segment for segment in segments
+                                   if segment[0] <= first <= segment[0] + len(segment[1]) - 1)
+                    segment = self.evict(entryKey, segment, first, last)
+                    ys = segment[1][first - segment[0]:last - segment[0] + 1]
+                    break
+
+        return np.arange(first, last + 1) * step, ys
+
+    @staticmethod
+    def missing(segments, first, last):
+        # the ranges of k between first and last that no segment covers
+        ranges = []
+        cursor = first
+        for start, ys in segments:
+            end = start + len(ys) - 1
+            if end < cursor:
+                continue
+            if start > last:
+                break
+            if start > cursor:
+                ranges.append((cursor, start - 1))
+            cursor = end + 1
+        if cursor <= last:
+            ranges.append((cursor, last))
+        return ranges
+
+    @staticmethod
+    def merge(segments):
+        # join the segments that touch into one
+        segments.sort(key=lambda segment: segment[0])
+        merged = [segments[0]]
+        for start, ys in segments[1:]:
+            previous = merged[-1]
+            if start == previous[0] + len(previous[1]):
+                joined = np.concatenate((previous[1], ys))
+                joined.flags.writeable = False
+                previous[1] = joined
+            else:
+                merged.append([start, ys])
+        segments[:] = merged
+
+    def evict(self, entryKey, segment, first, last):
+        # drop the least recently used entries, then the other segments of the current entry, then
+        # the parts of its segment outside of the requested range first to last, and the segment
+        # itself when that range alone takes more than maxBytes, returns the segment with the range
+        while self.bytes > self.maxBytes and len(self.entries) > 1:
+            _, segments = self.entries.popitem(last=False)
+            self.bytes -= sum(ys.nbytes for _, ys in segments)
+        if self.bytes > self.maxBytes:
+            start, ys = segment
+            if len(ys) > last - first + 1:
+                ys = ys[first - start:last - start + 1].copy()
+                ys.flags.writeable = False
+                segment = [first, ys]
+            self.entries[entryKey] = [segment]
+            self.bytes = ys.nbytes
+        if self.bytes > self.maxBytes:
+            del self.entries[entryKey]
+            self.bytes = 0
+        return segment
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+
+def sampleView(function, minX, maxX, columns, oversample=1, cache=None):
+    # evaluate the function at about one point per pixel column of the view, points outside
+    # of the domain of the function become gaps instead of errors, with a SampleCache only the
+    # parts of the view that were not evaluated before are evaluated
+    with np.errstate(all='ignore'):
+        if cache is None:
+            xs = np.linspace(minX, maxX, max(int(columns * oversample), 2))
+            ys = evaluate(function, xs)
+        else:
+            xs, ys = cache.sample(function, function, minX, maxX, int(columns * oversample))
+    return decimateMinMax(xs, ys, columns)
+
+
+def sampleGroup(group, minX, maxX, samples, out=None, cancelled=None):
+    # evaluate all the functions of a CompiledGroup on one grid of x values into the rows of one
+    # array, the points outside of the domain of a function become gaps in its row, the columns
+    # are evaluated GROUP_CHUNK at a time and the evaluation stops when cancelled returns True
+    xs = np.linspace(minX, maxX, max(int(samples), 2))
+    if out is None:
+        out = np.empty((len(group), len(xs)))
+    with np.errstate(all='ignore'):
+        for start in range(0, len(xs), GROUP_CHUNK):
+            if cancelled is not None and cancelled():
+                break
+            stop = min(start + GROUP_CHUNK, len(xs))
+            group(xs[start:stop], out[:, start:stop])
+    out[~np.isfinite(out)] = np.nan
+    return xs, out
+
+
+def chunkLength(memoryLimit, dtype=np.float64):
+    # the number of samples of a chunk whose arrays fit in memoryLimit bytes
+    return max(int(memoryLimit // (np.dtype(dtype).itemsize * CHUNK_ARRAYS)), 2)
+
+
+def streamSample(function, minX, maxX, samples, columns, chunk, dtype=np.float64, out=None, cancelled=None):
+    # evaluate the function at the x values of np.linspace(minX, maxX, samples), chunk values at a
+    # time so the memory used does not grow with samples, every chunk is reduced to the pixel
+    # columns it covers and the raw samples are written to the (x, y) rows of out when it is given
+    step = (maxX - minX) / (samples - 1)
+    reducedXs = []
+    reducedYs = []
+    for start in range(0, samples, chunk):
+        if cancelled is not None and cancelled():
+            break
+        stop = min(start + chunk, samples)
+
+        # the x values are computed in double precision like linspace, then converted
+        xs = np.arange(start, stop, dtype=np.float64) * step + minX
+        if stop == samples:
+            xs[-1] = maxX
+        xs = xs.astype(dtype, copy=False)
+        ys = evaluate(function, xs, dtype)
+
+        if out is not None:
+            out[start:stop, 0] = xs
+            out[start:stop, 1] = ys
+
+        xs, ys = decimateMinMax(xs, ys, max(int(np.ceil(columns * (stop - start) / samples)), 1))
+        reducedXs.append(xs)
+        reducedYs.append(ys)
+
+    if not reducedXs:
+        return np.empty(0, dtype), np.empty(0, dtype)
+    return np.concatenate(reducedXs), np.concatenate(reducedYs)
+
+
+class FamilyGrid:
+    # the y values of a CompiledFamily at the x values of a view, for a column of values of one of
+    # its parameters while the others stay fixed, evaluated in one broadcast pass so a slider of
+    # the parameter only picks the row to draw, the values between the rows are evaluated when
+    # they are needed and added to the grid
+
+    def __init__(self, family, index, values, fixed, minX, maxX, columns):
+        self.family = family
+        self.index = index
+        self.fixed = tuple(fixed)
+        self.view = (minX, maxX, columns)
+        self.xs = np.linspace(minX, maxX, max(int(columns), 2))
+        self.values = np.unique(np.asarray(values, dtype=float))
+        self.rows = self.evaluate(self.values)
+
+    def evaluate(self, values):
+        # the rows of values, the points outside of the domain of the function become gaps
+        arguments = list(self.fixed)
+        arguments[self.index] = values[:, np.newaxis]
+        with np.errstate(all='ignore'):
+            rows = np.array(np.broadcast_to(self.family(self.xs, *arguments), (len(values), len(self.xs))),
+                            dtype=float)
+        rows[~np.isfinite(rows)] = np.nan
+        return rows
+
+    def matches(self, index, fixed, minX, maxX, columns):
+        # True when the grid can be used for the parameter index with the other parameters set
+        # to fixed, in the given view
+        others = tuple(fixed[:index]) + tuple(fixed[index + 1:])
+        return (index == self.index and others == self.fixed[:index] + self.fixed[index + 1:]
+                and (minX, maxX, columns) == self.view)
+
+    def row(self, value, refine=True):
+        # the y values for value, a value between the rows is evaluated and added to the grid when
+        # refine is set, otherwise the nearest row is returned
+        position = int(np.searchsorted(self.values, value))
+        if position < len(self.values) and self.values[position] == value:
+            return self.rows[position]
+        if not refine:
+            if position == len(self.values) or (position > 0 and value - self.values[position - 1]
+                                                 < self.values[position] - value):
+                position -= 1
+            return self.rows[position]
+
+        self.values = np.insert(self.values, position, value)
+        self.rows = np.insert(self.rows, position, self.evaluate(np.array([value])), axis=0)
+        return self.rows[position]
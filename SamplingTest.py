@@ -0,0 +1,299 @@
+import numpy as np
+import pytest
+
+from ExpressionParser import compileExpression, compileExpressions, compileFamily
+from Sampling import adaptiveSample, yScale, decimateMinMax, sampleView, sampleGroup, streamSample, chunkLength, \
+    SampleCache, FamilyGrid, GROUP_CHUNK
+
+
+def maximumError(function, xs, ys, minX, maxX):
+    # the largest distance between the sampled curve and a dense evaluation, relative to the range of y
+    denseXs = np.linspace(minX, maxX, 20001)
+    denseYs = function(denseXs)
+    return np.max(np.abs(np.interp(denseXs, xs, ys) - denseYs)) / yScale(denseYs)
+
+
+class TestAdaptiveSampling:
+    def test_straight_line_keeps_the_coarse_grid(self):
+        xs, ys = adaptiveSample(compileExpression('2*x+1'), -10, 10, initialPoints=64)
+        assert len(xs) == 64
+
+    def test_smooth_curve_uses_fewer_points_than_budget(self):
+        function = compileExpression('x^2')
+        xs, ys = adaptiveSample(function, -10, 10, maxPoints=2000, tolerance=1e-3)
+
+        assert len(xs) < 400
+        assert maximumError(function, xs, ys, -10, 10) < 1e-3
+
+    def test_steep_regions_get_more_points(self):
+        xs, ys = adaptiveSample(compileExpression('1/(x-0.001)'), -10, 10, maxPoints=1000)
+
+        # far more than the 5% of the points a uniform grid would put there
+        assert np.count_nonzero(np.abs(xs) < 0.5) > 0.25 * len(xs)
+
+    def test_budget_is_respected(self):
+        xs, ys = adaptiveSample(compileExpression('x^20'), -3, 3, maxPoints=300, tolerance=1e-9)
+
+        assert len(xs) == 300
+        assert np.all(np.diff(xs) > 0)
+
+    def test_tighter_tolerance_is_more_accurate(self):
+        function = compileExpression('(x+2)^3*x-x^5')
+        loose = adaptiveSample(function, -3, 3, tolerance=1e-2)
+        tight = adaptiveSample(function, -3, 3, tolerance=1e-5)
+
+        assert len(tight[0]) > len(loose[0])
+        assert maximumError(function, *tight, -3, 3) < maximumError(function, *loose, -3, 3)
+
+    def test_invalid_function_raises_on_the_coarse_grid(self):
+        with np.errstate(all='raise'):
+            with pytest.raises(FloatingPointError):
+                adaptiveSample(compileExpression('x/(x-x)'), -10, 10)
+
+
+class TestDecimation:
+    def test_sparse_data_is_not_changed(self):
+        xs = np.linspace(0, 1, 100)
+        decimatedXs, decimatedYs = decimateMinMax(xs, xs ** 2, 100)
+        assert decimatedXs is xs
+
+    def test_dense_data_keeps_the_extremes_of_each_column(self):
+        xs = np.linspace(0, 1, 100000)
+        ys = np.sin(xs * 2000)
+        decimatedXs, decimatedYs = decimateMinMax(xs, ys, 200)
+
+        assert len(decimatedXs) <= 400
+        assert np.all(np.diff(decimatedXs) > 0)
+        assert decimatedYs.max() == ys.max()
+        assert decimatedYs.min() == ys.min()
+
+    def test_gaps_are_kept(self):
+        xs = np.linspace(0, 1, 10000)
+        ys = xs.copy()
+        ys[5000:5100] = np.nan
+        decimatedXs, decimatedYs = decimateMinMax(xs, ys, 100)
+
+        assert np.isnan(decimatedYs).any()
+
+    def test_view_sampling_turns_errors_into_gaps(self):
+        xs, ys = sampleView(compileExpression('x^0.5'), -1, 1, 101)
+
+        assert len(xs) == 101
+        assert np.isnan(ys[xs < 0]).all()
+        assert np.isfinite(ys[xs >= 0]).all()
+
+
+class TestGroupSampling:
+    def test_rows_share_the_x_values(self):
+        xs, ys = sampleGroup(compileExpressions(['x^2', 'x^0.5', '1/x']), -1, 1, 101)
+
+        assert ys.shape == (3, 101)
+        assert np.allclose(ys[0], xs ** 2)
+        # the points outside of the domain of an equation are gaps in its row only
+        assert np.isnan(ys[1][xs < 0]).all()
+        assert np.isnan(ys[2][50])
+        assert np.isfinite(ys[2][xs != 0]).all()
+
+    def test_cancelled_grid_stops_between_chunks(self):
+        calls = []
+        group = compileExpressions(['x^2'])
+
+        def cancelled():
+            calls.append(1)
+            return len(calls) > 1
+
+        out = np.zeros((1, 3 * GROUP_CHUNK))
+        sampleGroup(group, 0, 1, 3 * GROUP_CHUNK, out, cancelled)
+
+        assert len(calls) == 2
+        assert np.count_nonzero(out[0, GROUP_CHUNK:]) == 0
+
+
+class TestStreaming:
+    def test_raw_samples_match_linspace(self):
+        function = compileExpression('x^3-x')
+        out = np.empty((10001, 2))
+        streamSample(function, -2, 2, 10001, 100, 1000, out=out)
+
+        assert np.allclose(out[:, 0], np.linspace(-2, 2, 10001))
+        assert out[-1, 0] == 2
+        assert np.allclose(out[:, 1], function(out[:, 0]))
+
+    def test_chunks_are_reduced_to_their_columns(self):
+        function = compileExpression('x^2')
+        xs, ys = streamSample(function, -1, 1, 100000, 100, 10000)
+
+        # about 2 points per column plus the columns shared by two chunks
+        assert len(xs) <= 2 * (100 + 10)
+        assert np.all(np.diff(xs) > 0)
+        assert ys.min() < 1e-6 and ys.max() == 1
+
+    def test_float32(self):
+        xs, ys = streamSample(compileExpression('2*x+1'), 0, 1, 1000, 10, 100, dtype=np.float32)
+        assert xs.dtype == np.float32 and ys.dtype == np.float32
+
+    def test_chunk_length_fits_the_memory_limit(self):
+        assert chunkLength(2 ** 20) * 8 * 8 <= 2 ** 20
+        assert chunkLength(2 ** 20, np.float32) == 2 * chunkLength(2 ** 20)
+
+    def test_cancelled_stream_stops(self):
+        xs, ys = streamSample(compileExpression('x'), 0, 1, 1000, 10, 100, cancelled=lambda: True)
+        assert len(xs) == 0
+
+
+class TestSampleCache:
+    def test_samples_are_on_a_power_of_2_grid(self):
+        function = compileExpression('x^2')
+        xs, ys = SampleCache().sample('x^2', function, -10, 10, 1000)
+
+        step = xs[1] - xs[0]
+        assert step == 2.0 ** np.floor(np.log2(20 / 999))
+        assert len(xs) >= 1000
+        assert xs[0] == -10 and xs[-1] == 10
+        assert np.array_equal(ys, xs ** 2)
+
+    def test_extended_range_only_evaluates_the_new_part(self):
+        function = compileExpression('x^2')
+        cache = SampleCache()
+        xs, _ = cache.sample('x^2', function, -10, 10, 1000)
+        evaluated = cache.evaluated
+
+        xs, ys = cache.sample('x^2', function, -10, 12, 1000)
+        assert cache.evaluated - evaluated == np.count_nonzero(xs > 10)
+        assert np.array_equal(ys, xs ** 2)
+
+    def test_panning_only_evaluates_the_exposed_part(self):
+        function = compileExpression('x^3')
+        cache = SampleCache()
+        cache.sample('x^3', function, 0, 1, 512)
+        evaluated = cache.evaluated
+
+        xs, ys = cache.sample('x^3', function, -0.25, 0.75, 512)
+        assert cache.evaluated - evaluated == np.count_nonzero(xs < 0)
+        # the new part was merged with the cached one
+        assert len(cache.entries) == 1
+        assert len(next(iter(cache.entries.values()))) == 1
+
+    def test_gaps_are_filled_between_segments(self):
+        function = compileExpression('x+1')
+        cache = SampleCache()
+        cache.sample('x+1', function, 0, 1, 128)
+        cache.sample('x+1', function, 2, 3, 128)
+        xs, ys = cache.sample('x+1', function, 0, 3, 3 * 128 + 1)
+
+        assert np.array_equal(ys, xs + 1)
+        assert len(next(iter(cache.entries.values()))) == 1
+
+    def test_least_recently_used_entries_are_evicted(self):
+        function = compileExpression('x')
+        xs, ys = SampleCache().sample('first', function, 0, 1, 1000)
+        cache = SampleCache(maxBytes=2 * ys.nbytes)
+
+        cache.sample('first', function, 0, 1, 1000)
+        cache.sample('second', function, 0, 1, 1000)
+        cache.sample('first', function, 0, 1, 1000)
+        cache.sample('third', function, 0, 1, 1000)
+
+        assert [key[0] for key in cache.entries] == ['first', 'third']
+        assert cache.bytes <= cache.maxBytes
+
+    def test_merged_segment_is_trimmed_to_the_requested_range(self):
+        function = compileExpression('x')
+        xs, ys = SampleCache().sample('x', function, 0, 1, 1000)
+        cache = SampleCache(maxBytes=int(1.5 * ys.nbytes))
+
+        # panning merges the new parts into one segment that grows over maxBytes
+        for shift in range(4):
+            xs, ys = cache.sample('x', function, shift, shift + 1, 1000)
+            assert np.array_equal(ys, xs)
+            assert cache.bytes <= cache.maxBytes
+        [segment] = cache.entries[('x', xs[1] - xs[0], False)]
+        assert segment[1].nbytes == ys.nbytes
+
+    def test_range_larger_than_the_cache_is_not_kept(self):
+        function = compileExpression('x')
+        cache = SampleCache(maxBytes=1024)
+
+        xs, ys = cache.sample('x', function, 0, 1, 1000)
+
+        assert np.array_equal(ys, xs)
+        assert not cache.entries
+        assert cache.bytes == 0
+
+    def test_gaps_are_not_reused_when_errors_raise(self):
+        function = compileExpression('1/x')
+        cache = SampleCache()
+        with np.errstate(all='ignore'):
+            cache.sample('1/x', function, -1, 1, 100)
+
+        with np.errstate(all='raise'):
+            with pytest.raises(FloatingPointError):
+                cache.sample('1/x', function, -1, 1, 100)
+
+    def test_functions_are_evaluated_without_the_lock(self):
+        cache = SampleCache()
+        square = compileExpression('x^2')
+        locked = []
+
+        def function(xs):
+            # another thread can use the cache meanwhile
+            locked.append(cache.lock.locked())
+            cache.sample('x^2', square, 0, 1, 10)
+            return xs
+
+        xs, ys = cache.sample('x', function, 0, 1, 100)
+        assert locked == [False]
+        assert np.array_equal(ys, xs)
+        assert len(cache.entries) == 2
+
+    def test_view_sampling_uses_the_cache(self):
+        function = compileExpression('x^2')
+        cache = SampleCache()
+        sampleView(function, 0, 1, 100, cache=cache)
+        evaluated = cache.evaluated
+
+        xs, ys = sampleView(function, 0, 1, 100, cache=cache)
+        assert cache.evaluated == evaluated
+        assert np.allclose(ys, xs ** 2)
+
+
+class TestFamilyGrid:
+    def grid(self):
+        family = compileFamily('a*x^2+b', ('a', 'b'))
+        return FamilyGrid(family, 0, [0, 1, 2, 3], (1, 0.5), -2, 2, 9)
+
+    def test_rows_of_the_precomputed_values(self):
+        grid = self.grid()
+
+        assert grid.rows.shape == (4, 9)
+        assert np.allclose(grid.row(2), 2 * grid.xs ** 2 + 0.5)
+
+    def test_dragging_draws_the_nearest_row(self):
+        grid = self.grid()
+
+        assert np.array_equal(grid.row(1.4, refine=False), grid.rows[1])
+        assert np.array_equal(grid.row(1.6, refine=False), grid.rows[2])
+        assert np.array_equal(grid.row(7, refine=False), grid.rows[3])
+        assert len(grid.values) == 4
+
+    def test_values_between_the_rows_are_added(self):
+        grid = self.grid()
+
+        ys = grid.row(1.5)
+
+        assert np.allclose(ys, 1.5 * grid.xs ** 2 + 0.5)
+        assert list(grid.values) == [0, 1, 1.5, 2, 3]
+        assert grid.rows.shape == (5, 9)
+
+    def test_grid_of_the_same_view_and_fixed_parameters(self):
+        grid = self.grid()
+
+        assert grid.matches(0, (2, 0.5), -2, 2, 9)
+        assert not grid.matches(0, (2, 1), -2, 2, 9)
+        assert not grid.matches(1, (2, 0.5), -2, 2, 9)
+        assert not grid.matches(0, (2, 0.5), -2, 3, 9)
+
+    def test_points_outside_of_the_domain_are_gaps(self):
+        grid = FamilyGrid(compileFamily('(x-a)^0.5', ('a',)), 0, [0, 1], (0,), 0, 2, 3)
+        assert np.isnan(grid.rows[1, 0])
+        assert np.allclose(grid.rows[1, 1:], [0, 1])
@@ -0,0 +1,62 @@
+import json
+import os
+import statistics
+import sys
+import time
+
+# the benchmarks run from the repository root so the modules can be imported
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def summarize(times):
+    return {'median': statistics.median(times), 'min': min(times), 'max': max(times), 'runs': len(times)}
+
+
+def timeCall(function, minimumTime=0.2, maximumRuns=1000, minimumRuns=3):
+    # call the function until minimumTime is spent, returns the statistics of one call in seconds
+    times = []
+    started = time.perf_counter()
+    while len(times) < minimumRuns or (time.perf_counter() - started < minimumTime and len(times) < maximumRuns):
+        callStarted = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - callStarted)
+    return summarize(times)
+
+
+def compareWithBaseline(results, baseline, threshold):
+    # the measurements whose median is slower than the baseline by more than threshold
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result['median'] > baseline[name]['median'] * threshold:
+            regressions.append((name, baseline[name]['median'], result['median']))
+    return regressions
+
+
+def addBaselineArguments(parser):
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('-b', '--baseline', help='JSON file of earlier results to compare with')
+    parser.add_argument('-t', '--threshold', type=float, default=1.25,
+                        help='ratio to the baseline above which a result is a regression')
+
+
+def report(results, options):
+    # print the results, save them and compare them with the baseline, returns the exit status
+    width = max(len(name) for name in results)
+    for name, result in results.items():
+        print('%-*s  median %10.3f ms  min %10.3f ms  runs %d' % (
+            width, name, result['median'] * 1000, result['min'] * 1000, result['runs']))
+
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            regressions = compareWithBaseline(results, json.load(file), options.threshold)
+        for name, before, after in regressions:
+            print('regression: %s went from %.3f ms to %.3f ms' % (name, before * 1000, after * 1000))
+        if regressions:
+            return 1
+    return 0
@@ -0,0 +1,113 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from urllib.parse import urlsplit
+
+# BenchmarkTools puts the repository root on the path
+import BenchmarkTools  # noqa: F401
+
+import PlotterServer
+
+# equations of the requests, every plot is one of them over one of the ranges, where all of them
+# are defined so every request is rendered
+EQUATIONS = ['x^2', 'x^3-3*x', '(x+2)^3*x-1/x', 'x^0.5+x', '1/(x^2+1)', '2^x-x^4']
+RANGES = [(1, 10), (0.5, 5), (2, 20), (1, 3)]
+
+
+def plots(count, unique, seed=0):
+    # count plot requests made of unique different plots, so the others are served from the cache
+    generator = random.Random(seed)
+    distinct = [{'equation': generator.choice(EQUATIONS), 'minX': minX, 'maxX': maxX + index,
+                 'size': [4, 3], 'dpi': 80} for index, (minX, maxX) in enumerate(
+                     generator.choice(RANGES) for _ in range(unique))]
+    return [distinct[index % unique] for index in generator.sample(range(count), count)]
+
+
+class Client:
+    # one keep-alive connection per thread
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.local = threading.local()
+
+    def post(self, plot):
+        # returns the status and the latency in seconds
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = HTTPConnection(self.host, self.port, timeout=60)
+        started = time.perf_counter()
+        self.local.connection.request('POST', '/plot', json.dumps(plot), {'Content-Type': 'application/json'})
+        response = self.local.connection.getresponse()
+        response.read()
+        return response.status, time.perf_counter() - started
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def run(host, port, requests, concurrency):
+    client = Client(host, port)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(client.post, requests))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for _, latency in results]
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(results),
+        'seconds': elapsed,
+        'throughput': len(results) / elapsed,
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'statuses': statuses,
+    }
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Measure the latency and throughput of the plot server.')
+    parser.add_argument('--url', help='address of a running server, like http://127.0.0.1:8080 '
+                                      '(default a local server started by the test)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes of the local server')
+    parser.add_argument('-n', '--requests', type=int, default=500)
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help='requests sent at the same time')
+    parser.add_argument('-u', '--unique', type=int, default=50, help='number of different plots requested')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    options = parser.parse_args(arguments)
+
+    server = None
+    if options.url is None:
+        server = PlotterServer.PlotServer(('127.0.0.1', 0), options.workers)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+    else:
+        address = urlsplit(options.url)
+        host, port = address.hostname, address.port or 80
+
+    try:
+        results = run(host, port, plots(options.requests, min(options.unique, options.requests)),
+                      options.concurrency)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    print('%d requests in %.2f s, %.1f requests/s' % (results['requests'], results['seconds'], results['throughput']))
+    print('latency p50 %.2f ms  p99 %.2f ms' % (results['p50'] * 1000, results['p99'] * 1000))
+    print('statuses ' + ', '.join('%s: %d' % item for item in sorted(results['statuses'].items())))
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    return 0 if set(results['statuses']) == {'200'} else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
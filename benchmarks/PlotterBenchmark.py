@@ -0,0 +1,219 @@
+import argparse
+import itertools
+import sys
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+
+from BenchmarkTools import timeCall, addBaselineArguments, report
+
+import ExpressionParser
+import PlotterCore
+from ParallelEvaluation import ParallelEvaluator
+import Sampling
+
+
+def nested(depth):
+    # '((x+1)*2+1)*2...' with depth levels of parentheses
+    expression = 'x'
+    for _ in range(depth):
+        expression = '(' + expression + '+1)*2'
+    return expression
+
+
+# expressions of every size, the names are used in the names of the results
+CORPUS = {
+    'short': 'x^2',
+    'medium': '(x+2)^3*x-1/(x^2+1)',
+    'long': '+'.join('%d*x^%d' % (power + 1, power % 5) for power in range(100)),
+    'nested': nested(40),
+}
+
+# related expressions compared in an overlay, they share the polynomial and the denominator
+OVERLAY = ['(x^2+1)*%d-1/(x^2+1)+x^%d' % (index, index % 4) for index in range(50)]
+
+# the long equation typed in the live mode, every keystroke must be validated within a frame at 60 fps
+LIVE_EQUATION = '+'.join(['(x^2-3*x/4)'] * 300)
+FRAME_BUDGET = 1 / 60
+
+# the family scrubbed with a slider, the grid has a row every 0.5 like the sliders of the GUI
+FAMILY = ('a*x^3-b*(x-1)/(x^2+1)', ('a', 'b'))
+FAMILY_ROWS = np.linspace(-5, 5, 21)
+
+EVALUATION_SIZES = [10 ** power for power in range(2, 8)]
+DRAW_SIZES = [10 ** power for power in range(2, 6)]
+
+
+def benchmarkValidation(results, minimumTime):
+    for name, expression in CORPUS.items():
+        results['validate/' + name] = timeCall(lambda: ExpressionParser.validateExpression(expression), minimumTime)
+
+
+def benchmarkLive(results, minimumTime):
+    # one keystroke at the end and in the middle of the long equation, each call types or deletes it
+    middle = len(LIVE_EQUATION) // 2
+    edits = {
+        'end': LIVE_EQUATION + '+',
+        'middle': LIVE_EQUATION[:middle] + '1' + LIVE_EQUATION[middle:],
+    }
+    for name, edited in edits.items():
+        validator = ExpressionParser.IncrementalValidator()
+        validator.update(LIVE_EQUATION)
+        texts = itertools.cycle([edited, LIVE_EQUATION])
+        results['live/validate/' + name] = timeCall(lambda: validator.update(next(texts)), minimumTime)
+
+    # a slider dragged over the precomputed rows and landing between two of them
+    family = ExpressionParser.compileFamily(*FAMILY)
+    grid = Sampling.FamilyGrid(family, 0, FAMILY_ROWS, (1.0, 1.0), -10, 10, 800)
+    values = itertools.cycle(np.linspace(-5, 5, 200))
+    results['live/scrub/drag'] = timeCall(lambda: grid.row(next(values), refine=False), minimumTime)
+    results['live/scrub/land'] = timeCall(
+        lambda: Sampling.FamilyGrid(family, 0, FAMILY_ROWS, (1.0, 1.0), -10, 10, 800).row(0.25), minimumTime)
+
+
+def benchmarkCompilation(results, minimumTime):
+    for name, expression in CORPUS.items():
+        results['compile/' + name] = timeCall(lambda: ExpressionParser.compileExpression(expression), minimumTime)
+
+    # the symbolic compilation used before, for comparison when sympy is installed
+    try:
+        from sympy import symbols, lambdify
+    except ImportError:
+        return
+    x = symbols('x')
+    for name, expression in CORPUS.items():
+        results['lambdify/' + name] = timeCall(
+            lambda: lambdify(x, expression.replace('^', '**'), 'numpy'), minimumTime, maximumRuns=50)
+
+
+def benchmarkEvaluation(results, minimumTime, maximumSize):
+    # every backend, numexpr falls back to the numpy kernel when it is not installed
+    for backend in ExpressionParser.BACKENDS:
+        for name, expression in CORPUS.items():
+            function = ExpressionParser.compileExpression(expression, backend)
+            for size in EVALUATION_SIZES:
+                if size > maximumSize:
+                    continue
+                xs = np.linspace(0.5, 1.5, size)
+                with np.errstate(all='ignore'):
+                    results['evaluate/%s/%s/%d' % (backend, name, size)] = timeCall(
+                        lambda: function(xs), minimumTime, maximumRuns=200)
+
+
+def benchmarkStreaming(results, minimumTime, maximumSize):
+    # the chunked evaluation reduced to 2000 columns, in double and single precision
+    function = ExpressionParser.compileExpression(CORPUS['medium'])
+    for size in EVALUATION_SIZES:
+        if size > maximumSize:
+            continue
+        for name, dtype in (('float64', np.float64), ('float32', np.float32)):
+            results['stream/%s/%d' % (name, size)] = timeCall(
+                lambda: PlotterCore.stream(function, 0.5, 1.5, size, dtype=dtype), minimumTime, maximumRuns=50)
+
+
+def benchmarkParallel(results, minimumTime, maximumSize, workers):
+    # the same domain in the calling process and split over the worker processes
+    size = min(10 ** 7, maximumSize)
+    for name in ('medium', 'long'):
+        expression = CORPUS[name]
+        with ParallelEvaluator(workers=1) as evaluator:
+            results['serial/%s/%d' % (name, size)] = timeCall(
+                lambda: evaluator.evaluate(expression, 0.5, 1.5, size, raising=False), minimumTime, maximumRuns=5)
+        with ParallelEvaluator(workers=workers, threshold=0) as evaluator:
+            # the first call starts the pool
+            evaluator.evaluate(expression, 0.5, 1.5, 1000, raising=False)
+            results['parallel/%d/%s/%d' % (evaluator.workers, name, size)] = timeCall(
+                lambda: evaluator.evaluate(expression, 0.5, 1.5, size, raising=False), minimumTime, maximumRuns=5)
+
+
+def benchmarkDrawing(results, minimumTime, maximumSize):
+    figure = Figure(figsize=(8, 6), dpi=100)
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.subplots()
+    line, = ax.plot([], [])
+    columns = int(ax.bbox.width)
+
+    for size in DRAW_SIZES:
+        if size > maximumSize:
+            continue
+        xs = np.linspace(-10, 10, size)
+        ys = np.sin(xs * 50)
+
+        # the whole line and the line reduced to the pixel columns of the axes
+        line.set_data(xs, ys)
+        ax.relim()
+        ax.autoscale_view()
+        results['draw/%d' % size] = timeCall(canvas.draw, minimumTime, maximumRuns=100)
+
+        line.set_data(*Sampling.decimateMinMax(xs, ys, columns))
+        results['draw/decimated/%d' % size] = timeCall(canvas.draw, minimumTime, maximumRuns=100)
+
+
+def benchmarkOverlay(results, minimumTime, maximumSize):
+    # the overlay evaluated one equation at a time and as a group on the same x values
+    functions = [ExpressionParser.compileExpression(expression) for expression in OVERLAY]
+    group = ExpressionParser.compileExpressions(OVERLAY)
+    size = min(10 ** 5, maximumSize)
+    xs = np.linspace(0.5, 1.5, size)
+    out = np.empty((len(OVERLAY), size))
+    with np.errstate(all='ignore'):
+        results['overlay/separate/%d' % size] = timeCall(
+            lambda: [function(xs) for function in functions], minimumTime, maximumRuns=100)
+        results['overlay/group/%d' % size] = timeCall(lambda: group(xs, out), minimumTime, maximumRuns=100)
+
+    # one Line2D per equation and a single LineCollection
+    figure = Figure(figsize=(8, 6), dpi=100)
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.subplots()
+    columns = int(ax.bbox.width)
+    curves = [Sampling.decimateMinMax(xs, row, columns) for row in group(xs, out)]
+    lines = [ax.plot(*curve)[0] for curve in curves]
+    results['overlay/draw/lines'] = timeCall(canvas.draw, minimumTime, maximumRuns=100)
+    for line in lines:
+        line.remove()
+    ax.add_collection(LineCollection([np.column_stack(curve) for curve in curves]))
+    results['overlay/draw/collection'] = timeCall(canvas.draw, minimumTime, maximumRuns=100)
+
+
+STAGES = {
+    'validate': lambda results, options: benchmarkValidation(results, options.time),
+    'live': lambda results, options: benchmarkLive(results, options.time),
+    'compile': lambda results, options: benchmarkCompilation(results, options.time),
+    'evaluate': lambda results, options: benchmarkEvaluation(results, options.time, options.max_samples),
+    'stream': lambda results, options: benchmarkStreaming(results, options.time, options.max_samples),
+    'parallel': lambda results, options: benchmarkParallel(results, options.time, options.max_samples,
+                                                           options.workers),
+    'draw': lambda results, options: benchmarkDrawing(results, options.time, options.max_samples),
+    'overlay': lambda results, options: benchmarkOverlay(results, options.time, options.max_samples),
+}
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Time the validation, compilation, evaluation and drawing.')
+    parser.add_argument('-s', '--stage', action='append', choices=list(STAGES),
+                        help='stage to run, can be given more than once (default all)')
+    parser.add_argument('--time', type=float, default=0.2, help='minimum time spent on each measurement')
+    parser.add_argument('--max-samples', type=int, default=10 ** 7, help='largest number of samples')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes of the parallel stage (default the number of CPUs)')
+    addBaselineArguments(parser)
+    options = parser.parse_args(arguments)
+
+    results = {}
+    for stage in options.stage or list(STAGES):
+        STAGES[stage](results, options)
+    status = report(results, options)
+
+    # the live stage is slow when a keystroke or a slider move does not fit in a frame, the median
+    # is compared so a single pause of the machine is not counted
+    for name, result in results.items():
+        if name.startswith('live/') and result['median'] > FRAME_BUDGET:
+            print('over the frame budget: %s took %.3f ms' % (name, result['median'] * 1000))
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
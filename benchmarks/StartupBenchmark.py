@@ -0,0 +1,72 @@
+import argparse
+import os
+import subprocess
+import sys
+
+from BenchmarkTools import ROOT, summarize, addBaselineArguments, report
+
+# each measurement runs in a new interpreter so nothing is already imported
+IMPORT_SCRIPT = '''
+import time
+started = time.perf_counter()
+import GraphPlotter
+print(time.perf_counter() - started)
+'''
+
+FIRST_PAINT_SCRIPT = '''
+import time
+started = time.perf_counter()
+from PySide6.QtCore import QObject, QEvent, QTimer
+from PySide6.QtWidgets import QApplication
+import GraphPlotter
+
+
+class FirstPaint(QObject):
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint and not hasattr(self, 'painted'):
+            self.painted = time.perf_counter() - started
+            QTimer.singleShot(0, application.quit)
+        return False
+
+
+application = QApplication([])
+widget = GraphPlotter.MainApp(prewarm=False)
+firstPaint = FirstPaint()
+widget.installEventFilter(firstPaint)
+widget.resize(800, 600)
+widget.show()
+application.exec()
+print(firstPaint.painted)
+'''
+
+
+def measure(script, runs, environment):
+    # the time printed by the script, one new interpreter per run
+    times = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=environment, check=True,
+                                capture_output=True, text=True).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return summarize(times)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Measure the import time and the time to the first paint of the GUI.')
+    parser.add_argument('-n', '--runs', type=int, default=5)
+    addBaselineArguments(parser)
+    parser.add_argument('--offscreen', action='store_true', help='use the offscreen Qt platform')
+    options = parser.parse_args(arguments)
+
+    environment = dict(os.environ)
+    if options.offscreen:
+        environment['QT_QPA_PLATFORM'] = 'offscreen'
+
+    results = {
+        'import': measure(IMPORT_SCRIPT, options.runs, environment),
+        'firstPaint': measure(FIRST_PAINT_SCRIPT, options.runs, environment),
+    }
+    return report(results, options)
+
+
+if __name__ == '__main__':
+    sys.exit(main())